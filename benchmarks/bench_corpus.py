@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Collection query latency versus collection size, with and without shard pruning
+
+Builds synthetic collections of increasing size (filler text plus a Zipf-
+distributed vocabulary of rarer terms, as names, amounts and defined terms
+are in real contracts), then times the same queries with the pruned corpus
+search and with an exhaustive search that scores every matching shard. It
+checks both return the same top scores and reports latency and shards
+searched per collection size.
+
+Usage: python benchmarks/bench_corpus.py --sizes 25 100 400 --words 3000 --queries 200
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+
+from pdf_fixtures import WORDS, make_text
+from corpus import CorpusIndex
+from retrieval import ChunkIndex, tokenize
+
+def zipf_terms(count: int, vocabulary: int, rng: random.Random) -> list:
+    """Draw count terms from a vocabulary whose term frequencies follow Zipf's law"""
+    weights = [1 / rank for rank in range(1, vocabulary + 1)]
+    return [f"term{rank}" for rank in rng.choices(range(1, vocabulary + 1), weights=weights, k=count)]
+
+def make_document(words: int, seed: int, vocabulary: int) -> str:
+    """Filler text with every fifth word replaced by a Zipf-distributed term"""
+    rng = random.Random(seed)
+    tokens = make_text(words, seed=seed).split(" ")
+    rare = zipf_terms(len(tokens) // 5, vocabulary, rng)
+    for i, term in enumerate(rare):
+        tokens[i * 5] = term
+    return " ".join(tokens)
+
+def exhaustive_search(corpus: CorpusIndex, shards: dict, query: str, top_k: int) -> list:
+    """Score every shard that contains a query term and keep the overall top_k"""
+    terms = [term for term in set(tokenize(query)) if term in corpus.idf]
+    matching = {document_id for term in terms for document_id, _, _ in corpus.term_shards[term]}
+    results = []
+    for document_id in matching:
+        for chunk, score in shards[document_id].rank(terms, top_k, corpus.idf, corpus.avg_length):
+            results.append((score, document_id, chunk["id"]))
+    return heapq.nlargest(top_k, results)
+
+def time_queries(search, queries: list) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 400], help="documents per collection")
+    parser.add_argument("--words", type=int, default=3000, help="words per document")
+    parser.add_argument("--vocabulary", type=int, default=50000, help="size of the Zipf vocabulary")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Queries mix one or two rarer terms with common filler words, like "termination notice for Acme"
+    queries = [
+        " ".join(zipf_terms(rng.randint(1, 2), args.vocabulary // 10, rng) + rng.sample(WORDS[:30], 2))
+        for _ in range(args.queries)
+    ]
+
+    shards = {}
+    results = []
+    for size in sorted(args.sizes):
+        for seed in range(len(shards), size):
+            shards[f"doc{seed}"] = ChunkIndex(make_document(args.words, seed, args.vocabulary))
+        document_ids = [f"doc{seed}" for seed in range(size)]
+
+        start = time.perf_counter()
+        corpus = CorpusIndex(document_ids, shards.__getitem__)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        searched = []
+        for query in queries:
+            found = corpus.search(query, args.top_k)
+            expected = [round(score, 9) for score, _, _ in exhaustive_search(corpus, shards, query, args.top_k)]
+            if [round(score, 9) for _, _, score in found["passages"]] != expected:
+                raise SystemExit(f"pruned search disagrees with exhaustive search for {query!r}")
+            searched.append(found["shards_searched"])
+
+        pruned = time_queries(lambda q: corpus.search(q, args.top_k), queries)
+        exhaustive = time_queries(lambda q: exhaustive_search(corpus, shards, q, args.top_k), queries)
+        row = {
+            "documents": size,
+            "corpus_build_ms": build_ms,
+            "pruned_p50_ms": statistics.median(pruned),
+            "exhaustive_p50_ms": statistics.median(exhaustive),
+            "shards_searched_mean": statistics.fmean(searched),
+        }
+        results.append(row)
+        print(f"{size:>5} docs  build {build_ms:8.1f}ms  pruned p50 {row['pruned_p50_ms']:7.2f}ms  "
+              f"exhaustive p50 {row['exhaustive_p50_ms']:7.2f}ms  shards searched {row['shards_searched_mean']:6.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
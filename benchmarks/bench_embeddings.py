@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Embedding index build and search latency on a large document
+
+Builds a synthetic document of --chunks chunks, embeds it with the hashing
+embedder, stores the vectors as a .npy file and searches the memory-mapped
+matrix, timing:
+
+- embedding every chunk (one-off, at upload);
+- semantic search: query embedding, one matrix-vector product, top-k;
+- hybrid search: the same plus BM25 over the postings of the query terms;
+- BM25 search alone, for reference.
+
+It also reports recall of semantic/hybrid versus BM25 for questions using
+a different word form than the document (e.g. "terminated" for "terminate").
+
+Usage: python benchmarks/bench_embeddings.py --chunks 10000 --queries 200 --output embeddings.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+
+from pdf_fixtures import WORDS, make_text
+from bench_endpoints import git_commit
+from embeddings import EmbeddingIndex, EmbeddingStore, HashingEmbedder
+from retrieval import ChunkIndex
+
+# Marker phrases planted in the document and the inflected forms used to ask about them
+VARIANTS = [("terminate", "terminated"), ("indemnify", "indemnification"), ("renewal", "renewed"),
+            ("deliverable", "deliveries"), ("confidentiality", "confidential"), ("arbitrate", "arbitration")]
+
+def percentiles(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {"p50_ms": latencies[len(latencies) // 2], "p95_ms": latencies[int(len(latencies) * 0.95)]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # About 150 words per 1000-character chunk; plant each marker word in a few chunks
+    words = make_text(args.chunks * 150, seed=3).split(" ")
+    planted = {}
+    for stem, _ in VARIANTS:
+        for _ in range(3):
+            position = rng.randrange(len(words))
+            words[position] = f"{stem} {stem}-{len(planted)}"
+            planted.setdefault(stem, []).append(position)
+    text = " ".join(words)
+
+    start = time.perf_counter()
+    index = ChunkIndex(text)
+    bm25_build_s = time.perf_counter() - start
+    print(f"{len(index.chunks)} chunks, BM25 index built in {bm25_build_s:.1f}s")
+
+    embedder = HashingEmbedder(args.dimensions)
+    start = time.perf_counter()
+    vectors = embedder.embed_documents([chunk["text"] for chunk in index.chunks], index.idf)
+    embed_s = time.perf_counter() - start
+
+    directory = tempfile.mkdtemp(prefix="bench_embeddings_")
+    try:
+        vectors = EmbeddingStore(directory).save("bench", embedder.name, vectors)
+        embeddings = EmbeddingIndex(vectors, embedder, index)
+        queries = [" ".join(rng.sample(WORDS, 4)) + " " + rng.choice(VARIANTS)[1] for _ in range(args.queries)]
+
+        timings = {}
+        for name, search in (("bm25", index.search), ("semantic", embeddings.search), ("hybrid", embeddings.hybrid_search)):
+            latencies = []
+            for query in queries:
+                began = time.perf_counter()
+                search(query, args.top_k)
+                latencies.append((time.perf_counter() - began) * 1000)
+            timings[name] = percentiles(latencies)
+
+        # Recall: does the top-k contain a chunk with the planted word, asked about in another form?
+        recall = {}
+        for name, search in (("bm25", index.search), ("semantic", embeddings.search), ("hybrid", embeddings.hybrid_search)):
+            hits = 0
+            for stem, variant in VARIANTS:
+                found = search(f"when is it {variant}", args.top_k)
+                hits += any(stem in chunk["text"] for chunk, _ in found)
+            recall[name] = hits / len(VARIANTS)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results = {
+        "chunks": len(index.chunks),
+        "dimensions": args.dimensions,
+        "embed_all_s": embed_s,
+        "search": timings,
+        "variant_recall": recall,
+    }
+    print(f"embedded {len(index.chunks)} chunks in {embed_s:.1f}s ({args.dimensions} dims, memory-mapped .npy)")
+    for name, timing in timings.items():
+        print(f"{name:>9} search  p50 {timing['p50_ms']:6.2f}ms  p95 {timing['p95_ms']:6.2f}ms  "
+              f"word-form recall {recall[name]:.0%}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
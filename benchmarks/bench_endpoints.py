@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Endpoint latency and throughput benchmark against a local uvicorn backend
+
+The backend is started with the stub LLM backend (LLM_BACKEND=stub), a
+throwaway document store and the response cache disabled, so the numbers
+measure this service's own overhead plus the simulated model latency.
+
+For every document size a fresh server is started, then each endpoint is
+driven at each concurrency level. Per scenario it reports p50/p95/p99
+latency, requests per second, errors, and the server's resident and
+peak RSS (Linux /proc, cumulative per server).
+
+Usage:
+    python benchmarks/bench_endpoints.py --concurrency 1 8 32 --requests 64 \
+        --docs small-txt large-pdf --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pdf_fixtures import make_pdf, make_text
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend')
+
+DOCUMENTS = {
+    "small-txt": ("txt", 1000),
+    "large-txt": ("txt", 100000),
+    "small-pdf": ("pdf", 10),
+    "large-pdf": ("pdf", 500),
+}
+
+ENDPOINTS = ["upload", "ask", "challenge", "evaluate"]
+
+def make_document(kind: str, size: int, variant: int):
+    """Return (filename, bytes, mime type); each variant has different bytes so dedup does not kick in"""
+    if kind == "pdf":
+        return f"bench-{variant}.pdf", make_pdf(size, seed=variant), "application/pdf"
+    text = f"Benchmark document variant {variant}.\n\n" + make_text(size, seed=variant)
+    return f"bench-{variant}.txt", text.encode(), "text/plain"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _process_tree(pid: int) -> list:
+    """Return pid and all of its descendants (Linux /proc)"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+def read_rss_mb(pid: int):
+    """Return (current RSS, peak RSS) in MB summed over a process tree, or (None, None) off Linux"""
+    rss = peak = 0
+    try:
+        for member in _process_tree(pid):
+            with open(f"/proc/{member}/status") as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+            rss += int(fields["VmRSS"].split()[0])
+            peak += int(fields["VmHWM"].split()[0])
+    except (OSError, KeyError, ValueError):
+        return None, None
+    return rss / 1024, peak / 1024
+
+class Server:
+    """A uvicorn backend subprocess with the stub LLM"""
+
+    def __init__(self, workers: int, env_overrides: dict):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.data_dir = tempfile.mkdtemp(prefix="bench-backend-")
+        env = dict(os.environ)
+        env.update({
+            "LLM_BACKEND": "stub",
+            "DOCUMENT_STORE_PATH": os.path.join(self.data_dir, "documents.sqlite3"),
+            "LLM_CACHE_MAX_ENTRIES": "0",
+            "LLM_CACHE_PATH": "",
+            # The stub has no provider quota; measure the server, not the scheduler's limits
+            "LLM_REQUESTS_PER_MINUTE": "0",
+            "LLM_TOKENS_PER_MINUTE": "0",
+            "LLM_MAX_QUEUE": "0",
+        })
+        # Sized like run_backend.py does, so workers split the cores between their PDF extraction pools
+        env["BACKEND_WORKERS"] = str(workers)
+        env.update(env_overrides)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env
+        )
+
+    def wait_ready(self, timeout: float = 60) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"backend exited with code {self.process.returncode}")
+            try:
+                if requests.get(f"{self.base_url}/health/", timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("backend did not start")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=30)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def run_scenario(call, payloads, concurrency: int) -> dict:
+    """Run call(session, payload) for every payload with the given concurrency"""
+    sessions = [requests.Session() for _ in range(concurrency)]
+    latencies = []
+    errors = 0
+
+    def worker(index: int):
+        session = sessions[index % concurrency]
+        start = time.perf_counter()
+        try:
+            ok = call(session, payloads[index])
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, ok in pool.map(worker, range(len(payloads))):
+            latencies.append(latency)
+            errors += 0 if ok else 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(payloads),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "rps": len(payloads) / elapsed if elapsed else 0.0,
+    }
+
+def benchmark_document(name: str, args) -> list:
+    kind, size = DOCUMENTS[name]
+    server = Server(args.workers, {"STUB_LATENCY_MS": str(args.stub_latency_ms)})
+    results = []
+    try:
+        server.wait_ready()
+        base = server.base_url
+
+        # One reference document for the question endpoints
+        filename, content, mime = make_document(kind, size, variant=0)
+        response = requests.post(f"{base}/upload-document/", files={"file": (filename, content, mime)}, timeout=600)
+        response.raise_for_status()
+        document_id = response.json()["document_id"]
+        challenge_id = requests.post(
+            f"{base}/generate-challenge/", params={"document_id": document_id}, timeout=120
+        ).json()["challenge_id"]
+
+        variant = 1
+        for concurrency in args.concurrency:
+            for endpoint in args.endpoints:
+                if endpoint == "upload":
+                    payloads = [make_document(kind, size, variant + i) for i in range(args.requests)]
+                    variant += args.requests
+
+                    def call(session, doc):
+                        r = session.post(f"{base}/upload-document/", files={"file": doc}, timeout=600)
+                        return r.status_code == 200
+                elif endpoint == "ask":
+                    payloads = [
+                        {"document_id": document_id, "question": f"What are the payment terms? ({concurrency}-{i})"}
+                        for i in range(args.requests)
+                    ]
+
+                    def call(session, payload):
+                        return session.post(f"{base}/ask-question/", json=payload, timeout=120).status_code == 200
+                elif endpoint == "challenge":
+                    payloads = [document_id] * args.requests
+
+                    def call(session, doc_id):
+                        r = session.post(f"{base}/generate-challenge/", params={"document_id": doc_id}, timeout=120)
+                        return r.status_code == 200
+                else:
+                    payloads = [
+                        {
+                            "document_id": document_id,
+                            "challenge_id": challenge_id,
+                            "question_id": i % 3,
+                            "user_answer": f"The document concludes that point {i % 3 + 1} holds ({concurrency}-{i})."
+                        }
+                        for i in range(args.requests)
+                    ]
+
+                    def call(session, payload):
+                        return session.post(f"{base}/evaluate-answer/", json=payload, timeout=120).status_code == 200
+
+                result = run_scenario(call, payloads, concurrency)
+                rss, peak = read_rss_mb(server.process.pid)
+                result.update({
+                    "endpoint": endpoint,
+                    "document": name,
+                    "concurrency": concurrency,
+                    "rss_mb": rss,
+                    "peak_rss_mb": peak,
+                })
+                results.append(result)
+                print(f"{name:>10} {endpoint:>9} c={concurrency:<4} p50 {result['p50_ms']:8.1f}ms  "
+                      f"p95 {result['p95_ms']:8.1f}ms  p99 {result['p99_ms']:8.1f}ms  "
+                      f"{result['rps']:8.1f} req/s  errors {result['errors']}  peak RSS {peak} MB")
+    finally:
+        server.stop()
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="requests per scenario")
+    parser.add_argument("--docs", nargs="+", choices=list(DOCUMENTS), default=list(DOCUMENTS))
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.docs:
+        results.extend(benchmark_document(name, args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
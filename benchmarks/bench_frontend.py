@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Per-rerun HTTP latency of the Streamlit frontend, before and after pooling
+
+Every Streamlit interaction reruns src/app.py. The legacy client made two
+fresh-connection /health/ requests per rerun (the startup check and the
+header badge) and opened a new connection for every API call; the current
+one shares a keep-alive session and re-checks health at most once per
+HEALTH_CHECK_TTL_SECONDS. This replays both request patterns against a
+backend and reports the time spent per rerun and per question asked.
+
+With --apptest (needs streamlit) it also times full reruns of the current
+src/app.py with streamlit.testing; run it at an older commit to compare.
+
+Usage:
+    python benchmarks/bench_frontend.py --reruns 200 --output frontend.json
+    python benchmarks/bench_frontend.py --url http://localhost:8000 --apptest
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bench_endpoints import Server, git_commit, make_document
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'app.py')
+
+def legacy_rerun(base: str) -> None:
+    """The old per-rerun requests: two module-level health checks, each on a new connection"""
+    requests.get(f"{base}/health/")
+    requests.get(f"{base}/health/", timeout=2)
+
+def legacy_ask(base: str, document_id: str, question: str) -> None:
+    requests.post(f"{base}/ask-question/", json={"document_id": document_id, "question": question}).json()
+
+class PooledClient:
+    """The new request pattern: one keep-alive session and a TTL-cached health check"""
+
+    def __init__(self, base: str, ttl: float):
+        self.base = base
+        self.ttl = ttl
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+        self._health = None
+        self._checked = 0.0
+
+    def online(self) -> bool:
+        if self._health is None or time.monotonic() - self._checked > self.ttl:
+            self._health = self.session.get(f"{self.base}/health/", timeout=2).status_code == 200
+            self._checked = time.monotonic()
+        return self._health
+
+    def rerun(self) -> None:
+        self.online()
+        self.online()
+
+    def ask(self, document_id: str, question: str) -> None:
+        self.session.post(
+            f"{self.base}/ask-question/", json={"document_id": document_id, "question": question}, timeout=(3.05, 300)
+        ).json()
+
+def time_calls(func, count: int) -> dict:
+    """Time count calls of func() and summarize the latencies in milliseconds"""
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "count": count,
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+def time_apptest(count: int, base: str) -> dict:
+    """Time full reruns of src/app.py with the streamlit app tester"""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["BACKEND_URL"] = base
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.run()
+    return time_calls(lambda i: app.run(), count)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="use a running backend instead of starting a stub one")
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--health-ttl", type=float, default=15, help="HEALTH_CHECK_TTL_SECONDS of the pooled client")
+    parser.add_argument("--apptest", action="store_true", help="also time full reruns of src/app.py")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    server = None
+    base = args.url
+    if base is None:
+        server = Server(1, {"STUB_LATENCY_MS": "0", "STUB_LATENCY_JITTER_MS": "0", "STUB_TOKENS_PER_SECOND": "0"})
+        server.wait_ready()
+        base = server.base_url
+    base = base.rstrip("/")
+
+    results = {}
+    try:
+        filename, content, mime = make_document("txt", 2000, variant=0)
+        response = requests.post(f"{base}/upload-document/", files={"file": (filename, content, mime)}, timeout=600)
+        response.raise_for_status()
+        document_id = response.json()["document_id"]
+
+        pooled = PooledClient(base, args.health_ttl)
+        results["rerun_legacy"] = time_calls(lambda i: legacy_rerun(base), args.reruns)
+        results["rerun_pooled"] = time_calls(lambda i: pooled.rerun(), args.reruns)
+        results["ask_legacy"] = time_calls(lambda i: legacy_ask(base, document_id, f"Question {i}?"), args.questions)
+        results["ask_pooled"] = time_calls(lambda i: pooled.ask(document_id, f"Pooled question {i}?"), args.questions)
+        if args.apptest:
+            results["apptest_rerun"] = time_apptest(args.reruns, base)
+    finally:
+        if server is not None:
+            server.stop()
+
+    for name, result in results.items():
+        print(f"{name:>14}  mean {result['mean_ms']:8.2f}ms  p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+                "url": base,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Snippet highlighting cost per answer, legacy helper versus the highlighting engine
+
+The legacy utils.helpers.extract_text_snippets compiles a fresh pattern and
+rescans the whole text for one literal term per call, so highlighting an
+answer's terms means one full scan per term. The engine normalizes a
+document once (cached per document by the server) and then finds every
+term in one pass, restricted to the answer's source chunks, and also
+locates the model's quoted source reference. This times both per answer,
+and checks the fuzzy locator against quotes taken from the document and
+then perturbed (labels added, words dropped or replaced) the way model
+quotes are.
+
+Usage: python benchmarks/bench_highlighting.py --words 200000 --answers 200 --output highlighting.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from pdf_fixtures import WORDS, make_text
+from bench_endpoints import git_commit
+from highlighting import NormalizedText, highlight
+from retrieval import ChunkIndex
+from utils.helpers import extract_text_snippets
+
+WORD_PATTERN = re.compile(r"\S+")
+
+def perturb(words: list, rng: random.Random, rate: float) -> list:
+    """Drop or replace about rate of the words, as a model paraphrasing a quote does"""
+    result = []
+    for word in words:
+        roll = rng.random()
+        if roll < rate / 2:
+            continue
+        result.append(rng.choice(WORDS) if roll < rate else word)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=200000, help="words in the document")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--answers", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=6, help="terms highlighted per answer")
+    parser.add_argument("--perturb", type=float, default=0.15, help="share of quote words dropped or replaced")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Paragraph breaks and uneven spacing, as extracted PDF text has
+    words = make_text(args.words, seed=1).split(" ")
+    per_page = max(1, len(words) // args.pages)
+    pages = []
+    for p in range(args.pages):
+        page_words = words[p * per_page:(p + 1) * per_page]
+        for i in range(0, len(page_words), 40):
+            page_words[i] = "\n\n" + page_words[i]
+        pages.append("  ".join(page_words[:5]) + " " + " ".join(page_words[5:]) + "\n")
+    text = "".join(pages)
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page)
+    index = ChunkIndex(text)
+
+    start = time.perf_counter()
+    document = NormalizedText(text, page_starts)
+    normalize_ms = (time.perf_counter() - start) * 1000
+
+    legacy, engine, located, exact_pages = [], [], 0, 0
+    for _ in range(args.answers):
+        terms = rng.sample(WORDS, args.terms)
+        chunks = rng.sample(index.chunks, min(5, len(index.chunks)))
+        regions = [(chunk["start"], chunk["end"]) for chunk in chunks]
+        # Quote 25 words from one of the chunks, as the model would
+        chunk = chunks[0]
+        chunk_words = list(WORD_PATTERN.finditer(text, chunk["start"], chunk["end"]))
+        first = rng.randrange(max(1, len(chunk_words) - 25))
+        quote_words = [match.group() for match in chunk_words[first:first + 25]]
+        reference = f'[Chunk {chunk["id"]}] "{" ".join(perturb(quote_words, rng, args.perturb))}"'
+        true_start = chunk_words[first].start()
+
+        began = time.perf_counter()
+        for term in terms:
+            extract_text_snippets(text, term)
+        legacy.append((time.perf_counter() - began) * 1000)
+
+        began = time.perf_counter()
+        result = highlight(document, terms, reference, regions)
+        engine.append((time.perf_counter() - began) * 1000)
+
+        for found in result["references"]:
+            if found["start"] <= true_start + 200 and found["end"] >= true_start:
+                located += 1
+                if found["page_start"] == document.page_of(true_start):
+                    exact_pages += 1
+                break
+
+    results = {
+        "normalize_ms": normalize_ms,
+        "legacy_p50_ms": statistics.median(legacy),
+        "engine_p50_ms": statistics.median(engine),
+        "references_located": located / args.answers,
+        "pages_correct": exact_pages / args.answers,
+    }
+    print(f"document {len(text) / 1e6:.2f} MB, normalized once in {normalize_ms:.1f}ms")
+    print(f"per answer ({args.terms} terms): legacy p50 {results['legacy_p50_ms']:.2f}ms  "
+          f"engine p50 {results['engine_p50_ms']:.2f}ms")
+    print(f"perturbed quotes located {results['references_located']:.1%}, on the right page {results['pages_correct']:.1%}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
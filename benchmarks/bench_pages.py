@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Cost of page-scoped reads and questions versus document length
+
+Stores synthetic documents of increasing page counts, then times, with
+cold caches (a fresh store and processor per measurement):
+
+- reading one page: whole text loaded from SQLite and sliced (legacy)
+  versus the page table and memory-mapped buffer;
+- building the answer prompt for a question scoped to a few pages versus
+  one over the whole document.
+
+Page-scoped costs should stay flat as documents grow.
+
+Usage: python benchmarks/bench_pages.py --pages 100 1000 4000 --words-per-page 400 --output pages.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+
+from pdf_fixtures import make_text
+from bench_endpoints import git_commit
+
+def cold_ms(setup, measure, repeat: int) -> float:
+    """Median time of measure(state) over repeat fresh setup() states"""
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        measure(state)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000, 4000])
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--scope", type=int, default=3, help="pages in a page-scoped question")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_pages_")
+    os.environ["DOCUMENT_STORE"] = "sqlite"
+    os.environ["UPLOAD_DIR"] = directory
+    os.environ["LLM_CACHE_PATH"] = ""
+    from document_processor import DocumentProcessor
+    from document_store import create_document_store
+    from llm_backends import StubBackend
+
+    def processor():
+        return DocumentProcessor(store=create_document_store(), backend=StubBackend(latency_ms=0, jitter_ms=0))
+
+    results = []
+    try:
+        for page_count in args.pages:
+            pages = [make_text(args.words_per_page, seed=page) for page in range(page_count)]
+            document_id, _ = processor().ingest_pages("bench.pdf", pages)
+            middle = page_count // 2
+            question = "What does the middle section say about the terms?"
+
+            def legacy_page(p):
+                text = p.store.get_text(document_id)
+                offset = sum(len(page) + 1 for page in pages[:middle - 1])
+                return text[offset:offset + len(pages[middle - 1]) + 1]
+
+            row = {
+                "pages": page_count,
+                "page_legacy_ms": cold_ms(processor, legacy_page, args.repeat),
+                "page_paged_ms": cold_ms(processor, lambda p: p.get_page_text(document_id, middle, middle), args.repeat),
+                "question_whole_ms": cold_ms(
+                    processor, lambda p: p._build_answer_prompt(document_id, question), args.repeat
+                ),
+                "question_scoped_ms": cold_ms(
+                    processor,
+                    lambda p: p._build_answer_prompt(document_id, question, pages=(middle, middle + args.scope - 1)),
+                    args.repeat
+                ),
+            }
+            results.append(row)
+            print(f"{page_count:>6} pages  page read legacy {row['page_legacy_ms']:8.2f}ms  paged {row['page_paged_ms']:6.2f}ms  "
+                  f"question whole {row['question_whole_ms']:8.2f}ms  scoped {row['question_scoped_ms']:6.2f}ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
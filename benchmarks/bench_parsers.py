@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark the legacy regex response parsers against the single-pass section parser
+
+For each response type (answer, challenge, evaluation) and size it checks
+that both parsers return the same result, then reports the time per parse.
+The streamed scenario feeds the response in small chunks: the section
+parser consumes each chunk once, while the legacy parsers can only re-parse
+the accumulated text after every chunk.
+
+Usage: python benchmarks/bench_parsers.py --repeat 2000 --output parsers.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+
+from pdf_fixtures import make_text
+from response_parser import (
+    ANSWER_KEYS, CHALLENGE_KEYS, EVALUATION_KEYS, SectionStreamParser, answer_from_fields,
+    challenge_questions_from_fields, evaluation_from_fields, parse_sections
+)
+
+def legacy_parse_answer(response_text: str) -> dict:
+    """The original _parse_answer_response"""
+    answer = re.search(r'ANSWER:\s*(.*?)(?=JUSTIFICATION:|$)', response_text, re.DOTALL)
+    justification = re.search(r'JUSTIFICATION:\s*(.*?)(?=SOURCE_REFERENCE:|$)', response_text, re.DOTALL)
+    source_ref = re.search(r'SOURCE_REFERENCE:\s*(.*?)$', response_text, re.DOTALL)
+
+    return {
+        "answer": answer.group(1).strip() if answer else "Unable to parse answer",
+        "justification": justification.group(1).strip() if justification else "Unable to parse justification",
+        "source_reference": source_ref.group(1).strip() if source_ref else "Unable to parse source reference"
+    }
+
+def legacy_parse_challenge(response_text: str) -> list:
+    """The original _parse_challenge_questions"""
+    questions = []
+
+    for i in range(1, 4):
+        question_match = re.search(fr'QUESTION_{i}:\s*(.*?)(?=ANSWER_{i}:|$)', response_text, re.DOTALL)
+        answer_match = re.search(fr'ANSWER_{i}:\s*(.*?)(?=EXPLANATION_{i}:|$)', response_text, re.DOTALL)
+        explanation_match = re.search(fr'EXPLANATION_{i}:\s*(.*?)(?=QUESTION_{i+1}:|$)', response_text, re.DOTALL)
+
+        if question_match:
+            questions.append({
+                "question": question_match.group(1).strip(),
+                "correct_answer": answer_match.group(1).strip() if answer_match else "",
+                "explanation": explanation_match.group(1).strip() if explanation_match else ""
+            })
+
+    return questions if questions else [{"question": "Error parsing questions", "correct_answer": "", "explanation": ""}]
+
+def legacy_parse_evaluation(response_text: str) -> dict:
+    """The original _parse_evaluation_response"""
+    is_correct_match = re.search(r'IS_CORRECT:\s*(True|False)', response_text, re.IGNORECASE)
+    feedback_match = re.search(r'FEEDBACK:\s*(.*?)(?=CORRECT_ANSWER:|$)', response_text, re.DOTALL)
+    correct_answer_match = re.search(r'CORRECT_ANSWER:\s*(.*?)(?=JUSTIFICATION:|$)', response_text, re.DOTALL)
+    justification_match = re.search(r'JUSTIFICATION:\s*(.*?)(?=SCORE:|$)', response_text, re.DOTALL)
+    score_match = re.search(r'SCORE:\s*(\d+)', response_text)
+
+    return {
+        "is_correct": is_correct_match.group(1).lower() == 'true' if is_correct_match else False,
+        "feedback": feedback_match.group(1).strip() if feedback_match else "Unable to parse feedback",
+        "correct_answer": correct_answer_match.group(1).strip() if correct_answer_match else "Unable to parse correct answer",
+        "justification": justification_match.group(1).strip() if justification_match else "Unable to parse justification",
+        "score": int(score_match.group(1)) if score_match else 0
+    }
+
+def make_responses(words: int) -> dict:
+    """Build well-formed responses of each type whose free-text fields have about `words` words each"""
+    def field(seed: int) -> str:
+        return make_text(words, seed=seed).replace("\n", " ").strip()
+
+    answer = f"ANSWER: {field(1)}\nJUSTIFICATION: {field(2)}\nSOURCE_REFERENCE: [Chunk 3] {field(3)}"
+    challenge = "\n\n".join(
+        f"QUESTION_{i}: {field(10 + i)}?\nANSWER_{i}: {field(20 + i)}\nEXPLANATION_{i}: {field(30 + i)}"
+        for i in range(1, 4)
+    )
+    evaluation = (
+        f"IS_CORRECT: True\nFEEDBACK: {field(4)}\nCORRECT_ANSWER: {field(5)}\n"
+        f"JUSTIFICATION: {field(6)}\nSCORE: 85"
+    )
+    return {"answer": answer, "challenge": challenge, "evaluation": evaluation}
+
+PARSERS = {
+    "answer": (legacy_parse_answer, ANSWER_KEYS, answer_from_fields),
+    "challenge": (legacy_parse_challenge, CHALLENGE_KEYS, challenge_questions_from_fields),
+    "evaluation": (legacy_parse_evaluation, EVALUATION_KEYS, evaluation_from_fields),
+}
+
+def chunked(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def stream_section(chunks: list, keys, build):
+    parser = SectionStreamParser(keys)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return build(parser.values)
+
+def stream_legacy(chunks: list, legacy):
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        result = legacy(text)
+    return result
+
+def per_call_us(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000], help="words per field")
+    parser.add_argument("--repeat", type=int, default=2000, help="parses per timing run")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for words in args.sizes:
+        for kind, text in make_responses(words).items():
+            legacy, keys, build = PARSERS[kind]
+            if legacy(text) != build(parse_sections(text, keys)):
+                raise SystemExit(f"{kind}: parsers disagree at {words} words per field")
+
+            # Fewer repetitions for large inputs and for the quadratic legacy streaming
+            repeat = max(1, args.repeat * 20 // (words + 20))
+            chunks = chunked(text, args.chunk_chars)
+            stream_repeat = max(1, repeat // max(1, len(chunks) // 10))
+            row = {
+                "type": kind,
+                "words_per_field": words,
+                "chars": len(text),
+                "legacy_us": per_call_us(lambda: legacy(text), repeat),
+                "section_us": per_call_us(lambda: build(parse_sections(text, keys)), repeat),
+                "legacy_streamed_us": per_call_us(lambda: stream_legacy(chunks, legacy), stream_repeat),
+                "section_streamed_us": per_call_us(lambda: stream_section(chunks, keys, build), stream_repeat),
+            }
+            results.append(row)
+            print(f"{kind:>10} {len(text):>8} chars  legacy {row['legacy_us']:10.1f}us  "
+                  f"section {row['section_us']:10.1f}us  |  streamed legacy {row['legacy_streamed_us']:12.1f}us  "
+                  f"section {row['section_streamed_us']:10.1f}us")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare the legacy PDF extraction path with the spooled, parallel, streaming pipeline
+
+Usage: python benchmarks/bench_pdf_extraction.py --pages 500 --workers 4
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+
+import PyPDF2
+
+from pdf_extraction import iter_pdf_pages
+from pdf_fixtures import make_pdf
+from retrieval import ChunkIndex
+
+def legacy_extract(pdf_content: bytes) -> str:
+    """The original extract_text_from_pdf: sequential pages, text built with +="""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return text
+
+def run_legacy(pdf_content: bytes) -> dict:
+    start = time.perf_counter()
+    text = legacy_extract(pdf_content)
+    extracted = time.perf_counter()
+    index = ChunkIndex(text)
+    done = time.perf_counter()
+    return {
+        "extract_s": extracted - start,
+        "first_chunk_s": extracted - start,
+        "total_s": done - start,
+        "chunks": len(index.chunks),
+        "chars": len(text)
+    }
+
+def run_pipeline(pdf_content: bytes, executor) -> dict:
+    start = time.perf_counter()
+    spool = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    with spool:
+        for offset in range(0, len(pdf_content), 1024 * 1024):
+            spool.write(pdf_content[offset:offset + 1024 * 1024])
+    first_chunk = []
+    parts = []
+
+    def pieces():
+        for page in iter_pdf_pages(spool.name, executor):
+            piece = page + "\n"
+            parts.append(piece)
+            if not first_chunk:
+                first_chunk.append(time.perf_counter())
+            yield piece
+
+    try:
+        index = ChunkIndex.from_pieces(pieces())
+        text = "".join(parts)
+    finally:
+        os.unlink(spool.name)
+    done = time.perf_counter()
+    return {
+        "extract_s": done - start,
+        "first_chunk_s": (first_chunk[0] if first_chunk else done) - start,
+        "total_s": done - start,
+        "chunks": len(index.chunks),
+        "chars": len(text)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    pdf_content = make_pdf(args.pages)
+    results = {"pages": args.pages, "bytes": len(pdf_content), "workers": args.workers, "legacy": [], "pipeline": []}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Warm the pool so process start-up is not billed to the first run
+        list(executor.map(abs, range(args.workers)))
+        for _ in range(args.repeat):
+            results["legacy"].append(run_legacy(pdf_content))
+            results["pipeline"].append(run_pipeline(pdf_content, executor))
+
+    for name in ("legacy", "pipeline"):
+        best = min(results[name], key=lambda run: run["total_s"])
+        print(f"{name:>8}: total {best['total_s']:.3f}s  first chunk {best['first_chunk_s']:.3f}s  "
+              f"chunks {best['chunks']}  chars {best['chars']}")
+    speedup = min(r["total_s"] for r in results["legacy"]) / min(r["total_s"] for r in results["pipeline"])
+    print(f" speedup: {speedup:.2f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Throughput scaling of the backend with the number of uvicorn worker processes
+
+For each worker count a fresh server is started on one shared SQLite
+document store. A set of documents is uploaded first; requests then land on
+whichever worker the OS hands the connection to, so every document is read
+by workers that did not ingest it. A request for a document a worker cannot
+see counts as an error.
+
+The stub LLM answers instantly by default, so the numbers show how the
+service's own CPU work (ingestion, retrieval, prompt building) scales with
+cores. Speedup is relative to the first worker count.
+
+Scaling is not guaranteed. Workers only help when spare cores back them,
+and the load generator runs on the same machine and competes for those
+cores. The script prints os.cpu_count() and the cores this process may use,
+and warns when a worker count exceeds them. Each extra worker also costs
+its own process, caches and SQLite connection, and uploads from different
+workers queue on the store's single write lock, so with too few cores more
+workers are slower than one. Read the speedups together with the printed
+core count.
+
+Usage:
+    python benchmarks/bench_scaling.py --workers 1 2 4 --concurrency 32 --requests 256 --output scaling.json
+"""
+import argparse
+import json
+import os
+import platform
+import time
+
+import requests
+
+from bench_endpoints import Server, git_commit, make_document, read_rss_mb, run_scenario
+
+ENDPOINTS = ["upload", "ask", "status"]
+
+def available_cores() -> int:
+    """Cores this process may run on (the CPU affinity mask where supported), not just those installed"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def upload_documents(base: str, count: int, words: int, first_variant: int) -> list:
+    """Upload count distinct TXT documents and return their IDs"""
+    ids = []
+    for variant in range(first_variant, first_variant + count):
+        filename, content, mime = make_document("txt", words, variant)
+        response = requests.post(f"{base}/upload-document/", files={"file": (filename, content, mime)}, timeout=600)
+        response.raise_for_status()
+        ids.append(response.json()["document_id"])
+    return ids
+
+def benchmark_workers(workers: int, args) -> list:
+    server = Server(workers, {
+        "STUB_LATENCY_MS": str(args.stub_latency_ms),
+        "STUB_LATENCY_JITTER_MS": "0",
+        "STUB_TOKENS_PER_SECOND": "0",
+    })
+    results = []
+    try:
+        server.wait_ready()
+        base = server.base_url
+        document_ids = upload_documents(base, args.docs, args.words, first_variant=0)
+        variant = args.docs
+
+        for endpoint in args.endpoints:
+            if endpoint == "upload":
+                payloads = [make_document("txt", args.words, variant + i) for i in range(args.requests)]
+                variant += args.requests
+
+                def call(session, doc):
+                    return session.post(f"{base}/upload-document/", files={"file": doc}, timeout=600).status_code == 200
+            elif endpoint == "ask":
+                payloads = [
+                    {"document_id": document_ids[i % len(document_ids)], "question": f"What are the payment terms? ({i})"}
+                    for i in range(args.requests)
+                ]
+
+                def call(session, payload):
+                    return session.post(f"{base}/ask-question/", json=payload, timeout=120).status_code == 200
+            else:
+                payloads = [document_ids[i % len(document_ids)] for i in range(args.requests)]
+
+                def call(session, document_id):
+                    return session.get(f"{base}/documents/{document_id}/status", timeout=30).status_code == 200
+
+            result = run_scenario(call, payloads, args.concurrency)
+            rss, peak = read_rss_mb(server.process.pid)
+            result.update({"endpoint": endpoint, "workers": workers, "rss_mb": rss, "peak_rss_mb": peak})
+            results.append(result)
+    finally:
+        server.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256, help="requests per endpoint and worker count")
+    parser.add_argument("--docs", type=int, default=8, help="documents uploaded before measuring")
+    parser.add_argument("--words", type=int, default=20000, help="words per document")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--stub-latency-ms", type=float, default=0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    cores = available_cores()
+    print(f"os.cpu_count()={os.cpu_count()}, usable cores={cores}")
+    for workers in args.workers:
+        if workers > cores:
+            print(f"warning: {workers} workers on {cores} usable cores (shared with the load generator); "
+                  f"expect no speedup beyond {cores} workers")
+
+    results = []
+    for workers in args.workers:
+        results.extend(benchmark_workers(workers, args))
+
+    baseline = {r["endpoint"]: r["rps"] for r in results if r["workers"] == args.workers[0]}
+    for result in results:
+        result["speedup"] = result["rps"] / baseline[result["endpoint"]] if baseline[result["endpoint"]] else 0.0
+        print(f"{result['endpoint']:>7} workers={result['workers']:<3} {result['rps']:8.1f} req/s  "
+              f"x{result['speedup']:.2f}  p95 {result['p95_ms']:8.1f}ms  errors {result['errors']}  "
+              f"RSS {result['rss_mb']} MB")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "usable_cpus": cores,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
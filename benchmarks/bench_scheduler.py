@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+LLM call scheduling under bursts, mixed priorities and duplicate prompts
+
+Runs in-process against the stub backend, comparing the legacy path (a
+semaphore capping calls in flight, nothing else) with the LLM scheduler:
+
+- quota: --rate calls/s for --duration seconds against a stub that rejects
+  calls beyond --quota-rpm in any minute with a 429. Legacy calls fail once
+  the quota is spent; the scheduler paces calls under the quota, retries
+  the rest and sheds what would only queue, answering with Retry-After;
+- priority: interactive questions arriving while a backlog of background
+  summary calls is queued, first come first served versus by priority;
+- coalescing: --identical identical prompts sent at once, backend calls
+  made and wall time.
+
+Usage: python benchmarks/bench_scheduler.py --quota-rpm 300 --rate 30 --duration 20 --output scheduler.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+
+from bench_endpoints import git_commit
+from llm_backends import StubBackend
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, Overloaded, is_rate_limited
+
+def percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None}
+    latencies = sorted(latencies)
+    return {"p50_ms": latencies[len(latencies) // 2], "p95_ms": latencies[int(len(latencies) * 0.95)]}
+
+def stub(latency_ms: float, quota_rpm: int = 0) -> StubBackend:
+    return StubBackend(latency_ms=latency_ms, jitter_ms=0, tokens_per_second=0, rate_limit_rpm=quota_rpm)
+
+async def legacy_call(backend: StubBackend, slots: asyncio.Semaphore, prompt: str) -> str:
+    async with slots:
+        return await backend.generate_async(prompt)
+
+async def offered_load(rate: float, duration: float, send) -> dict:
+    """Start send(i) at a fixed rate and tally outcomes: ok (with latency), 429, shed"""
+    outcome = {"ok": 0, "rate_limited": 0, "shed": 0, "other_errors": 0}
+    latencies = []
+
+    async def one(i: int):
+        start = time.perf_counter()
+        try:
+            await send(i)
+        except Overloaded:
+            outcome["shed"] += 1
+            return
+        except Exception as e:
+            outcome["rate_limited" if is_rate_limited(e) else "other_errors"] += 1
+            return
+        outcome["ok"] += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * duration)):
+        await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(i)))
+    await asyncio.gather(*tasks)
+    return {**outcome, "sent": len(tasks), "wall_s": time.perf_counter() - start, **percentiles(latencies)}
+
+async def quota_scenario(args) -> dict:
+    backend = stub(args.latency_ms, args.quota_rpm)
+    slots = asyncio.Semaphore(args.concurrency)
+    legacy = await offered_load(args.rate, args.duration, lambda i: legacy_call(backend, slots, f"legacy {i}"))
+
+    # A fresh quota window, and limits that stay under it for a sliding minute
+    backend = stub(args.latency_ms, args.quota_rpm)
+    burst_seconds = 10
+    scheduler = LLMScheduler(
+        args.concurrency, requests_per_minute=args.quota_rpm * 0.95 * 60 / (60 + burst_seconds),
+        tokens_per_minute=0, max_queue=args.max_queue, burst_seconds=burst_seconds
+    )
+    scheduled = await offered_load(
+        args.rate, args.duration,
+        lambda i: scheduler.run_async(lambda: backend.generate_async(f"scheduled {i}"), 1, priority=INTERACTIVE)
+    )
+    scheduled["retry_after_s"] = scheduler.retry_after()
+    return {"legacy": legacy, "scheduler": scheduled}
+
+async def priority_scenario(args) -> dict:
+    results = {}
+    for name, interactive_priority in (("fifo", BACKGROUND), ("priority", INTERACTIVE)):
+        backend = stub(args.latency_ms)
+        scheduler = LLMScheduler(args.concurrency, requests_per_minute=0, tokens_per_minute=0)
+        background = [
+            asyncio.create_task(scheduler.run_async(lambda i=i: backend.generate_async(f"section {i}"), 1,
+                                                    priority=BACKGROUND))
+            for i in range(args.backlog)
+        ]
+        await asyncio.sleep(0)
+
+        async def interactive(i: int):
+            await asyncio.sleep(i * args.interactive_interval)
+            start = time.perf_counter()
+            await scheduler.run_async(lambda: backend.generate_async(f"question {i}"), 1, priority=interactive_priority)
+            return (time.perf_counter() - start) * 1000
+
+        latencies = await asyncio.gather(*(interactive(i) for i in range(args.interactive)))
+        await asyncio.gather(*background)
+        results[name] = percentiles(latencies)
+    return results
+
+async def coalescing_scenario(args) -> dict:
+    results = {}
+    for name in ("legacy", "scheduler"):
+        backend = stub(args.latency_ms)
+        calls = 0
+
+        async def generate() -> str:
+            nonlocal calls
+            calls += 1
+            return await backend.generate_async("the same prompt")
+
+        start = time.perf_counter()
+        if name == "legacy":
+            slots = asyncio.Semaphore(args.concurrency)
+
+            async def call():
+                async with slots:
+                    return await generate()
+            await asyncio.gather(*(call() for _ in range(args.identical)))
+        else:
+            scheduler = LLMScheduler(args.concurrency, requests_per_minute=0, tokens_per_minute=0)
+            await asyncio.gather(*(scheduler.run_async(generate, 1, key="same") for _ in range(args.identical)))
+        results[name] = {"backend_calls": calls, "wall_ms": (time.perf_counter() - start) * 1000}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight")
+    parser.add_argument("--latency-ms", type=float, default=200, help="stub time per call")
+    parser.add_argument("--quota-rpm", type=int, default=300, help="stub provider quota")
+    parser.add_argument("--rate", type=float, default=30, help="calls/s offered in the quota scenario")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of offered load")
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--backlog", type=int, default=200, help="background calls queued in the priority scenario")
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--interactive-interval", type=float, default=0.25)
+    parser.add_argument("--identical", type=int, default=50)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {
+        "quota": asyncio.run(quota_scenario(args)),
+        "priority": asyncio.run(priority_scenario(args)),
+        "coalescing": asyncio.run(coalescing_scenario(args)),
+    }
+    for name, row in results["quota"].items():
+        print(f"quota {name:>9}: {row['ok']}/{row['sent']} ok, {row['rate_limited']} rate limited (429), "
+              f"{row['shed']} shed (503), p50 {row['p50_ms'] or 0:.0f}ms  p95 {row['p95_ms'] or 0:.0f}ms")
+    for name, row in results["priority"].items():
+        print(f"interactive behind {args.backlog} background calls, {name:>8}: "
+              f"p50 {row['p50_ms']:.0f}ms  p95 {row['p95_ms']:.0f}ms")
+    for name, row in results["coalescing"].items():
+        print(f"{args.identical} identical prompts, {name:>9}: {row['backend_calls']} backend calls in {row['wall_ms']:.0f}ms")
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
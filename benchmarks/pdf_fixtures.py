@@ -0,0 +1,66 @@
+"""
+Synthetic PDF and text documents for benchmarks
+"""
+import random
+
+WORDS = (
+    "agreement party shall provide services payment invoice term termination notice "
+    "liability warranty delivery schedule revenue growth quarter report analysis risk "
+    "compliance policy data security audit contract clause obligation breach remedy "
+    "the of and to in for on with by as is that this be are from at"
+).split()
+
+def make_text(words: int, seed: int = 0) -> str:
+    """Return deterministic filler text with sentences and paragraphs"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(words):
+        out.append(rng.choice(WORDS))
+        if i % 15 == 14:
+            out[-1] += "."
+        if i % 120 == 119:
+            out[-1] += "\n\n"
+    return " ".join(out)
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: int, lines_per_page: int = 45, words_per_line: int = 12, seed: int = 0) -> bytes:
+    """Build a text-only PDF with the given number of pages"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [f"Page {page + 1}"] + [
+            " ".join(rng.choice(WORDS) for _ in range(words_per_line)) + "."
+            for _ in range(lines_per_page)
+        ]
+        stream = "BT /F1 10 Tf 12 TL 50 770 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        page_number = len(objects) + 1
+        content_number = page_number + 1
+        kids.append(f"{page_number} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream_bytes)} >>\nstream\n".encode() + stream_bytes + b"\nendstream"
+        )
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
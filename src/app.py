@@ -1,9 +1,23 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+import html
 import json
 import os
 import sys
 from typing import Dict, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:8000').rstrip('/')
+# Seconds to open a connection / to wait for a response (LLM-backed calls can take a while)
+BACKEND_CONNECT_TIMEOUT = float(os.getenv('BACKEND_CONNECT_TIMEOUT', '3.05'))
+BACKEND_READ_TIMEOUT = float(os.getenv('BACKEND_READ_TIMEOUT', '300'))
+BACKEND_POOL_SIZE = int(os.getenv('BACKEND_POOL_SIZE', '10'))
+# The health badge is re-checked at most this often, not on every rerun
+HEALTH_CHECK_TTL_SECONDS = float(os.getenv('HEALTH_CHECK_TTL_SECONDS', '15'))
+HEALTH_CHECK_TIMEOUT = 2
 
 # Add backend directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
@@ -167,35 +181,88 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Return the keep-alive HTTP session shared by every browser session and rerun"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=HEALTH_CHECK_TTL_SECONDS, show_spinner=False)
+def backend_online() -> bool:
+    """Return whether the backend answers /health/, cached for HEALTH_CHECK_TTL_SECONDS"""
+    try:
+        response = get_http_session().get(f"{BACKEND_URL}/health/", timeout=HEALTH_CHECK_TIMEOUT)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
 class DocumentAssistant:
-    def __init__(self):
-        self.base_url = "http://localhost:8000"
+    def __init__(self, session: requests.Session = None, base_url: str = BACKEND_URL):
+        self.base_url = base_url
+        # Reusing one pooled session avoids a new TCP connection per call
+        self.session = session or get_http_session()
+        self.timeout = (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT)
         
     def upload_document(self, file):
         """Upload document to backend"""
         files = {"file": (file.name, file.getvalue(), file.type)}
-        response = requests.post(f"{self.base_url}/upload-document/", files=files)
+        response = self.session.post(f"{self.base_url}/upload-document/", files=files, timeout=self.timeout)
+        return response.json()
+    
+    def get_document_status(self, document_id: str, wait: float = 0):
+        """Get the summary status, long-polling up to wait seconds for it to finish"""
+        response = self.session.get(
+            f"{self.base_url}/documents/{document_id}/status",
+            params={"wait": wait},
+            timeout=(BACKEND_CONNECT_TIMEOUT, wait + 10)
+        )
         return response.json()
     
-    def ask_question(self, document_id: str, question: str):
+    def create_conversation(self, document_id: str):
+        """Start a server-side conversation so follow-up questions keep their context"""
+        response = self.session.post(f"{self.base_url}/documents/{document_id}/conversations", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["conversation_id"]
+    
+    def ask_question(self, document_id: str, question: str, conversation_id: str = None):
         """Ask a question about the document"""
-        data = {"document_id": document_id, "question": question}
-        response = requests.post(f"{self.base_url}/ask-question/", json=data)
+        data = {"document_id": document_id, "question": question, "conversation_id": conversation_id}
+        response = self.session.post(f"{self.base_url}/ask-question/", json=data, timeout=self.timeout)
         return response.json()
     
+    def ask_question_stream(self, document_id: str, question: str, conversation_id: str = None):
+        """Ask a question and yield (event, data) pairs as the answer streams"""
+        data = {"document_id": document_id, "question": question, "conversation_id": conversation_id}
+        with self.session.post(f"{self.base_url}/ask-question/stream/", json=data, stream=True,
+                               timeout=self.timeout) as response:
+            response.raise_for_status()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:") and event:
+                    yield event, json.loads(line[len("data:"):])
+                    event = None
+    
     def generate_challenge(self, document_id: str):
         """Generate challenge questions"""
-        response = requests.post(f"{self.base_url}/generate-challenge/", params={"document_id": document_id})
+        response = self.session.post(
+            f"{self.base_url}/generate-challenge/", params={"document_id": document_id}, timeout=self.timeout
+        )
         return response.json()
     
-    def evaluate_answer(self, document_id: str, question_id: int, user_answer: str):
-        """Evaluate user's answer"""
+    def evaluate_answer(self, document_id: str, challenge_id: str, question_id: int, user_answer: str):
+        """Evaluate user's answer against the challenge stored on the server"""
         data = {
             "document_id": document_id,
+            "challenge_id": challenge_id,
             "question_id": question_id,
             "user_answer": user_answer
         }
-        response = requests.post(f"{self.base_url}/evaluate-answer/", json=data)
+        response = self.session.post(f"{self.base_url}/evaluate-answer/", json=data, timeout=self.timeout)
         return response.json()
 
 def initialize_session_state():
@@ -208,10 +275,19 @@ def initialize_session_state():
         st.session_state.document_summary = None
     if 'challenge_questions' not in st.session_state:
         st.session_state.challenge_questions = []
+    if 'challenge_id' not in st.session_state:
+        st.session_state.challenge_id = None
     if 'current_mode' not in st.session_state:
         st.session_state.current_mode = None
     if 'conversation_history' not in st.session_state:
         st.session_state.conversation_history = []
+    if 'conversation_id' not in st.session_state:
+        st.session_state.conversation_id = None
+    # Latest answer and challenge evaluations, kept so a rerun (e.g. while polling for the summary) redraws them
+    if 'last_answer' not in st.session_state:
+        st.session_state.last_answer = None
+    if 'challenge_evaluations' not in st.session_state:
+        st.session_state.challenge_evaluations = {}
 
 def display_header():
     """Display the main header with animations and robot theme"""
@@ -244,21 +320,13 @@ def display_header():
     # Status indicator
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        try:
-            response = requests.get("http://localhost:8000/health/", timeout=2)
-            if response.status_code == 200:
-                st.markdown('''
-                <div style="text-align: center;">
-                    <span class="status-badge status-online">🟢 AI Engine Online</span>
-                </div>
-                ''', unsafe_allow_html=True)
-            else:
-                st.markdown('''
-                <div style="text-align: center;">
-                    <span class="status-badge status-offline">🔴 AI Engine Offline</span>
-                </div>
-                ''', unsafe_allow_html=True)
-        except:
+        if backend_online():
+            st.markdown('''
+            <div style="text-align: center;">
+                <span class="status-badge status-online">🟢 AI Engine Online</span>
+            </div>
+            ''', unsafe_allow_html=True)
+        else:
             st.markdown('''
             <div style="text-align: center;">
                 <span class="status-badge status-offline">🔴 AI Engine Offline</span>
@@ -325,7 +393,8 @@ def handle_document_upload():
                 
                 st.session_state.document_uploaded = True
                 st.session_state.document_id = result["document_id"]
-                st.session_state.document_summary = result["summary"]
+                # The summary may still be generating; display_document_summary waits for it
+                st.session_state.document_summary = result.get("summary")
                 
                 # Success animation
                 st.success(f"🎉 Document '{result['filename']}' processed successfully!")
@@ -337,8 +406,39 @@ def handle_document_upload():
         except Exception as e:
             st.error(f"❌ Error uploading document: {str(e)}")
 
+def wait_for_document_summary(placeholder):
+    """Long-poll the backend for the summary, then rerun so it is rendered
+    
+    The rerun redraws the page from session state, so the latest answer and
+    challenge evaluations must live there rather than only on the page.
+    """
+    try:
+        assistant = DocumentAssistant()
+        # Short waits keep the page responsive: a click interrupts the script between polls
+        status = assistant.get_document_status(st.session_state.document_id, wait=5)
+    except Exception as e:
+        placeholder.error(f"❌ Error fetching summary: {str(e)}")
+        return
+    
+    if status.get("status") == "completed":
+        st.session_state.document_summary = status["summary"]
+        st.rerun()
+    elif status.get("status") == "failed":
+        placeholder.error(f"❌ Summary generation failed: {status.get('error')}")
+    else:
+        st.rerun()
+
 def display_document_summary():
-    """Display document summary with enhanced styling"""
+    """Display document summary with enhanced styling
+    
+    Returns a placeholder to fill once the summary is still being generated.
+    """
+    if st.session_state.document_id and not st.session_state.document_summary:
+        st.markdown('<h2 class="sub-header">📄 Document Intelligence</h2>', unsafe_allow_html=True)
+        placeholder = st.empty()
+        placeholder.info("🧠 Generating summary... you can start asking questions meanwhile")
+        return placeholder
+    
     if st.session_state.document_summary:
         st.markdown('<h2 class="sub-header">📄 Document Intelligence</h2>', unsafe_allow_html=True)
         
@@ -369,6 +469,60 @@ def display_document_summary():
                 </div>
             </div>
             ''', unsafe_allow_html=True)
+    
+    return None
+
+def render_snippets(highlights: Dict) -> str:
+    """Build HTML for the located source snippets of an answer, marking each highlight"""
+    blocks = []
+    for window in highlights.get("windows", []):
+        text = window["text"]
+        parts = []
+        position = 0
+        for h in window["highlights"]:
+            start = max(h["start"] - window["start"], position)
+            end = h["end"] - window["start"]
+            if end <= start:
+                continue
+            weight = "background: rgba(255,235,59,0.45);" if h["kind"] == "reference" else "background: rgba(255,255,255,0.3);"
+            parts.append(html.escape(text[position:start]))
+            parts.append(f'<mark style="{weight} color: inherit;">{html.escape(text[start:end])}</mark>')
+            position = end
+        parts.append(html.escape(text[position:]))
+        pages = window["page_start"] if window["page_start"] == window["page_end"] else f'{window["page_start"]}–{window["page_end"]}'
+        blocks.append(
+            f'<p style="margin: 0.5rem 0 0 0; opacity: 0.9; font-size: 0.95rem;">'
+            f'<strong>p. {pages}</strong> …{"".join(parts)}…</p>'
+        )
+    return "".join(blocks)
+
+def render_question_card(question: str) -> str:
+    """Build the question card HTML shown above an answer"""
+    return f'''
+    <div class="question-card fade-in-up">
+        <h4 style="margin-bottom: 1rem;">❓ Your Question</h4>
+        <p style="font-size: 1.1rem; margin: 0;">{question}</p>
+    </div>
+    '''
+
+def render_answer_card(result: Dict) -> str:
+    """Build the answer card HTML for a (possibly partial) answer"""
+    snippets = render_snippets(result["highlights"]) if result.get("highlights") else ""
+    return f'''
+    <div class="answer-card fade-in-up">
+        <h4 style="margin-bottom: 1rem;">🤖 AI Response</h4>
+        <p style="font-size: 1.1rem; line-height: 1.6; margin-bottom: 1.5rem;">
+            {result["answer"]}
+        </p>
+        <div style="border-top: 1px solid rgba(255,255,255,0.3); padding-top: 1rem;">
+            <p style="margin-bottom: 0.5rem;"><strong>📝 Reasoning:</strong></p>
+            <p style="margin-bottom: 1rem; opacity: 0.9;">{result["justification"]}</p>
+            <p style="margin-bottom: 0.5rem;"><strong>📍 Source:</strong></p>
+            <p style="margin: 0; opacity: 0.9;">{result["source_reference"]}</p>
+            {snippets}
+        </div>
+    </div>
+    '''
 
 def handle_ask_anything_mode():
     """Handle Ask Anything interaction mode with enhanced UI"""
@@ -391,31 +545,29 @@ def handle_ask_anything_mode():
         with st.spinner("🧠 AI is analyzing your question..."):
             try:
                 assistant = DocumentAssistant()
-                result = assistant.ask_question(st.session_state.document_id, question)
                 
                 # Display question
-                st.markdown(f'''
-                <div class="question-card fade-in-up">
-                    <h4 style="margin-bottom: 1rem;">❓ Your Question</h4>
-                    <p style="font-size: 1.1rem; margin: 0;">{question}</p>
-                </div>
-                ''', unsafe_allow_html=True)
+                st.markdown(render_question_card(question), unsafe_allow_html=True)
                 
-                # Display answer
-                st.markdown(f'''
-                <div class="answer-card fade-in-up">
-                    <h4 style="margin-bottom: 1rem;">🤖 AI Response</h4>
-                    <p style="font-size: 1.1rem; line-height: 1.6; margin-bottom: 1.5rem;">
-                        {result["answer"]}
-                    </p>
-                    <div style="border-top: 1px solid rgba(255,255,255,0.3); padding-top: 1rem;">
-                        <p style="margin-bottom: 0.5rem;"><strong>📝 Reasoning:</strong></p>
-                        <p style="margin-bottom: 1rem; opacity: 0.9;">{result["justification"]}</p>
-                        <p style="margin-bottom: 0.5rem;"><strong>📍 Source:</strong></p>
-                        <p style="margin: 0; opacity: 0.9;">{result["source_reference"]}</p>
-                    </div>
-                </div>
-                ''', unsafe_allow_html=True)
+                # Render the answer progressively as sections stream in
+                answer_placeholder = st.empty()
+                result = {"answer": "", "justification": "", "source_reference": ""}
+                if st.session_state.conversation_id is None:
+                    st.session_state.conversation_id = assistant.create_conversation(st.session_state.document_id)
+                
+                for event, data in assistant.ask_question_stream(
+                    st.session_state.document_id, question, st.session_state.conversation_id
+                ):
+                    if event == "delta":
+                        result[data["field"]] += data["text"]
+                    elif event == "field":
+                        result[data["field"]] = data["value"]
+                    elif event == "done":
+                        result = data
+                    else:
+                        continue
+                    answer_placeholder.markdown(render_answer_card(result), unsafe_allow_html=True)
+                st.session_state.last_answer = {"question": question, **result}
                 
                 # Add to conversation history
                 st.session_state.conversation_history.append({
@@ -429,6 +581,10 @@ def handle_ask_anything_mode():
                 st.error(f"❌ Error getting answer: {str(e)}")
     elif ask_button and not question:
         st.warning("⚠️ Please enter a question to get started!")
+    elif st.session_state.last_answer:
+        # Redraw the latest answer on reruns that did not ask a new question
+        st.markdown(render_question_card(st.session_state.last_answer["question"]), unsafe_allow_html=True)
+        st.markdown(render_answer_card(st.session_state.last_answer), unsafe_allow_html=True)
     
     # Display recent conversations if any
     if st.session_state.conversation_history:
@@ -441,6 +597,35 @@ def handle_ask_anything_mode():
                 st.markdown(f"**Answer:** {conv['answer']}")
                 st.markdown(f"**Source:** {conv['source_reference']}")
 
+def render_evaluation_card(question_data: Dict, user_answer: str, evaluation: Dict) -> str:
+    """Build the evaluation card HTML for a submitted challenge answer"""
+    verdict = "✅ Correct" if evaluation["is_correct"] else "❌ Not quite"
+    return f'''
+    <div class="evaluation-card fade-in-up">
+        <h4 style="color: #2d3748; margin-bottom: 1rem;">📊 Evaluation Results: {verdict} ({evaluation["score"]}/100)</h4>
+        
+        <div style="margin-bottom: 1rem; padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
+            <p style="margin-bottom: 0.5rem;"><strong>Your Answer:</strong></p>
+            <p style="margin: 0; color: #4a5568;">{user_answer}</p>
+        </div>
+        
+        <div style="margin-bottom: 1rem; padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
+            <p style="margin-bottom: 0.5rem;"><strong>💬 Feedback:</strong></p>
+            <p style="margin: 0; color: #4a5568;">{evaluation["feedback"]}</p>
+        </div>
+        
+        <div style="margin-bottom: 1rem; padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
+            <p style="margin-bottom: 0.5rem;"><strong>Expected Answer:</strong></p>
+            <p style="margin: 0; color: #4a5568;">{question_data["correct_answer"]}</p>
+        </div>
+        
+        <div style="padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
+            <p style="margin-bottom: 0.5rem;"><strong>📚 Explanation & Reasoning:</strong></p>
+            <p style="margin: 0; color: #4a5568;">{question_data["explanation"]}</p>
+        </div>
+    </div>
+    '''
+
 def handle_challenge_mode():
     """Handle Challenge Me interaction mode with enhanced UI"""
     st.markdown('<h2 class="sub-header">🎯 Challenge Me Mode</h2>', unsafe_allow_html=True)
@@ -476,6 +661,8 @@ def handle_challenge_mode():
                         
                         if result.get("success"):
                             st.session_state.challenge_questions = result["questions"]
+                            st.session_state.challenge_id = result["challenge_id"]
+                            st.session_state.challenge_evaluations = {}
                             st.success("🎉 Challenge questions generated! Get ready to test your knowledge!")
                             st.rerun()
                         else:
@@ -519,33 +706,28 @@ def handle_challenge_mode():
                     if user_answer.strip():
                         with st.spinner("🔍 AI is evaluating your response..."):
                             try:
-                                # Display evaluation
-                                st.markdown(f'''
-                                <div class="evaluation-card fade-in-up">
-                                    <h4 style="color: #2d3748; margin-bottom: 1rem;">📊 Evaluation Results</h4>
-                                    
-                                    <div style="margin-bottom: 1rem; padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
-                                        <p style="margin-bottom: 0.5rem;"><strong>Your Answer:</strong></p>
-                                        <p style="margin: 0; color: #4a5568;">{user_answer}</p>
-                                    </div>
-                                    
-                                    <div style="margin-bottom: 1rem; padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
-                                        <p style="margin-bottom: 0.5rem;"><strong>Expected Answer:</strong></p>
-                                        <p style="margin: 0; color: #4a5568;">{question_data["correct_answer"]}</p>
-                                    </div>
-                                    
-                                    <div style="padding: 1rem; background: rgba(255,255,255,0.7); border-radius: 10px;">
-                                        <p style="margin-bottom: 0.5rem;"><strong>📚 Explanation & Reasoning:</strong></p>
-                                        <p style="margin: 0; color: #4a5568;">{question_data["explanation"]}</p>
-                                    </div>
-                                </div>
-                                ''', unsafe_allow_html=True)
+                                evaluation = DocumentAssistant().evaluate_answer(
+                                    st.session_state.document_id,
+                                    st.session_state.challenge_id,
+                                    question_data.get("question_id", i),
+                                    user_answer
+                                )
+                                if "score" not in evaluation:
+                                    raise RuntimeError(evaluation.get("detail", "evaluation failed"))
+                                st.session_state.challenge_evaluations[i] = {"answer": user_answer, "evaluation": evaluation}
                                 
                             except Exception as e:
                                 st.error(f"❌ Error evaluating answer: {str(e)}")
                     else:
                         st.warning("⚠️ Please provide an answer before submitting!")
             
+            submitted = st.session_state.challenge_evaluations.get(i)
+            if submitted:
+                st.markdown(
+                    render_evaluation_card(question_data, submitted["answer"], submitted["evaluation"]),
+                    unsafe_allow_html=True
+                )
+            
             st.markdown("---")
         
         # Option to generate new questions
@@ -553,6 +735,8 @@ def handle_challenge_mode():
         with col2:
             if st.button("🔄 Generate New Challenge", key="new_questions", use_container_width=True):
                 st.session_state.challenge_questions = []
+                st.session_state.challenge_id = None
+                st.session_state.challenge_evaluations = {}
                 st.rerun()
 
 def display_conversation_history():
@@ -586,7 +770,7 @@ def main():
         handle_document_upload()
     else:
         # Display document summary
-        display_document_summary()
+        summary_placeholder = display_document_summary()
         
         # Mode selection with enhanced UI
         st.markdown("---")
@@ -663,7 +847,8 @@ def main():
             if st.button("🔄 Upload New Document", use_container_width=True):
                 # Reset all session state
                 for key in ['document_uploaded', 'document_id', 'document_summary', 
-                           'challenge_questions', 'current_mode', 'conversation_history']:
+                           'challenge_questions', 'challenge_id', 'current_mode', 'conversation_history',
+                           'conversation_id', 'last_answer', 'challenge_evaluations']:
                     if key in st.session_state:
                         del st.session_state[key]
                 st.rerun()
@@ -685,17 +870,17 @@ def main():
             
             # Footer
             st.markdown("---")
+        
+        # Wait for a pending summary last, so the rest of the page is already usable
+        if summary_placeholder is not None:
+            wait_for_document_summary(summary_placeholder)
 
 if __name__ == "__main__":
-    # Check if backend is running
-    try:
-        response = requests.get("http://localhost:8000/health/")
-        if response.status_code != 200:
-            st.error("❌ Backend server is not running. Please start the FastAPI server first.")
-            st.code("cd src && python backend/api.py")
-            st.stop()
-    except requests.exceptions.ConnectionError:
-        st.error("❌ Cannot connect to backend server. Please start the FastAPI server first.")
+    # Check if backend is running (shares the cached health check with the header)
+    if not backend_online():
+        # Forget the failure so the next rerun checks again rather than waiting out the TTL
+        backend_online.clear()
+        st.error(f"❌ Cannot connect to backend server at {BACKEND_URL}. Please start the FastAPI server first.")
         st.code("cd src && python backend/api.py")
         st.stop()
     
@@ -1,13 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from document_processor import DocumentProcessor
-from models import QuestionRequest, ChallengeResponse, AnswerResponse, ChallengeEvaluation
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from document_processor import DocumentProcessor, RETRIEVAL_MODE
+from jobs import JobQueue, COMPLETED, FAILED, PENDING, RUNNING
+from llm_scheduler import BACKGROUND, BATCH, Overloaded, llm_priority
+from metrics import REGISTRY, CONTENT_TYPE, HTTP_REQUEST_SECONDS
+from models import (
+    QuestionRequest, ChallengeResponse, AnswerResponse, ChallengeEvaluation,
+    BatchQuestionRequest, BatchAnswerResponse, SummaryRequest, ConversationResponse,
+    CollectionRequest, CollectionDocumentsRequest, CollectionResponse, CollectionQuestionRequest,
+    CollectionAnswerResponse, HighlightRequest, Highlights, PagesResponse, PageText,
+    SearchRequest, SearchResponse
+)
 import os
+import json
+import asyncio
+import hashlib
+import socket
+import tempfile
+import time
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SUMMARY_WORKERS = int(os.getenv('SUMMARY_WORKERS', '2'))
+STATUS_MAX_WAIT_SECONDS = 60
+SSE_KEEPALIVE_SECONDS = 15
+# A summary claimed by a worker that has not reported back for this long is restarted elsewhere
+SUMMARY_LEASE_SECONDS = float(os.getenv('SUMMARY_LEASE_SECONDS', '600'))
+# How often a worker checks the store for a summary running in another worker
+JOB_POLL_SECONDS = 0.5
+# Identifies this server process in the shared job table
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
 app = FastAPI(title="GenAI Document Assistant", version="1.0.0")
 
 # Add CORS middleware
@@ -19,9 +47,172 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe per-endpoint latency, labelled by route template to keep label values bounded"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            endpoint=route.path if route is not None else "unmatched",
+            status=status
+        )
+
 # Initialize document processor
 doc_processor = DocumentProcessor()
 
+# Background jobs (summaries) run here so uploads return immediately
+job_queue = JobQueue(workers=SUMMARY_WORKERS)
+
+@app.on_event("startup")
+async def start_job_queue():
+    """Start the background job workers"""
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    """Stop the background job workers"""
+    await job_queue.stop()
+
+def format_sse(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def server_error(error: Exception) -> HTTPException:
+    """Map an unexpected error to a 500, or to a 503 with Retry-After when LLM calls are being shed"""
+    if isinstance(error, Overloaded):
+        return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+    return HTTPException(status_code=500, detail=str(error))
+
+def summary_job_id(document_id: str) -> str:
+    """Return the job ID used for a document's summary"""
+    return f"summary:{document_id}"
+
+async def run_summary(document_id: str) -> str:
+    """Summarize a document, publishing the job's progress to the shared store"""
+    job_id = summary_job_id(document_id)
+    doc_processor.store.set_job_status(job_id, RUNNING)
+    try:
+        with llm_priority(BACKGROUND):
+            summary = await doc_processor.summarize_document_async(document_id)
+    except Exception as e:
+        doc_processor.store.set_job_status(job_id, FAILED, str(e))
+        raise
+    doc_processor.store.set_job_status(job_id, COMPLETED)
+    return summary
+
+def enqueue_summary(document_id: str):
+    """Queue summary generation for a stored document"""
+    return job_queue.submit(summary_job_id(document_id), run_summary, document_id)
+
+def document_status(document_id: str, retry_failed: bool = False) -> dict:
+    """Return the processing status and summary of a stored document
+    
+    Summary jobs are tracked in the document store, so every worker reports
+    the same status and only the worker that claims a job runs it.
+    """
+    metadata = doc_processor.store.get_metadata(document_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    status = {
+        "document_id": document_id,
+        "status": COMPLETED,
+        "summary": metadata["summary"],
+        "error": None
+    }
+    if metadata["summary"] is None:
+        job_id = summary_job_id(document_id)
+        job = doc_processor.store.get_job(job_id)
+        stale = (job is not None and job["status"] in (PENDING, RUNNING)
+                 and job["updated"] < time.time() - SUMMARY_LEASE_SECONDS)
+        if job is None or stale or (retry_failed and job["status"] == FAILED):
+            # Nothing in flight anywhere (e.g. after a restart), so start the summary here
+            if doc_processor.store.claim_job(job_id, WORKER_ID, SUMMARY_LEASE_SECONDS, retry_failed):
+                enqueue_summary(document_id)
+            job = doc_processor.store.get_job(job_id)
+        if job["status"] == COMPLETED:
+            # Finished between reading the metadata and the job
+            status["summary"] = doc_processor.store.get_summary(document_id)
+        status["status"] = job["status"]
+        status["error"] = job["error"]
+    return status
+
+async def wait_for_summary(document_id: str, timeout: float) -> None:
+    """Wait up to timeout seconds for a document's summary job to finish, in any worker"""
+    job_id = summary_job_id(document_id)
+    local = job_queue.get(job_id)
+    if local is not None and local.status in (PENDING, RUNNING):
+        await job_queue.wait(job_id, timeout)
+        return
+    
+    # Running in another worker: poll the shared job table
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(JOB_POLL_SECONDS, deadline - time.monotonic()))
+        job = doc_processor.store.get_job(job_id)
+        if job is None or job["status"] not in (PENDING, RUNNING):
+            return
+
+# Raw-upload deduplication counters, see /dedup/stats/ (per worker process)
+dedup_counters = {"hits": 0, "misses": 0, "bytes_skipped": 0}
+
+def dedup_hit_ratio() -> float:
+    """Return the share of uploads served from the raw-byte dedup index"""
+    uploads = dedup_counters["hits"] + dedup_counters["misses"]
+    return dedup_counters["hits"] / uploads if uploads else 0.0
+
+# State read only when /metrics is scraped, so it costs nothing on the request path
+REGISTRY.gauge("docassist_documents_stored", "Documents in the document store",
+               callback=lambda: doc_processor.store.stats()["documents"])
+REGISTRY.gauge("docassist_documents_resident", "Document texts held in memory",
+               callback=lambda: doc_processor.store.stats()["resident_documents"])
+REGISTRY.gauge("docassist_retrieval_indexes_resident", "Retrieval indexes held in memory",
+               callback=lambda: len(doc_processor.indexes))
+REGISTRY.gauge("docassist_llm_cache_hit_ratio", "LLM response cache hits / lookups",
+               callback=lambda: doc_processor.response_cache.stats()["hit_ratio"])
+REGISTRY.gauge("docassist_llm_cache_entries", "LLM responses held in the in-memory cache",
+               callback=lambda: doc_processor.response_cache.stats()["memory_entries"])
+REGISTRY.gauge("docassist_upload_dedup_hit_ratio", "Uploads served from the raw-byte dedup index / uploads",
+               callback=dedup_hit_ratio)
+REGISTRY.gauge("docassist_job_queue_depth", "Background jobs queued but not started",
+               callback=lambda: job_queue.depth())
+
+async def spool_upload(file: UploadFile):
+    """Copy an upload to a temporary file in fixed-size chunks
+    
+    Returns the file path, the SHA-256 of the raw bytes and their size.
+    """
+    spool = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1])
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with spool:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                size += len(chunk)
+                spool.write(chunk)
+    except Exception:
+        os.unlink(spool.name)
+        raise
+    return spool.name, hasher.hexdigest(), size
+
+def ingest_txt_file(path: str, filename: str):
+    """Read, index and store a TXT document from disk"""
+    with open(path, 'rb') as f:
+        text = doc_processor.extract_text_from_txt(f.read())
+    return doc_processor.store_document(filename, text), text
+
 @app.post("/upload-document/")
 async def upload_document(file: UploadFile = File(...)):
     """Upload and process a document (PDF or TXT)"""
@@ -30,75 +221,327 @@ async def upload_document(file: UploadFile = File(...)):
         if not file.filename.lower().endswith(('.pdf', '.txt')):
             raise HTTPException(status_code=400, detail="Only PDF and TXT files are supported")
         
-        # Read file content
-        content = await file.read()
+        # Spool the upload to disk instead of holding it in memory, hashing it on the way
+        path, raw_hash, size = await spool_upload(file)
+        content_key = f"{os.path.splitext(file.filename)[1].lower()}:{raw_hash}"
         
-        # Extract text based on file type
-        if file.filename.lower().endswith('.pdf'):
-            text = doc_processor.extract_text_from_pdf(content)
-        else:
-            text = doc_processor.extract_text_from_txt(content)
+        try:
+            # Identical bytes were seen before: skip parsing, indexing and summarizing
+            doc_id = doc_processor.store.find_by_content_hash(content_key)
+            deduplicated = doc_id is not None
+            if deduplicated:
+                dedup_counters["hits"] += 1
+                dedup_counters["bytes_skipped"] += size
+            else:
+                dedup_counters["misses"] += 1
+                # Extract, index and store (CPU bound, keep it off the event loop)
+                if file.filename.lower().endswith('.pdf'):
+                    doc_id, _ = await run_in_threadpool(doc_processor.ingest_pdf_file, path, file.filename)
+                else:
+                    doc_id, _ = await run_in_threadpool(ingest_txt_file, path, file.filename)
+                doc_processor.store.put_content_hash(content_key, doc_id)
+        finally:
+            os.unlink(path)
         
-        # Store document
-        doc_id = doc_processor.store_document(file.filename, text)
-        
-        # Generate summary
-        summary = doc_processor.generate_summary(text)
+        # Summarize in the background; known documents already have a summary
+        status = document_status(doc_id, retry_failed=True)
         
         return JSONResponse({
             "success": True,
             "document_id": doc_id,
             "filename": file.filename,
-            "summary": summary,
-            "word_count": len(text.split())
+            "status": status["status"],
+            "summary": status["summary"],
+            "word_count": doc_processor.store.get_metadata(doc_id)["word_count"],
+            "deduplicated": deduplicated
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def page_range(page_start: Optional[int], page_end: Optional[int]) -> Optional[Tuple[int, int]]:
+    """Return the inclusive page range of a request, or None for the whole document"""
+    if page_start is None and page_end is None:
+        return None
+    return page_start or 1, page_end or page_start
+
+@app.get("/documents/{document_id}")
+async def get_document(document_id: str):
+    """Return a stored document's filename, word count, page count and summary"""
+    metadata = doc_processor.store.get_metadata(document_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    page_count = (await run_in_threadpool(doc_processor.get_pages, document_id)).page_count
+    return {"document_id": document_id, **metadata, "page_count": page_count}
+
+@app.get("/documents/{document_id}/pages", response_model=PagesResponse)
+async def get_pages(document_id: str, start: int = 1, end: Optional[int] = None):
+    """Return the text of pages start..end (inclusive, end defaults to start), reading only those pages"""
+    try:
+        pages = await run_in_threadpool(doc_processor.get_page_text, document_id, start, end or start)
+        page_count = doc_processor.get_pages(document_id).page_count
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"document_id": document_id, "page_count": page_count, "pages": pages}
+
+@app.get("/documents/{document_id}/pages/{number}", response_model=PageText)
+async def get_page(document_id: str, number: int):
+    """Return one page, e.g. to show a citation by page number"""
+    try:
+        return (await run_in_threadpool(doc_processor.get_page_text, document_id, number, number))[0]
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/documents/{document_id}/status")
+async def get_document_status(document_id: str, wait: float = 0):
+    """Return the summary status; with wait > 0, long-poll until it finishes or wait seconds pass"""
+    status = document_status(document_id)
+    if wait > 0 and status["status"] not in (COMPLETED, FAILED):
+        await wait_for_summary(document_id, min(wait, STATUS_MAX_WAIT_SECONDS))
+        status = document_status(document_id)
+    return status
+
+@app.get("/documents/{document_id}/events")
+async def document_events(document_id: str):
+    """Stream status changes as Server-Sent Events until the summary is ready or fails"""
+    status = document_status(document_id)
+    
+    async def events():
+        current = status
+        yield format_sse("status", current)
+        while current["status"] not in (COMPLETED, FAILED):
+            await wait_for_summary(document_id, SSE_KEEPALIVE_SECONDS)
+            previous, current = current, document_status(document_id)
+            if current["status"] != previous["status"]:
+                yield format_sse("status", current)
+            else:
+                yield ": keepalive\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/documents/{document_id}/summary")
+async def summarize_document(document_id: str, request: SummaryRequest):
+    """Summarize a document at another length or with a focus area, reusing cached section summaries"""
+    try:
+        pages = page_range(request.page_start, request.page_end)
+        # Map-reduce summaries make many calls; queue them behind interactive questions
+        with llm_priority(BATCH):
+            summary = await doc_processor.summarize_document_async(document_id, request.max_words, request.focus, pages)
+        return {
+            "document_id": document_id, "max_words": request.max_words, "focus": request.focus,
+            "pages": pages, "summary": summary
+        }
+    
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise server_error(e)
+
+def schedule_compaction(document_id: str, conversation_id: str):
+    """Queue folding of older turns into the conversation summary if enough are waiting"""
+    if conversation_id is None:
+        return
+    session = doc_processor.conversations.get(document_id, conversation_id)
+    if doc_processor.conversations.needs_compaction(session):
+        job_queue.submit(f"compact:{conversation_id}", doc_processor.compact_conversation_async,
+                         document_id, conversation_id)
+
+@app.post("/documents/{document_id}/conversations", response_model=ConversationResponse)
+async def create_conversation(document_id: str):
+    """Start a conversation; pass its ID with questions to ask follow-ups"""
+    try:
+        return doc_processor.conversations.create(document_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/documents/{document_id}/conversations/{conversation_id}", response_model=ConversationResponse)
+async def get_conversation(document_id: str, conversation_id: str):
+    """Return a conversation's rolling summary and its recent turns"""
+    try:
+        return doc_processor.conversations.get(document_id, conversation_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/documents/{document_id}/search", response_model=SearchResponse)
+async def search_document(document_id: str, request: SearchRequest):
+    """Return the chunks of a document that best match a query, by BM25, embeddings or both"""
+    mode = (request.mode or RETRIEVAL_MODE).lower()
+    if mode not in ("bm25", "semantic", "hybrid"):
+        raise HTTPException(status_code=400, detail=f"Unknown retrieval mode: {mode}")
+    try:
+        ranked = await run_in_threadpool(doc_processor.search_chunks, document_id, request.query, request.top_k, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {
+        "document_id": document_id,
+        "mode": mode,
+        "results": [{**chunk, "score": score} for chunk, score in ranked],
+    }
+
+@app.post("/documents/{document_id}/highlight", response_model=Highlights)
+async def highlight_document(document_id: str, request: HighlightRequest):
+    """Locate terms and a quoted reference in a document, with character/page offsets and snippets"""
+    regions = [(region.start, region.end) for region in request.regions]
+    try:
+        return await run_in_threadpool(
+            doc_processor.highlight_document, document_id, request.terms, request.reference, regions,
+            page_range(request.page_start, request.page_end)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 @app.post("/ask-question/")
 async def ask_question(request: QuestionRequest):
-    """Answer a question based on the uploaded document"""
+    """Answer a question based on the uploaded document, as a follow-up if a conversation is given"""
     try:
-        result = doc_processor.answer_question(request.document_id, request.question)
+        result = await doc_processor.answer_question_async(
+            request.document_id,
+            request.question,
+            top_k=request.top_k,
+            token_budget=request.token_budget,
+            conversation_id=request.conversation_id,
+            pages=page_range(request.page_start, request.page_end)
+        )
+        # Summarizing older turns happens after the response, not before it
+        schedule_compaction(request.document_id, request.conversation_id)
         
         return AnswerResponse(
             answer=result["answer"],
             justification=result["justification"],
-            source_reference=result["source_reference"]
+            source_reference=result["source_reference"],
+            source_chunks=result["source_chunks"],
+            highlights=result.get("highlights"),
+            conversation_id=request.conversation_id
         )
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise server_error(e)
+
+@app.post("/ask-questions/")
+async def ask_questions(request: BatchQuestionRequest):
+    """Answer a batch of questions about one document, with per-question errors"""
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    try:
+        results = await doc_processor.answer_questions_async(
+            request.document_id,
+            request.questions,
+            top_k=request.top_k,
+            token_budget=request.token_budget,
+            max_concurrency=request.max_concurrency
+        )
+        succeeded = sum(1 for item in results if item["success"])
+        
+        return BatchAnswerResponse(
+            document_id=request.document_id,
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            results=results
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise server_error(e)
+
+@app.post("/ask-question/stream/")
+async def ask_question_stream(request: QuestionRequest):
+    """Answer a question, streaming answer sections as Server-Sent Events"""
+    events = doc_processor.answer_question_stream_async(
+        request.document_id,
+        request.question,
+        top_k=request.top_k,
+        token_budget=request.token_budget,
+        conversation_id=request.conversation_id,
+        pages=page_range(request.page_start, request.page_end)
+    )
+    # Pull the first event here so a missing document or conversation is still a plain 404,
+    # and a full LLM queue a 503
+    try:
+        first = await events.__anext__()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Overloaded as e:
+        raise server_error(e)
+    
+    async def stream():
+        yield format_sse(*first)
+        async for event, data in events:
+            yield format_sse(event, data)
+        schedule_compaction(request.document_id, request.conversation_id)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/collections/", response_model=CollectionResponse)
+async def create_collection(request: CollectionRequest):
+    """Create a named collection of uploaded documents"""
+    try:
+        return doc_processor.create_collection(request.name, request.document_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/collections/{collection_id}", response_model=CollectionResponse)
+async def get_collection(collection_id: str):
+    """Return a collection's name and documents"""
+    try:
+        return doc_processor.get_collection(collection_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/collections/{collection_id}/documents", response_model=CollectionResponse)
+async def add_collection_documents(collection_id: str, request: CollectionDocumentsRequest):
+    """Add uploaded documents to a collection"""
+    try:
+        return doc_processor.add_to_collection(collection_id, request.document_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/collections/{collection_id}/ask", response_model=CollectionAnswerResponse)
+async def ask_collection(collection_id: str, request: CollectionQuestionRequest):
+    """Answer a question across a collection with one LLM call citing passages by document and chunk"""
+    try:
+        result = await doc_processor.answer_collection_question_async(
+            collection_id,
+            request.question,
+            top_k=request.top_k,
+            token_budget=request.token_budget
+        )
+        return {"collection_id": collection_id, **result}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise server_error(e)
 
 @app.post("/generate-challenge/")
 async def generate_challenge(document_id: str):
     """Generate challenge questions for the document"""
     try:
-        questions = doc_processor.generate_challenge_questions(document_id)
+        challenge = await doc_processor.generate_challenge_questions_async(document_id)
         
         return JSONResponse({
-            "success": True,
-            "questions": questions
+            "success": challenge["challenge_id"] is not None,
+            "challenge_id": challenge["challenge_id"],
+            "questions": challenge["questions"]
         })
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise server_error(e)
 
 @app.post("/evaluate-answer/")
 async def evaluate_answer(request: ChallengeResponse):
     """Evaluate user's answer to a challenge question"""
     try:
-        # This would need to be enhanced to store challenge questions
-        # For now, we'll use a simplified approach
-        result = doc_processor.evaluate_challenge_answer(
+        # The question, its answer and supporting passages are looked up server-side
+        result = await doc_processor.evaluate_challenge_answer_async(
             request.document_id,
-            "question",  # You'd need to store and retrieve the actual question
-            "correct_answer",  # You'd need to store and retrieve the correct answer
+            request.challenge_id,
+            request.question_id,
             request.user_answer
         )
         
@@ -107,13 +550,42 @@ async def evaluate_answer(request: ChallengeResponse):
             feedback=result["feedback"],
             correct_answer=result["correct_answer"],
             justification=result["justification"],
-            score=result["score"]
+            score=result["score"],
+            graded_by=result["graded_by"]
         )
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise server_error(e)
+
+@app.get("/dedup/stats/")
+async def dedup_stats():
+    """How many uploads were served from the raw-byte dedup index"""
+    return {
+        **dedup_counters,
+        "hit_rate": dedup_hit_ratio()
+    }
+
+@app.get("/llm/stats/")
+async def llm_stats():
+    """LLM scheduler queue depth by priority, calls in flight and remaining rate-limit quota"""
+    return doc_processor.scheduler.stats()
+
+@app.get("/cache/stats/")
+async def cache_stats():
+    """LLM response cache hit, miss and eviction counters"""
+    return doc_processor.response_cache.stats()
+
+@app.get("/prompts/stats/")
+async def prompt_stats():
+    """Per-operation prompt sizes, tokens saved by cleaning and tokens dropped to fit the budget"""
+    return doc_processor.packer.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: endpoint latency, stage timings, LLM sizes and concurrency, cache and store state"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/health/")
 async def health_check():
@@ -122,4 +594,6 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv('BACKEND_WORKERS', '1'))
+    # Extra worker processes import the app by name; a single worker can use this one
+    uvicorn.run("api:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
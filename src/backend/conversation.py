@@ -0,0 +1,129 @@
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from document_store import DocumentStore
+
+# Turns kept verbatim in follow-up prompts; older ones are folded into the rolling summary
+CONVERSATION_RECENT_TURNS = int(os.getenv('CONVERSATION_RECENT_TURNS', '3'))
+# Compaction runs once this many turns are waiting beyond the verbatim window
+CONVERSATION_COMPACT_BATCH = int(os.getenv('CONVERSATION_COMPACT_BATCH', '2'))
+CONVERSATION_SUMMARY_WORDS = int(os.getenv('CONVERSATION_SUMMARY_WORDS', '150'))
+# Longer questions and answers are cut to this many characters when stored
+CONVERSATION_TURN_CHARS = int(os.getenv('CONVERSATION_TURN_CHARS', '1200'))
+
+def _clip(text: str, max_chars: int) -> str:
+    """Cut text to max_chars at a word boundary"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = cut.rfind(" ")
+    return (cut[:boundary] if boundary > 0 else cut) + " [...]"
+
+def format_turns(turns: List[Dict]) -> str:
+    """Render turns as a question/answer transcript for a prompt"""
+    return "\n\n".join(f"User: {turn['question']}\nAssistant: {turn['answer']}" for turn in turns)
+
+class ConversationMemory:
+    """Per-document conversation sessions kept in the document store
+
+    A session holds its most recent turns verbatim and a rolling summary of
+    everything older, so the context sent with a follow-up question stays
+    bounded however long the conversation runs. Folding turns into the
+    summary needs an LLM call and is done by the caller off the request path
+    (see pending_turns() and fold()). Sessions are changed with atomic
+    read-modify-writes in the store, so workers sharing it never lose a turn.
+    """
+
+    def __init__(self, store: DocumentStore, recent_turns: int = CONVERSATION_RECENT_TURNS,
+                 compact_batch: int = CONVERSATION_COMPACT_BATCH):
+        self.store = store
+        self.recent_turns = recent_turns
+        self.compact_batch = compact_batch
+
+    @staticmethod
+    def _artifact(conversation_id: str) -> str:
+        return f"conversation:{conversation_id}"
+
+    def _save(self, document_id: str, session: Dict) -> None:
+        session["updated"] = time.time()
+        self.store.put_artifact(document_id, self._artifact(session["conversation_id"]), json.dumps(session))
+
+    def _update(self, document_id: str, conversation_id: str, change) -> None:
+        """Apply change(session) atomically; change returns False to leave the session as it is"""
+        def update(stored: Optional[str]) -> Optional[str]:
+            if stored is None:
+                raise ValueError("Conversation not found")
+            session = json.loads(stored)
+            if change(session) is False:
+                return None
+            session["updated"] = time.time()
+            return json.dumps(session)
+
+        self.store.update_artifact(document_id, self._artifact(conversation_id), update)
+
+    def create(self, document_id: str) -> Dict:
+        """Start an empty session for a stored document"""
+        if document_id not in self.store:
+            raise ValueError("Document not found")
+        session = {
+            "conversation_id": uuid.uuid4().hex[:16],
+            "document_id": document_id,
+            "summary": "",
+            "summarized_turns": 0,
+            "turns": [],
+            "created": time.time(),
+        }
+        self._save(document_id, session)
+        return session
+
+    def get(self, document_id: str, conversation_id: str) -> Dict:
+        """Return a session, raising ValueError if it does not exist"""
+        stored = self.store.get_artifact(document_id, self._artifact(conversation_id))
+        if stored is None:
+            raise ValueError("Conversation not found")
+        return json.loads(stored)
+
+    def context(self, session: Dict) -> Dict[str, str]:
+        """Return the rolling summary and the verbatim recent turns to put in a prompt"""
+        return {
+            "summary": session["summary"],
+            "recent": format_turns(session["turns"][-self.recent_turns:]),
+        }
+
+    def add_turn(self, document_id: str, conversation_id: str, question: str, answer: str) -> None:
+        """Append a question and its answer"""
+        def append(session: Dict) -> None:
+            session["turns"].append({
+                "index": session["summarized_turns"] + len(session["turns"]),
+                "question": _clip(question, CONVERSATION_TURN_CHARS),
+                "answer": _clip(answer, CONVERSATION_TURN_CHARS),
+            })
+
+        self._update(document_id, conversation_id, append)
+
+    def pending_turns(self, session: Dict) -> List[Dict]:
+        """Return the turns that have left the verbatim window but are not yet summarized"""
+        return session["turns"][:max(len(session["turns"]) - self.recent_turns, 0)]
+
+    def needs_compaction(self, session: Dict) -> bool:
+        """Return True once enough turns wait to be folded into the summary"""
+        return len(self.pending_turns(session)) >= self.compact_batch
+
+    def fold(self, document_id: str, conversation_id: str, summary: str, through_index: int) -> None:
+        """Replace the rolling summary and drop the turns it now covers (those up to through_index)
+
+        Turns appended while the summary was being written are kept.
+        """
+        def replace(session: Dict) -> bool:
+            folded = [turn for turn in session["turns"] if turn["index"] <= through_index]
+            if not folded:
+                return False
+            session["summary"] = summary
+            session["summarized_turns"] += len(folded)
+            session["turns"] = session["turns"][len(folded):]
+            return True
+
+        self._update(document_id, conversation_id, replace)
@@ -0,0 +1,145 @@
+import heapq
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from retrieval import ChunkIndex, estimate_tokens, tokenize
+
+# Shards scored at once; also the size of the shared search thread pool
+CORPUS_SEARCH_WORKERS = int(os.getenv('CORPUS_SEARCH_WORKERS', '4'))
+# Collections whose corpus dictionary is kept in memory
+CORPUS_CACHE_SIZE = int(os.getenv('CORPUS_CACHE_SIZE', '4'))
+# Passages retrieved across a collection per question
+CORPUS_TOP_K = int(os.getenv('CORPUS_TOP_K', '8'))
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+def get_search_pool() -> ThreadPoolExecutor:
+    """Return the thread pool shared by corpus searches"""
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=CORPUS_SEARCH_WORKERS, thread_name_prefix="corpus")
+        return _search_pool
+
+class CorpusIndex:
+    """BM25 over a collection of documents, sharded by document
+
+    Each shard is a document's own ChunkIndex, loaded on demand through
+    load_shard. The corpus itself only keeps a term dictionary: for every
+    term, the shards containing it with the highest term frequency and the
+    shortest chunk length found there. Queries score shards with
+    collection-wide IDF and average chunk length, so scores compare across
+    documents, and use the dictionary to bound each shard's best possible
+    score: shards are searched a batch at a time in descending order of that
+    bound, and the search stops as soon as no remaining shard can enter the
+    top k. Query cost therefore follows the number of shards that can
+    compete, not the size of the collection.
+    """
+
+    def __init__(self, document_ids: Iterable[str], load_shard: Callable[[str], ChunkIndex],
+                 k1: float = 1.5, b: float = 0.75, batch_size: int = CORPUS_SEARCH_WORKERS):
+        self.document_ids = list(document_ids)
+        self.load_shard = load_shard
+        self.k1 = k1
+        self.b = b
+        self.batch_size = max(1, batch_size)
+        # term -> [(document_id, max term frequency in a chunk, min length of a chunk containing it)]
+        self.term_shards: Dict[str, List[Tuple[str, int, int]]] = {}
+        chunk_counts: Dict[str, int] = {}
+        total_chunks = 0
+        total_length = 0
+
+        shards = get_search_pool().map(lambda document_id: (document_id, load_shard(document_id)), self.document_ids)
+        for document_id, shard in shards:
+            total_chunks += len(shard.chunks)
+            total_length += sum(shard.lengths)
+            lengths = shard.lengths
+            for term, postings in shard.postings.items():
+                max_freq = 0
+                min_length = None
+                for chunk_id, freq in postings:
+                    if freq > max_freq:
+                        max_freq = freq
+                    if min_length is None or lengths[chunk_id] < min_length:
+                        min_length = lengths[chunk_id]
+                self.term_shards.setdefault(term, []).append((document_id, max_freq, min_length))
+                chunk_counts[term] = chunk_counts.get(term, 0) + len(postings)
+
+        self.total_chunks = total_chunks
+        self.avg_length = (total_length / total_chunks) if total_chunks else 0.0
+        self.idf = {
+            term: math.log(1 + (total_chunks - count + 0.5) / (count + 0.5))
+            for term, count in chunk_counts.items()
+        }
+
+    def _shard_bounds(self, terms: List[str]) -> List[Tuple[str, float]]:
+        """Return every shard matching a query term with an upper bound on its best chunk score
+
+        BM25 grows with term frequency and shrinks with chunk length, so the
+        highest frequency and shortest length seen give a bound per term.
+        """
+        avg_length = self.avg_length or 1.0
+        bounds: Dict[str, float] = {}
+        for term in terms:
+            idf = self.idf[term]
+            for document_id, max_freq, min_length in self.term_shards[term]:
+                norm = self.k1 * (1 - self.b + self.b * min_length / avg_length)
+                bound = idf * max_freq * (self.k1 + 1) / (max_freq + norm)
+                bounds[document_id] = bounds.get(document_id, 0.0) + bound
+        return sorted(bounds.items(), key=lambda item: (-item[1], item[0]))
+
+    def _search_shard(self, document_id: str, terms: List[str], top_k: int) -> List[Tuple[float, str, Dict]]:
+        ranked = self.load_shard(document_id).rank(terms, top_k, self.idf, self.avg_length)
+        return [(score, document_id, chunk) for chunk, score in ranked]
+
+    def search(self, query: str, top_k: int = CORPUS_TOP_K) -> Dict[str, any]:
+        """Return the top_k passages of the collection for a query, best first
+
+        The result holds "passages" as (document_id, chunk, score) tuples,
+        plus how many shards matched a query term and how many were searched.
+        """
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        candidates = self._shard_bounds(terms)
+        best: List[Tuple[float, int, str, Dict]] = []  # min-heap of the top_k so far
+        searched = 0
+        pool = get_search_pool()
+        tie = 0
+
+        for start in range(0, len(candidates), self.batch_size):
+            threshold = best[0][0] if len(best) >= top_k else 0.0
+            batch = [document_id for document_id, bound in candidates[start:start + self.batch_size] if bound > threshold]
+            if not batch:
+                # Bounds are in descending order, so no later shard can do better either
+                break
+            searched += len(batch)
+            for results in pool.map(lambda document_id: self._search_shard(document_id, terms, top_k), batch):
+                for score, document_id, chunk in results:
+                    tie += 1
+                    entry = (score, -tie, document_id, chunk)
+                    if len(best) < top_k:
+                        heapq.heappush(best, entry)
+                    elif score > best[0][0]:
+                        heapq.heapreplace(best, entry)
+
+        passages = [(document_id, chunk, score) for score, _, document_id, chunk in sorted(best, reverse=True)]
+        return {"passages": passages, "shards_matched": len(candidates), "shards_searched": searched}
+
+def select_passages(passages: List[Tuple[str, Dict, float]], token_budget: int) -> List[Tuple[str, Dict, float]]:
+    """Keep the best passages that fit in token_budget (at least one)"""
+    selected = []
+    used = 0
+    for passage in passages:
+        cost = estimate_tokens(passage[1]["text"])
+        if selected and used + cost > token_budget:
+            continue
+        selected.append(passage)
+        used += cost
+    return selected
+
+def passage_label(document_number: int, chunk_id: int) -> str:
+    """Return the citation label of a passage, e.g. [D2:C14] for chunk 14 of the second document"""
+    return f"[D{document_number}:C{chunk_id}]"
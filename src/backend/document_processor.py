@@ -1,29 +1,94 @@
-import PyPDF2
 import io
 import hashlib
-from typing import Dict, List
-import google.generativeai as genai
+import asyncio
+import functools
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, FrozenSet, Iterable, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
-import re
+import json
+from retrieval import ChunkIndex, chunk_document, estimate_tokens, format_chunks
+from response_cache import ResponseCache
+from document_store import DocumentStore, LRUDict, create_document_store
+from pdf_extraction import get_process_pool, iter_pdf_pages
+from response_parser import (
+    ANSWER_KEYS, CHALLENGE_KEYS, EVALUATION_KEYS, SectionStreamParser, answer_from_fields,
+    challenge_questions_from_fields, evaluation_from_fields, parse_sections
+)
+from prompt_packer import PromptPacker
+from conversation import CONVERSATION_SUMMARY_WORDS, ConversationMemory, format_turns
+from corpus import CORPUS_CACHE_SIZE, CORPUS_TOP_K, CorpusIndex, passage_label, select_passages
+from highlighting import NormalizedText, highlight, query_terms
+from page_store import PagedText, create_page_store, split_pages
+from embeddings import EmbeddingIndex, create_embedder, create_embedding_store
+from llm_backends import LLMBackend, create_llm_backend
+from llm_scheduler import BACKGROUND, BATCH, LLM_OUTPUT_TOKENS_ESTIMATE, LLMScheduler, Overloaded, llm_priority
+from metrics import GRADING_DECISIONS, LLM_ERRORS, LLM_IN_FLIGHT, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, STAGE_SECONDS
+from grading import LOCAL, MODEL, grade_answer
 
 load_dotenv()
 
+DEFAULT_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '5'))
+DEFAULT_TOKEN_BUDGET = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '3000'))
+# Chunk ranking for questions: 'bm25', 'semantic' (embeddings) or 'hybrid' (both)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid').lower()
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024'))
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400'))
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '')
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv('LLM_CACHE_MAX_DISK_ENTRIES', '100000'))
+INDEX_CACHE_SIZE = int(os.getenv('INDEX_CACHE_SIZE', '32'))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '4'))
+SUMMARY_SECTION_CHARS = int(os.getenv('SUMMARY_SECTION_CHARS', '8000'))
+SUMMARY_SECTION_WORDS = int(os.getenv('SUMMARY_SECTION_WORDS', '120'))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv('SUMMARY_MAP_CONCURRENCY', '4'))
+CHALLENGE_SPAN_CHUNKS = int(os.getenv('CHALLENGE_SPAN_CHUNKS', '2'))
+CHALLENGE_SPAN_TOKENS = int(os.getenv('CHALLENGE_SPAN_TOKENS', '800'))
+# Store artifact holding the serialized retrieval index, shared by all server workers
+INDEX_ARTIFACT = "retrieval_index"
+
 class DocumentProcessor:
-    def __init__(self):
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
-        self.documents: Dict[str, str] = {}
-        self.summaries: Dict[str, str] = {}
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, store: DocumentStore = None, backend: LLMBackend = None):
+        self.backend = backend or create_llm_backend()
+        self.model_name = self.backend.model_name
+        self.generation_config: Dict[str, any] = {}
+        self.response_cache = ResponseCache(
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=LLM_CACHE_TTL_SECONDS,
+            db_path=LLM_CACHE_PATH or None,
+            max_disk_entries=LLM_CACHE_MAX_DISK_ENTRIES
+        )
+        self.store = store or create_document_store()
+        # Page tables over memory-mapped text buffers, for reading page ranges without the whole text
+        self.pages = create_page_store()
+        # Chunk vectors for semantic and hybrid retrieval, memory-mapped from .npy files
+        self.embedder = create_embedder()
+        self.embedding_store = create_embedding_store()
+        self.embeddings = LRUDict(INDEX_CACHE_SIZE)
+        # Retrieval indexes are derived from the stored text, so only hot ones are kept
+        self.indexes = LRUDict(INDEX_CACHE_SIZE)
+        # Prompts are normalized, deduplicated and fitted to per-operation token budgets
+        self.packer = PromptPacker()
+        self.boilerplate = LRUDict(INDEX_CACHE_SIZE)
+        # The challenge prompt packs the whole document, so it is built once per document
+        self.challenge_prompts = LRUDict(INDEX_CACHE_SIZE)
+        # Normalized text with offset maps, reused to highlight every answer
+        self.normalized_texts = LRUDict(INDEX_CACHE_SIZE)
+        # Follow-up questions see recent turns verbatim and a rolling summary of older ones
+        self.conversations = ConversationMemory(self.store)
+        # Corpus dictionaries of recently queried collections, keyed by collection ID
+        self.corpora = LRUDict(CORPUS_CACHE_SIZE)
+        # Every LLM call is queued by priority, rate limited, retried and coalesced here
+        self.max_concurrency = max_concurrency
+        self.scheduler = LLMScheduler(max_concurrency)
     
+    @STAGE_SECONDS.timed(stage="extract_pdf")
     def extract_text_from_pdf(self, pdf_content: bytes) -> str:
         """Extract text from PDF bytes"""
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return "".join(page + "\n" for page in iter_pdf_pages(io.BytesIO(pdf_content)))
         except Exception as e:
             raise ValueError(f"Error processing PDF: {str(e)}")
     
@@ -41,191 +106,1003 @@ class DocumentProcessor:
     def store_document(self, filename: str, content: str) -> str:
         """Store document and return document ID"""
         doc_id = self.generate_document_id(content)
-        self.documents[doc_id] = content
+        self.store.put_document(doc_id, filename, content)
+        self.pages.write(doc_id, split_pages(content))
+        self._save_index(doc_id, ChunkIndex(content))
+        self._prepare_embeddings(doc_id)
         return doc_id
     
-    def generate_summary(self, content: str, max_words: int = 150) -> str:
-        """Generate summary using Gemini AI"""
-        prompt = f"""
-        Please provide a concise summary of the following document in no more than {max_words} words.
-        Focus on the main points, key findings, and overall purpose of the document.
+    def ingest_pages(self, filename: str, pages: Iterable[str]) -> Tuple[str, str]:
+        """Store a document from a stream of page texts, indexing pages as they arrive
         
-        Document:
-        {content[:8000]}
-        
-        Summary (max {max_words} words):
+        Returns the document ID and the full text.
         """
+        hasher = hashlib.md5()
+        parts: List[str] = []
+        writer = self.pages.writer()
+        
+        def pieces():
+            for page in pages:
+                piece = page + "\n"
+                hasher.update(piece.encode())
+                parts.append(piece)
+                writer.add(piece)
+                yield piece
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            index = ChunkIndex.from_pieces(pieces())
+        except BaseException:
+            writer.discard()
+            raise
+        content = "".join(parts)
+        doc_id = hasher.hexdigest()[:16]
+        self.store.put_document(doc_id, filename, content)
+        self.pages.commit(writer, doc_id)
+        self._save_index(doc_id, index)
+        self._prepare_embeddings(doc_id)
+        return doc_id, content
+    
+    @STAGE_SECONDS.timed(stage="ingest_pdf")
+    def ingest_pdf_file(self, path: str, filename: str) -> Tuple[str, str]:
+        """Extract, index and store a PDF from disk, parsing page ranges in parallel"""
+        try:
+            return self.ingest_pages(filename, iter_pdf_pages(path, get_process_pool()))
+        except ValueError:
+            raise
         except Exception as e:
-            return f"Error generating summary: {str(e)}"
+            raise ValueError(f"Error processing PDF: {str(e)}")
     
-    def answer_question(self, document_id: str, question: str) -> Dict[str, str]:
-        """Answer question based on document content"""
-        if document_id not in self.documents:
+    def get_document_text(self, document_id: str) -> str:
+        """Return the stored text of a document"""
+        content = self.store.get_text(document_id)
+        if content is None:
             raise ValueError("Document not found")
+        return content
+    
+    def _save_index(self, document_id: str, index: ChunkIndex) -> None:
+        """Keep a new index hot here and share it with other workers through the store"""
+        self.indexes[document_id] = index
+        self.store.put_artifact(document_id, INDEX_ARTIFACT, index.to_json())
+    
+    def get_index(self, document_id: str) -> ChunkIndex:
+        """Return the retrieval index of a document
         
-        content = self.documents[document_id]
+        Indexes built by any worker are loaded from the store; one is only
+        rebuilt from the text if none was stored.
+        """
+        index = self.indexes.get(document_id)
+        if index is None:
+            text = self.get_document_text(document_id)
+            data = self.store.get_artifact(document_id, INDEX_ARTIFACT)
+            if data is not None:
+                index = ChunkIndex.from_json(data, text)
+                self.indexes[document_id] = index
+            else:
+                index = ChunkIndex(text)
+                self._save_index(document_id, index)
+        return index
+    
+    def get_embeddings(self, document_id: str) -> EmbeddingIndex:
+        """Return the embedding index of a document, embedding its chunks on first use
         
-        prompt = f"""
-        Based on the following document, please answer the question with:
-        1. A clear, comprehensive answer
-        2. Justification explaining your reasoning
-        3. Specific reference to the part of the document that supports your answer
+        Vectors are stored per embedder, so any worker can memory-map them.
+        """
+        embeddings = self.embeddings.get(document_id)
+        if embeddings is None:
+            index = self.get_index(document_id)
+            vectors = self.embedding_store.load(document_id, self.embedder.name)
+            if vectors is None or len(vectors) != len(index.chunks):
+                start = time.perf_counter()
+                vectors = self.embedder.embed_documents([chunk["text"] for chunk in index.chunks], index.idf)
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage="embed_document")
+                vectors = self.embedding_store.save(document_id, self.embedder.name, vectors)
+            embeddings = EmbeddingIndex(vectors, self.embedder, index)
+            self.embeddings[document_id] = embeddings
+        return embeddings
+    
+    def _prepare_embeddings(self, document_id: str) -> None:
+        """Embed a new document's chunks at upload when retrieval uses them and embedding is local"""
+        if RETRIEVAL_MODE != "bm25" and self.embedder.local:
+            self.get_embeddings(document_id)
+    
+    def search_chunks(self, document_id: str, query: str, top_k: int = None, mode: str = None) -> List[Tuple[Dict, float]]:
+        """Return the top_k chunks for a query with their scores, ranked by mode (default RETRIEVAL_MODE)"""
+        mode = (mode or RETRIEVAL_MODE).lower()
+        top_k = top_k or DEFAULT_TOP_K
+        if mode == "bm25":
+            return self.get_index(document_id).search(query, top_k)
+        if mode == "semantic":
+            return self.get_embeddings(document_id).search(query, top_k)
+        if mode == "hybrid":
+            return self.get_embeddings(document_id).hybrid_search(query, top_k)
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    
+    def get_boilerplate(self, document_id: str) -> FrozenSet[str]:
+        """Return the repeated header/footer lines of a document, detecting them on first use"""
+        boilerplate = self.boilerplate.get(document_id)
+        if boilerplate is None:
+            boilerplate = self.packer.boilerplate(self.get_document_text(document_id), self.get_pages(document_id).page_starts)
+            self.boilerplate[document_id] = boilerplate
+        return boilerplate
+    
+    def _range_boilerplate(self, paged: PagedText, pages: Tuple[int, int], text: str) -> FrozenSet[str]:
+        """Return the boilerplate line keys of the text of a page range, from the edges of its pages"""
+        base = paged.char_span(*pages)[0]
+        return self.packer.boilerplate(text, [start - base for start in paged.page_starts[pages[0] - 1:pages[1]]])
+    
+    def get_pages(self, document_id: str) -> PagedText:
+        """Return the page table and text buffer of a document
         
-        Document:
-        {content}
+        Documents stored before page tables existed get one on first use,
+        split at form feeds (so usually a single page).
+        """
+        paged = self.pages.open(document_id)
+        if paged is None:
+            self.pages.write(document_id, split_pages(self.get_document_text(document_id)))
+            paged = self.pages.open(document_id)
+        return paged
+    
+    def get_page_text(self, document_id: str, first: int, last: int) -> List[Dict[str, any]]:
+        """Return pages first..last with their character offsets, reading only those pages"""
+        paged = self.get_pages(document_id)
+        paged.check_range(first, last)
+        pages = []
+        for number in range(first, last + 1):
+            start, end = paged.char_span(number, number)
+            pages.append({"number": number, "start": start, "end": end, "text": paged.page(number)})
+        return pages
+    
+    def get_normalized_text(self, document_id: str) -> NormalizedText:
+        """Return the normalized text of a document used for highlighting, building it on first use"""
+        normalized = self.normalized_texts.get(document_id)
+        if normalized is None:
+            page_starts = self.get_pages(document_id).page_starts
+            normalized = NormalizedText(self.get_document_text(document_id), page_starts)
+            self.normalized_texts[document_id] = normalized
+        return normalized
+    
+    def _load_for_answers(self, document_id: str) -> None:
+        """Load the retrieval indexes and normalized text answering a question about a document uses"""
+        if RETRIEVAL_MODE == "bm25":
+            self.get_index(document_id)
+        else:
+            self.get_embeddings(document_id)
+        self.get_normalized_text(document_id)
+    
+    @STAGE_SECONDS.timed(stage="highlight")
+    def highlight_document(self, document_id: str, terms: Iterable[str] = (), reference: str = "",
+                           regions: List[Tuple[int, int]] = None, pages: Tuple[int, int] = None) -> Dict[str, List[Dict]]:
+        """Locate a quoted reference and terms in a document, returning offsets and snippet windows
         
-        Question: {question}
+        With a page range only those pages are read and searched.
+        """
+        if pages is None:
+            return highlight(self.get_normalized_text(document_id), terms, reference, regions)
+        paged = self.get_pages(document_id)
+        start, end = paged.char_span(*pages)
+        document = NormalizedText(paged.text(*pages), paged.page_starts, base=start)
+        regions = [(max(s, start), min(e, end)) for s, e in regions or [] if s < end and e > start] or [(start, end)]
+        return highlight(document, terms, reference, regions)
+    
+    def _add_highlights(self, document_id: str, question: str, result: Dict[str, any],
+                        pages: Tuple[int, int] = None) -> Dict[str, any]:
+        """Attach the located source reference and question-term snippets to an answer"""
+        regions = [(chunk["start"], chunk["end"]) for chunk in result["source_chunks"]]
+        result["highlights"] = self.highlight_document(
+            document_id, query_terms(question), result.get("source_reference", ""), regions, pages
+        )
+        return result
+    
+    async def _run_off_loop(self, func, *args, **kwargs):
+        """Run CPU-bound work (index loading, prompt packing, highlighting) in the default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+    
+    def _cache_key(self, prompt: str, document_id: str = None) -> str:
+        """Build the response cache key for a prompt"""
+        return self.response_cache.make_key(document_id, prompt, self.model_name, self.generation_config)
+    
+    def _call_tokens(self, prompt: str) -> int:
+        """Tokens a call is expected to use against the per-minute token quota"""
+        return estimate_tokens(prompt) + LLM_OUTPUT_TOKENS_ESTIMATE
+    
+    @contextmanager
+    def _llm_call(self, prompt: str, stage: str = "llm_generate"):
+        """Record duration, prompt size, errors and in-flight count of one backend call"""
+        LLM_PROMPT_CHARS.observe(len(prompt))
+        LLM_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            LLM_ERRORS.inc()
+            raise
+        finally:
+            LLM_IN_FLIGHT.dec()
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+    
+    def _generate(self, prompt: str, document_id: str = None) -> str:
+        """Return the LLM response for a prompt, from cache when possible
         
-        Please format your response as:
-        ANSWER: [Your answer here]
-        JUSTIFICATION: [Your reasoning here]
-        SOURCE_REFERENCE: [Specific reference to document section/paragraph]
+        Identical prompts already in flight share that call's response.
         """
+        cache_key = self._cache_key(prompt, document_id)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        def call() -> str:
+            with self._llm_call(prompt):
+                text = self.backend.generate(prompt, self.generation_config)
+            LLM_RESPONSE_CHARS.observe(len(text))
+            self.response_cache.set(cache_key, text)
+            return text
+        
+        return self.scheduler.run(call, self._call_tokens(prompt), key=cache_key)
+    
+    async def _generate_async(self, prompt: str, document_id: str = None) -> str:
+        """Return the LLM response without blocking the event loop, from cache when possible
+        
+        Identical prompts already in flight share that call's response.
+        """
+        cache_key = self._cache_key(prompt, document_id)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        async def call() -> str:
+            with self._llm_call(prompt):
+                text = await self.backend.generate_async(prompt, self.generation_config)
+            LLM_RESPONSE_CHARS.observe(len(text))
+            self.response_cache.set(cache_key, text)
+            return text
+        
+        return await self.scheduler.run_async(call, self._call_tokens(prompt), key=cache_key)
+    
+    async def _stream_async(self, prompt: str, document_id: str = None) -> AsyncIterator[str]:
+        """Yield LLM response text as it streams, caching the complete response"""
+        cache_key = self._cache_key(prompt, document_id)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
         
+        async def open_stream() -> AsyncIterator[str]:
+            with self._llm_call(prompt, stage="llm_stream"):
+                async for chunk in self.backend.stream_async(prompt, self.generation_config):
+                    yield chunk
+        
+        async for chunk in self.scheduler.stream(open_stream, self._call_tokens(prompt)):
+            parts.append(chunk)
+            yield chunk
+        text = "".join(parts)
+        LLM_RESPONSE_CHARS.observe(len(text))
+        self.response_cache.set(cache_key, text)
+    
+    def _focus_instruction(self, focus: str = None) -> str:
+        """Return the prompt line that steers a summary towards a focus area"""
+        return f"Pay particular attention to: {focus}" if focus else ""
+    
+    def _build_summary_prompt(self, content: str, max_words: int, focus: str = None,
+                              boilerplate: FrozenSet[str] = frozenset()) -> str:
+        """Build the single-pass summary prompt for a document that fits in one section"""
+        def build(body: str) -> str:
+            return f"""
+            Please provide a concise summary of the following document in no more than {max_words} words.
+            Focus on the main points, key findings, and overall purpose of the document.
+            {self._focus_instruction(focus)}
+            
+            Document:
+            {body}
+            
+            Summary (max {max_words} words):
+            """
+        return self.packer.pack("summary", build, content, boilerplate)
+    
+    def _build_section_summary_prompt(self, section: str, position: int, total: int,
+                                      boilerplate: FrozenSet[str] = frozenset()) -> str:
+        """Build the map-step prompt for one section (independent of length and focus, so it is reusable)"""
+        def build(body: str) -> str:
+            return f"""
+            The following is section {position} of {total} of a longer document.
+            Summarize it in no more than {SUMMARY_SECTION_WORDS} words, keeping key facts, figures, names and conclusions.
+            
+            Section:
+            {body}
+            
+            Section summary:
+            """
+        return self.packer.pack("summary", build, section, boilerplate)
+    
+    def _build_reduce_prompt(self, partials: List[str], max_words: int, focus: str = None) -> str:
+        """Build the reduce-step prompt that merges section summaries"""
+        def build(body: str) -> str:
+            return f"""
+            The following are summaries of consecutive parts of one document, in order.
+            Combine them into a single concise summary of the whole document in no more than {max_words} words.
+            Focus on the main points, key findings, and overall purpose of the document.
+            {self._focus_instruction(focus)}
+            
+            Part summaries:
+            {body}
+            
+            Summary (max {max_words} words):
+            """
+        joined = "\n\n".join(f"[Part {i + 1}]\n{partial}" for i, partial in enumerate(partials))
+        return self.packer.pack("summary", build, joined)
+    
+    def _summary_sections(self, content: str) -> List[str]:
+        """Split a document into the sections summarized in the map step"""
+        return [chunk["text"] for chunk in chunk_document(content, SUMMARY_SECTION_CHARS, 0)]
+    
+    def _group_partials(self, partials: List[str]) -> List[List[str]]:
+        """Group partial summaries into batches that each fit in one reduce prompt"""
+        groups: List[List[str]] = [[]]
+        size = 0
+        for partial in partials:
+            if groups[-1] and size + len(partial) > SUMMARY_SECTION_CHARS:
+                groups.append([])
+                size = 0
+            groups[-1].append(partial)
+            size += len(partial)
+        return groups
+    
+    def _reduced_groups(self, partials: List[str], previous_groups: int) -> List[List[str]]:
+        """Regroup partials after a reduce level, collapsing to one group if the level did not shrink them"""
+        groups = self._group_partials(partials)
+        return groups if len(groups) < previous_groups else [partials]
+    
+    def _section_summaries_artifact(self, document_id: str, sections: List[str]) -> Optional[List[str]]:
+        """Return stored section summaries for a document, if they match its sections"""
+        if not document_id:
+            return None
+        stored = self.store.get_artifact(document_id, f"section_summaries:{SUMMARY_SECTION_CHARS}")
+        if stored is None:
+            return None
+        partials = json.loads(stored)
+        return partials if len(partials) == len(sections) else None
+    
+    def _save_section_summaries(self, document_id: str, partials: List[str]) -> None:
+        """Persist section summaries so other lengths and focus areas reuse them"""
+        if document_id:
+            self.store.put_artifact(document_id, f"section_summaries:{SUMMARY_SECTION_CHARS}", json.dumps(partials))
+    
+    def _summarize(self, content: str, max_words: int, focus: str = None, document_id: str = None,
+                   boilerplate: FrozenSet[str] = None) -> str:
+        """Map-reduce summarize a document sequentially, raising if an LLM call fails"""
+        sections = self._summary_sections(content)
+        if boilerplate is None:
+            boilerplate = self.get_boilerplate(document_id) if document_id else self.packer.boilerplate(content)
+        if len(sections) <= 1:
+            return self._generate(self._build_summary_prompt(content, max_words, focus, boilerplate), document_id).strip()
+        
+        partials = self._section_summaries_artifact(document_id, sections)
+        if partials is None:
+            partials = [
+                self._generate(
+                    self._build_section_summary_prompt(section, i + 1, len(sections), boilerplate), document_id
+                ).strip()
+                for i, section in enumerate(sections)
+            ]
+            self._save_section_summaries(document_id, partials)
+        
+        groups = self._group_partials(partials)
+        while len(groups) > 1:
+            partials = [
+                self._generate(self._build_reduce_prompt(group, SUMMARY_SECTION_WORDS * 2), document_id).strip()
+                for group in groups
+            ]
+            groups = self._reduced_groups(partials, len(groups))
+        return self._generate(self._build_reduce_prompt(groups[0], max_words, focus), document_id).strip()
+    
+    async def _summarize_async(self, content: str, max_words: int, focus: str = None, document_id: str = None,
+                               boilerplate: FrozenSet[str] = None) -> str:
+        """Map-reduce summarize a document with bounded parallelism, raising if an LLM call fails"""
+        sections = self._summary_sections(content)
+        if boilerplate is None:
+            boilerplate = self.get_boilerplate(document_id) if document_id else self.packer.boilerplate(content)
+        if len(sections) <= 1:
+            prompt = self._build_summary_prompt(content, max_words, focus, boilerplate)
+            return (await self._generate_async(prompt, document_id)).strip()
+        
+        semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+        
+        async def generate(prompt: str) -> str:
+            async with semaphore:
+                return (await self._generate_async(prompt, document_id)).strip()
+        
+        partials = self._section_summaries_artifact(document_id, sections)
+        if partials is None:
+            partials = await asyncio.gather(*(
+                generate(self._build_section_summary_prompt(section, i + 1, len(sections), boilerplate))
+                for i, section in enumerate(sections)
+            ))
+            self._save_section_summaries(document_id, partials)
+        
+        groups = self._group_partials(partials)
+        while len(groups) > 1:
+            partials = await asyncio.gather(*(
+                generate(self._build_reduce_prompt(group, SUMMARY_SECTION_WORDS * 2)) for group in groups
+            ))
+            groups = self._reduced_groups(partials, len(groups))
+        return await generate(self._build_reduce_prompt(groups[0], max_words, focus))
+    
+    def generate_summary(self, content: str, max_words: int = 150, document_id: str = None, focus: str = None) -> str:
+        """Generate summary using Gemini AI"""
         try:
-            response = self.model.generate_content(prompt)
-            result = self._parse_answer_response(response.text)
-            return result
+            return self._summarize(content, max_words, focus, document_id)
         except Exception as e:
-            return {
-                "answer": f"Error generating answer: {str(e)}",
-                "justification": "",
-                "source_reference": ""
-            }
-    
-    def generate_challenge_questions(self, document_id: str) -> List[Dict[str, str]]:
-        """Generate 3 logic-based challenge questions"""
-        if document_id not in self.documents:
-            raise ValueError("Document not found")
+            return f"Error generating summary: {str(e)}"
+    
+    async def generate_summary_async(self, content: str, max_words: int = 150, document_id: str = None, focus: str = None) -> str:
+        """Generate summary without blocking the event loop"""
+        try:
+            return await self._summarize_async(content, max_words, focus, document_id)
+        except Exception as e:
+            return f"Error generating summary: {str(e)}"
+    
+    async def summarize_document_async(self, document_id: str, max_words: int = 150, focus: str = None,
+                                       pages: Tuple[int, int] = None) -> str:
+        """Summarize a stored document, or only a page range of it, raising if an LLM call fails
         
-        content = self.documents[document_id]
+        The default summary (whole document, no focus, default length) is saved with the document.
+        """
+        if pages is not None:
+            paged = self.get_pages(document_id)
+            text = paged.text(*pages)
+            return await self._summarize_async(text, max_words, focus, boilerplate=self._range_boilerplate(paged, pages, text))
+        content = self.get_document_text(document_id)
+        summary = await self._summarize_async(content, max_words, focus, document_id)
+        if max_words == 150 and not focus:
+            self.store.set_summary(document_id, summary)
+        return summary
+    
+    @STAGE_SECONDS.timed(stage="build_answer_prompt")
+    def _build_answer_prompt(self, document_id: str, question: str, top_k: int = None, token_budget: int = None,
+                             conversation: Dict = None, pages: Tuple[int, int] = None) -> Tuple[str, List[Dict]]:
+        """Build the answer prompt from the most relevant chunks and return it with the chunks used
         
-        prompt = f"""
-        Based on the following document, generate exactly 3 challenging questions that require:
-        - Deep comprehension
-        - Logical reasoning
-        - Critical thinking
+        With a conversation session, its rolling summary and recent turns are
+        included so follow-up questions can refer back to earlier ones. With a
+        page range, only those pages are read and indexed for the question.
+        """
+        history = ""
+        query = question
+        if conversation is not None:
+            context = self.conversations.context(conversation)
+            if context["summary"]:
+                history += f"Summary of the earlier conversation:\n{context['summary']}\n\n"
+            if context["recent"]:
+                history += f"Most recent exchanges:\n{context['recent']}\n\n"
+            if conversation["turns"]:
+                # Follow-ups like "and what about its cost?" retrieve better with the previous question
+                query = f"{conversation['turns'][-1]['question']} {question}"
         
-        For each question, provide:
-        1. The question itself
-        2. The correct answer
-        3. A detailed explanation with document reference
+        def build(body: str) -> str:
+            return f"""
+            Based on the following excerpts from a document, please answer the question with:
+            1. A clear, comprehensive answer
+            2. Justification explaining your reasoning
+            3. Specific reference to the part of the document that supports your answer
+            
+            Document excerpts:
+            {body}
+            
+            {history}Question: {question}
+            
+            Please format your response as:
+            ANSWER: [Your answer here]
+            JUSTIFICATION: [Your reasoning here]
+            SOURCE_REFERENCE: [Chunk labels used, e.g. [Chunk 3], followed by the supporting text]
+            """
         
-        Document:
-        {content}
+        if pages is None:
+            index, base, boilerplate = self.get_index(document_id), 0, self.get_boilerplate(document_id)
+            ranked = [chunk for chunk, _ in self.search_chunks(document_id, query, top_k)]
+        else:
+            # A page slice is indexed on the fly and ranked with BM25 only
+            paged = self.get_pages(document_id)
+            text = paged.text(*pages)
+            index, base, boilerplate = ChunkIndex(text), paged.char_span(*pages)[0], self._range_boilerplate(paged, pages, text)
+            ranked = None
         
-        Please format your response as:
-        QUESTION_1: [Question here]
-        ANSWER_1: [Correct answer here]
-        EXPLANATION_1: [Detailed explanation with reference]
+        # Retrieve no more than fits in the prompt budget next to the instructions and question
+        chunks = index.select(
+            query,
+            top_k or DEFAULT_TOP_K,
+            min(token_budget or DEFAULT_TOKEN_BUDGET, self.packer.available("answer", build)),
+            ranked
+        )
+        source_chunks = [{"id": c["id"], "start": base + c["start"], "end": base + c["end"]} for c in chunks]
         
-        QUESTION_2: [Question here]
-        ANSWER_2: [Correct answer here]
-        EXPLANATION_2: [Detailed explanation with reference]
+        prompt = self.packer.pack("answer", build, format_chunks(chunks), boilerplate)
+        return prompt, source_chunks
+    
+    def _conversation(self, document_id: str, conversation_id: str = None) -> Optional[Dict]:
+        """Return the conversation session a question belongs to, if any"""
+        if conversation_id is None:
+            return None
+        return self.conversations.get(document_id, conversation_id)
+    
+    def _record_turn(self, document_id: str, conversation_id: str, question: str, result: Dict[str, any]) -> None:
+        """Add an answered question to its conversation"""
+        if conversation_id is not None:
+            self.conversations.add_turn(document_id, conversation_id, question, result["answer"])
+    
+    def _answer_error(self, error: Exception, source_chunks: List[Dict]) -> Dict[str, any]:
+        """Build the answer payload returned when the LLM call fails"""
+        return {
+            "answer": f"Error generating answer: {str(error)}",
+            "justification": "",
+            "source_reference": "",
+            "source_chunks": source_chunks
+        }
+    
+    def answer_question(self, document_id: str, question: str, top_k: int = None, token_budget: int = None,
+                        conversation_id: str = None, pages: Tuple[int, int] = None) -> Dict[str, any]:
+        """Answer question using the document chunks (of the page range, if given) most relevant to it"""
+        conversation = self._conversation(document_id, conversation_id)
+        prompt, source_chunks = self._build_answer_prompt(document_id, question, top_k, token_budget, conversation, pages)
         
-        QUESTION_3: [Question here]
-        ANSWER_3: [Correct answer here]
-        EXPLANATION_3: [Detailed explanation with reference]
-        """
+        try:
+            result = self._parse_answer_response(self._generate(prompt, document_id))
+            result["source_chunks"] = source_chunks
+        except Overloaded:
+            raise
+        except Exception as e:
+            return self._answer_error(e, source_chunks)
+        self._record_turn(document_id, conversation_id, question, result)
+        return self._add_highlights(document_id, question, result, pages)
+    
+    async def answer_question_async(self, document_id: str, question: str, top_k: int = None, token_budget: int = None,
+                                    conversation_id: str = None, pages: Tuple[int, int] = None) -> Dict[str, any]:
+        """Answer question without blocking the event loop"""
+        conversation = self._conversation(document_id, conversation_id)
+        prompt, source_chunks = await self._run_off_loop(
+            self._build_answer_prompt, document_id, question, top_k, token_budget, conversation, pages
+        )
         
         try:
-            response = self.model.generate_content(prompt)
-            questions = self._parse_challenge_questions(response.text)
-            return questions
+            result = self._parse_answer_response(await self._generate_async(prompt, document_id))
+            result["source_chunks"] = source_chunks
+        except Overloaded:
+            raise
         except Exception as e:
-            return [{"question": f"Error generating questions: {str(e)}", "correct_answer": "", "explanation": ""}]
+            return self._answer_error(e, source_chunks)
+        self._record_turn(document_id, conversation_id, question, result)
+        return await self._run_off_loop(self._add_highlights, document_id, question, result, pages)
     
-    def evaluate_challenge_answer(self, document_id: str, question: str, correct_answer: str, user_answer: str) -> Dict[str, any]:
-        """Evaluate user's answer to challenge question"""
-        if document_id not in self.documents:
-            raise ValueError("Document not found")
+    async def answer_questions_async(self, document_id: str, questions: List[str], top_k: int = None,
+                                     token_budget: int = None, max_concurrency: int = None) -> List[Dict[str, any]]:
+        """Answer many questions about one document concurrently, reporting failures per question
+        
+        Results are returned in the order of the questions. Their LLM calls
+        queue behind interactive questions and are never shed.
+        """
+        # Fail the whole batch early if the document is unknown, and load what every question
+        # shares once here rather than in each question's thread
+        await self._run_off_loop(self._load_for_answers, document_id)
+        # More questions at once than the scheduler has call slots would only queue
+        semaphore = asyncio.Semaphore(max(1, min(max_concurrency or BATCH_MAX_CONCURRENCY, self.max_concurrency)))
+        
+        async def answer(index: int, question: str) -> Dict[str, any]:
+            async with semaphore:
+                try:
+                    prompt, source_chunks = await self._run_off_loop(
+                        self._build_answer_prompt, document_id, question, top_k, token_budget
+                    )
+                    result = self._parse_answer_response(await self._generate_async(prompt, document_id))
+                    result["source_chunks"] = source_chunks
+                    await self._run_off_loop(self._add_highlights, document_id, question, result)
+                    return {"index": index, "question": question, "success": True, "result": result, "error": None}
+                except Exception as e:
+                    return {"index": index, "question": question, "success": False, "result": None, "error": str(e)}
+        
+        with llm_priority(BATCH):
+            return await asyncio.gather(*(answer(i, q) for i, q in enumerate(questions)))
+    
+    async def answer_question_stream_async(self, document_id: str, question: str, top_k: int = None, token_budget: int = None,
+                                           conversation_id: str = None,
+                                           pages: Tuple[int, int] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """Answer a question, yielding (event, data) pairs as the response streams
         
-        content = self.documents[document_id]
+        Events are "sources" (chunks used), "delta" (new text for a field),
+        "field" (a completed field) and finally "done" (the full result).
+        Raises Overloaded before the first event if the LLM queue is full.
+        """
+        conversation = self._conversation(document_id, conversation_id)
+        prompt, source_chunks = await self._run_off_loop(
+            self._build_answer_prompt, document_id, question, top_k, token_budget, conversation, pages
+        )
+        self.scheduler.admit()
+        yield "sources", {"source_chunks": source_chunks}
         
-        prompt = f"""
-        Based on the following document and challenge question, evaluate the user's answer:
+        fields = dict(zip(ANSWER_KEYS, ("answer", "justification", "source_reference")))
+        parser = SectionStreamParser(ANSWER_KEYS)
         
-        Document:
-        {content}
+        def event_data(kind: str, key: str, text: str) -> Dict[str, str]:
+            return {"field": fields[key], ("text" if kind == "delta" else "value"): text}
         
-        Question: {question}
-        Correct Answer: {correct_answer}
-        User's Answer: {user_answer}
+        try:
+            async for chunk in self._stream_async(prompt, document_id):
+                for kind, key, text in parser.feed(chunk):
+                    yield kind, event_data(kind, key, text)
+            for kind, key, text in parser.close():
+                yield kind, event_data(kind, key, text)
+        except Exception as e:
+            yield "done", self._answer_error(e, source_chunks)
+            return
         
-        Please evaluate the user's answer and provide:
-        1. Whether it's correct or not
-        2. Detailed feedback
-        3. The correct answer
-        4. Justification with document reference
-        5. A score from 0-100
+        result = answer_from_fields(parser.values)
+        result["source_chunks"] = source_chunks
+        self._record_turn(document_id, conversation_id, question, result)
+        yield "done", await self._run_off_loop(self._add_highlights, document_id, question, result, pages)
+    
+    @STAGE_SECONDS.timed(stage="build_conversation_prompt")
+    def _build_conversation_summary_prompt(self, summary: str, turns: List[Dict]) -> str:
+        """Build the prompt that folds older turns into a conversation's rolling summary"""
+        def build(body: str) -> str:
+            return f"""
+            You are maintaining a running summary of a conversation about a document.
+            Update the summary so it also covers the new exchanges below, in no more than
+            {CONVERSATION_SUMMARY_WORDS} words. Keep the questions asked, the facts established and
+            anything the user may refer back to; drop pleasantries and repetition.
+            
+            Current summary:
+            {summary or "(none yet)"}
+            
+            New exchanges:
+            {body}
+            
+            Updated summary (max {CONVERSATION_SUMMARY_WORDS} words):
+            """
+        return self.packer.pack("summary", build, format_turns(turns))
+    
+    async def compact_conversation_async(self, document_id: str, conversation_id: str) -> Optional[str]:
+        """Fold the turns that left a conversation's verbatim window into its rolling summary
         
-        Format your response as:
-        IS_CORRECT: [True/False]
-        FEEDBACK: [Detailed feedback on user's answer]
-        CORRECT_ANSWER: [The correct answer]
-        JUSTIFICATION: [Explanation with document reference]
-        SCORE: [0-100]
+        Meant to run as a background job after an answer is returned; returns
+        the new summary, or None if nothing was due.
         """
+        session = self.conversations.get(document_id, conversation_id)
+        turns = self.conversations.pending_turns(session)
+        if not turns:
+            return None
+        prompt = self._build_conversation_summary_prompt(session["summary"], turns)
+        with llm_priority(BACKGROUND):
+            summary = await self._generate_async(prompt, document_id)
+        # Enforce the word limit, so follow-up prompts stay bounded even if the model runs long
+        summary = " ".join(summary.split()[:CONVERSATION_SUMMARY_WORDS])
+        self.conversations.fold(document_id, conversation_id, summary, turns[-1]["index"])
+        return summary
+    
+    @STAGE_SECONDS.timed(stage="build_challenge_prompt")
+    def _build_challenge_prompt(self, document_id: str) -> str:
+        """Build the challenge question prompt, packing the document only on first use"""
+        prompt = self.challenge_prompts.get(document_id)
+        if prompt is not None:
+            return prompt
+        content = self.get_document_text(document_id)
+        
+        def build(body: str) -> str:
+            return f"""
+            Based on the following document, generate exactly 3 challenging questions that require:
+            - Deep comprehension
+            - Logical reasoning
+            - Critical thinking
+            
+            For each question, provide:
+            1. The question itself
+            2. The correct answer
+            3. A detailed explanation with document reference
+            
+            Document:
+            {body}
+            
+            Please format your response as:
+            QUESTION_1: [Question here]
+            ANSWER_1: [Correct answer here]
+            EXPLANATION_1: [Detailed explanation with reference]
+            
+            QUESTION_2: [Question here]
+            ANSWER_2: [Correct answer here]
+            EXPLANATION_2: [Detailed explanation with reference]
+            
+            QUESTION_3: [Question here]
+            ANSWER_3: [Correct answer here]
+            EXPLANATION_3: [Detailed explanation with reference]
+            """
+        prompt = self.packer.pack("challenge", build, content, self.get_boilerplate(document_id))
+        self.challenge_prompts[document_id] = prompt
+        return prompt
+    
+    def _supporting_spans(self, document_id: str, question: Dict[str, str]) -> List[Dict[str, int]]:
+        """Locate the document passages behind a challenge question, merged into character spans"""
+        query = f"{question['question']} {question['correct_answer']} {question['explanation']}"
+        chunks = self.get_index(document_id).select(query, CHALLENGE_SPAN_CHUNKS, CHALLENGE_SPAN_TOKENS)
+        spans: List[Dict[str, int]] = []
+        for chunk in chunks:
+            if spans and chunk["start"] <= spans[-1]["end"]:
+                spans[-1]["end"] = max(spans[-1]["end"], chunk["end"])
+            else:
+                spans.append({"start": chunk["start"], "end": chunk["end"]})
+        return spans
+    
+    def _save_challenge(self, document_id: str, questions: List[Dict[str, str]]) -> Dict[str, any]:
+        """Store a challenge set with the supporting span of each question and return it with its ID
+        
+        Nothing is stored when generation or parsing failed, as there is no answer to grade against.
+        """
+        if not any(question["correct_answer"] for question in questions):
+            return {"challenge_id": None, "questions": questions}
+        
+        challenge_id = uuid.uuid4().hex[:16]
+        stored = [
+            {**question, "question_id": i, "spans": self._supporting_spans(document_id, question)}
+            for i, question in enumerate(questions)
+        ]
+        self.store.put_artifact(document_id, f"challenge:{challenge_id}", json.dumps(stored))
+        return {
+            "challenge_id": challenge_id,
+            "questions": [{key: value for key, value in q.items() if key != "spans"} for q in stored]
+        }
+    
+    def get_challenge_question(self, document_id: str, challenge_id: str, question_id: int) -> Dict[str, any]:
+        """Return a stored challenge question with its answer and supporting spans"""
+        stored = self.store.get_artifact(document_id, f"challenge:{challenge_id}")
+        if stored is None:
+            raise ValueError("Challenge not found")
+        questions = json.loads(stored)
+        if not 0 <= question_id < len(questions):
+            raise ValueError("Question not found")
+        return questions[question_id]
+    
+    def generate_challenge_questions(self, document_id: str) -> Dict[str, any]:
+        """Generate 3 logic-based challenge questions and store them as a challenge set"""
+        prompt = self._build_challenge_prompt(document_id)
         
         try:
-            response = self.model.generate_content(prompt)
-            result = self._parse_evaluation_response(response.text)
-            return result
+            questions = self._parse_challenge_questions(self._generate(prompt, document_id))
+        except Overloaded:
+            raise
         except Exception as e:
-            return {
-                "is_correct": False,
-                "feedback": f"Error evaluating answer: {str(e)}",
-                "correct_answer": correct_answer,
-                "justification": "",
-                "score": 0
-            }
+            questions = [{"question": f"Error generating questions: {str(e)}", "correct_answer": "", "explanation": ""}]
+        return self._save_challenge(document_id, questions)
     
-    def _parse_answer_response(self, response_text: str) -> Dict[str, str]:
-        """Parse the structured response from Gemini AI for answers"""
-        answer = re.search(r'ANSWER:\s*(.*?)(?=JUSTIFICATION:|$)', response_text, re.DOTALL)
-        justification = re.search(r'JUSTIFICATION:\s*(.*?)(?=SOURCE_REFERENCE:|$)', response_text, re.DOTALL)
-        source_ref = re.search(r'SOURCE_REFERENCE:\s*(.*?)$', response_text, re.DOTALL)
+    async def generate_challenge_questions_async(self, document_id: str) -> Dict[str, any]:
+        """Generate and store challenge questions without blocking the event loop"""
+        prompt = await self._run_off_loop(self._build_challenge_prompt, document_id)
+        
+        try:
+            questions = self._parse_challenge_questions(await self._generate_async(prompt, document_id))
+        except Overloaded:
+            raise
+        except Exception as e:
+            questions = [{"question": f"Error generating questions: {str(e)}", "correct_answer": "", "explanation": ""}]
+        return await self._run_off_loop(self._save_challenge, document_id, questions)
+    
+    @STAGE_SECONDS.timed(stage="build_evaluation_prompt")
+    def _build_evaluation_prompt(self, document_id: str, question: Dict[str, any], user_answer: str) -> str:
+        """Build the answer evaluation prompt from the question's supporting passages only"""
+        content = self.get_document_text(document_id)
+        excerpts = "\n\n[...]\n\n".join(content[span["start"]:span["end"]] for span in question["spans"])
+        
+        def build(body: str) -> str:
+            return f"""
+            Based on the following document excerpts and challenge question, evaluate the user's answer:
+            
+            Document excerpts:
+            {body}
+            
+            Question: {question["question"]}
+            Correct Answer: {question["correct_answer"]}
+            Explanation: {question["explanation"]}
+            User's Answer: {user_answer}
+            
+            Please evaluate the user's answer and provide:
+            1. Whether it's correct or not
+            2. Detailed feedback
+            3. The correct answer
+            4. Justification with document reference
+            5. A score from 0-100
+            
+            Format your response as:
+            IS_CORRECT: [True/False]
+            FEEDBACK: [Detailed feedback on user's answer]
+            CORRECT_ANSWER: [The correct answer]
+            JUSTIFICATION: [Explanation with document reference]
+            SCORE: [0-100]
+            """
+        return self.packer.pack("evaluation", build, excerpts, self.get_boilerplate(document_id))
+    
+    def _evaluation_error(self, error: Exception, correct_answer: str) -> Dict[str, any]:
+        """Build the evaluation payload returned when the LLM call fails"""
+        return {
+            "is_correct": False,
+            "feedback": f"Error evaluating answer: {str(error)}",
+            "correct_answer": correct_answer,
+            "justification": "",
+            "score": 0,
+            "graded_by": MODEL
+        }
+    
+    def _pre_grade(self, document_id: str, question: Dict[str, any], user_answer: str) -> Optional[Dict[str, any]]:
+        """Grade an answer locally, returning the evaluation if it is clear-cut or None to ask the model"""
+        grade = grade_answer(user_answer, question["correct_answer"], self.get_index(document_id).idf)
+        GRADING_DECISIONS.inc(decision=grade["verdict"])
+        if grade["verdict"] == "uncertain":
+            return None
         
+        passed = grade["verdict"] == "pass"
+        if passed:
+            feedback = "Your answer matches the expected answer and covers its key points."
+        elif grade["score"] == 0:
+            feedback = "Your answer does not address the key points of the expected answer."
+        else:
+            feedback = "Your answer misses most of the key points of the expected answer."
         return {
-            "answer": answer.group(1).strip() if answer else "Unable to parse answer",
-            "justification": justification.group(1).strip() if justification else "Unable to parse justification",
-            "source_reference": source_ref.group(1).strip() if source_ref else "Unable to parse source reference"
+            "is_correct": passed,
+            "feedback": feedback,
+            "correct_answer": question["correct_answer"],
+            "justification": question["explanation"],
+            "score": round(grade["score"] * 100),
+            "graded_by": LOCAL
         }
     
-    def _parse_challenge_questions(self, response_text: str) -> List[Dict[str, str]]:
-        """Parse the structured response from Gemini AI for challenge questions"""
-        questions = []
+    def evaluate_challenge_answer(self, document_id: str, challenge_id: str, question_id: int, user_answer: str) -> Dict[str, any]:
+        """Evaluate user's answer to a stored challenge question"""
+        question = self.get_challenge_question(document_id, challenge_id, question_id)
+        local = self._pre_grade(document_id, question, user_answer)
+        if local is not None:
+            return local
+        prompt = self._build_evaluation_prompt(document_id, question, user_answer)
+        
+        try:
+            return self._parse_evaluation_response(self._generate(prompt, document_id))
+        except Overloaded:
+            raise
+        except Exception as e:
+            return self._evaluation_error(e, question["correct_answer"])
+    
+    async def evaluate_challenge_answer_async(self, document_id: str, challenge_id: str, question_id: int, user_answer: str) -> Dict[str, any]:
+        """Evaluate user's answer without blocking the event loop"""
+        question = self.get_challenge_question(document_id, challenge_id, question_id)
+        local = self._pre_grade(document_id, question, user_answer)
+        if local is not None:
+            return local
+        prompt = self._build_evaluation_prompt(document_id, question, user_answer)
         
-        for i in range(1, 4):
-            question_match = re.search(fr'QUESTION_{i}:\s*(.*?)(?=ANSWER_{i}:|$)', response_text, re.DOTALL)
-            answer_match = re.search(fr'ANSWER_{i}:\s*(.*?)(?=EXPLANATION_{i}:|$)', response_text, re.DOTALL)
-            explanation_match = re.search(fr'EXPLANATION_{i}:\s*(.*?)(?=QUESTION_{i+1}:|$)', response_text, re.DOTALL)
+        try:
+            return self._parse_evaluation_response(await self._generate_async(prompt, document_id))
+        except Overloaded:
+            raise
+        except Exception as e:
+            return self._evaluation_error(e, question["correct_answer"])
+    
+    def _collection_documents(self, document_ids: List[str]) -> List[str]:
+        """Deduplicate document IDs, keeping their order, and check they are all stored"""
+        unique = list(dict.fromkeys(document_ids))
+        for document_id in unique:
+            if document_id not in self.store:
+                raise ValueError(f"Document not found: {document_id}")
+        return unique
+    
+    def create_collection(self, name: str, document_ids: List[str]) -> Dict[str, any]:
+        """Create a named collection of stored documents"""
+        collection_id = uuid.uuid4().hex[:16]
+        document_ids = self._collection_documents(document_ids)
+        self.store.put_collection(collection_id, name, document_ids)
+        return {"collection_id": collection_id, "name": name, "document_ids": document_ids}
+    
+    def get_collection(self, collection_id: str) -> Dict[str, any]:
+        """Return a collection's name and documents"""
+        collection = self.store.get_collection(collection_id)
+        if collection is None:
+            raise ValueError("Collection not found")
+        return {"collection_id": collection_id, **collection}
+    
+    def add_to_collection(self, collection_id: str, document_ids: List[str]) -> Dict[str, any]:
+        """Add stored documents to a collection"""
+        collection = self.get_collection(collection_id)
+        collection["document_ids"] = self._collection_documents(collection["document_ids"] + document_ids)
+        self.store.put_collection(collection_id, collection["name"], collection["document_ids"])
+        return collection
+    
+    def get_corpus(self, collection_id: str) -> CorpusIndex:
+        """Return the corpus index of a collection, rebuilding it when its documents changed"""
+        document_ids = tuple(self.get_collection(collection_id)["document_ids"])
+        cached = self.corpora.get(collection_id)
+        if cached is not None and cached[0] == document_ids:
+            return cached[1]
+        corpus = CorpusIndex(document_ids, self.get_index)
+        self.corpora[collection_id] = (document_ids, corpus)
+        return corpus
+    
+    @STAGE_SECONDS.timed(stage="build_collection_prompt")
+    def _build_collection_prompt(self, collection_id: str, question: str, top_k: int = None,
+                                 token_budget: int = None) -> Tuple[str, List[Dict], Dict[str, int]]:
+        """Retrieve the best passages of a whole collection and build one grounded prompt
+        
+        Returns the prompt, the passages used (with their citation labels) and
+        the corpus search statistics.
+        """
+        def build(body: str) -> str:
+            return f"""
+            Based on the following passages from a collection of documents, please answer the question with:
+            1. A clear, comprehensive answer that draws on every relevant document
+            2. Justification explaining your reasoning
+            3. References to the passages that support your answer
+            
+            Each passage is labelled [D<document>:C<chunk>] and followed by its document name.
             
-            if question_match:
-                questions.append({
-                    "question": question_match.group(1).strip(),
-                    "correct_answer": answer_match.group(1).strip() if answer_match else "",
-                    "explanation": explanation_match.group(1).strip() if explanation_match else ""
-                })
+            Passages:
+            {body}
+            
+            Question: {question}
+            
+            Please format your response as:
+            ANSWER: [Your answer here]
+            JUSTIFICATION: [Your reasoning here]
+            SOURCE_REFERENCE: [Passage labels used, e.g. [D1:C3], each followed by the supporting text]
+            """
+        
+        found = self.get_corpus(collection_id).search(question, top_k or CORPUS_TOP_K)
+        budget = min(token_budget or DEFAULT_TOKEN_BUDGET, self.packer.available("collection", build))
+        selected = select_passages(found["passages"], budget)
         
-        return questions if questions else [{"question": "Error parsing questions", "correct_answer": "", "explanation": ""}]
+        # Number documents in order of their best passage; list each document's passages in reading order
+        numbers: Dict[str, int] = {}
+        for document_id, _, _ in selected:
+            numbers.setdefault(document_id, len(numbers) + 1)
+        selected.sort(key=lambda passage: (numbers[passage[0]], passage[1]["start"]))
+        
+        sources = []
+        blocks = []
+        for document_id, chunk, score in selected:
+            label = passage_label(numbers[document_id], chunk["id"])
+            filename = (self.store.get_metadata(document_id) or {}).get("filename") or document_id
+            sources.append({
+                "label": label, "document_id": document_id, "filename": filename,
+                "chunk_id": chunk["id"], "start": chunk["start"], "end": chunk["end"], "score": score
+            })
+            blocks.append(f"{label} ({filename})\n{chunk['text'].strip()}")
+        
+        prompt = self.packer.pack("collection", build, "\n\n".join(blocks))
+        stats = {"shards_matched": found["shards_matched"], "shards_searched": found["shards_searched"]}
+        return prompt, sources, stats
     
+    async def answer_collection_question_async(self, collection_id: str, question: str, top_k: int = None,
+                                               token_budget: int = None) -> Dict[str, any]:
+        """Answer one question across a collection with a single LLM call citing document passages"""
+        # Corpus search is CPU bound (and may load shards from the store), so keep it off the event loop
+        loop = asyncio.get_running_loop()
+        prompt, sources, stats = await loop.run_in_executor(
+            None, self._build_collection_prompt, collection_id, question, top_k, token_budget
+        )
+        
+        try:
+            result = self._parse_answer_response(await self._generate_async(prompt))
+        except Overloaded:
+            raise
+        except Exception as e:
+            result = {"answer": f"Error generating answer: {str(e)}", "justification": "", "source_reference": ""}
+        return {**result, "sources": sources, **stats}
+    
+    @STAGE_SECONDS.timed(stage="parse_answer")
+    def _parse_answer_response(self, response_text: str) -> Dict[str, str]:
+        """Parse the structured response from Gemini AI for answers"""
+        return answer_from_fields(parse_sections(response_text, ANSWER_KEYS))
+    
+    @STAGE_SECONDS.timed(stage="parse_challenge")
+    def _parse_challenge_questions(self, response_text: str) -> List[Dict[str, str]]:
+        """Parse the structured response from Gemini AI for challenge questions"""
+        return challenge_questions_from_fields(parse_sections(response_text, CHALLENGE_KEYS))
+    
+    @STAGE_SECONDS.timed(stage="parse_evaluation")
     def _parse_evaluation_response(self, response_text: str) -> Dict[str, any]:
         """Parse the structured response from Gemini AI for evaluation"""
-        is_correct_match = re.search(r'IS_CORRECT:\s*(True|False)', response_text, re.IGNORECASE)
-        feedback_match = re.search(r'FEEDBACK:\s*(.*?)(?=CORRECT_ANSWER:|$)', response_text, re.DOTALL)
-        correct_answer_match = re.search(r'CORRECT_ANSWER:\s*(.*?)(?=JUSTIFICATION:|$)', response_text, re.DOTALL)
-        justification_match = re.search(r'JUSTIFICATION:\s*(.*?)(?=SCORE:|$)', response_text, re.DOTALL)
-        score_match = re.search(r'SCORE:\s*(\d+)', response_text)
-        
-        return {
-            "is_correct": is_correct_match.group(1).lower() == 'true' if is_correct_match else False,
-            "feedback": feedback_match.group(1).strip() if feedback_match else "Unable to parse feedback",
-            "correct_answer": correct_answer_match.group(1).strip() if correct_answer_match else "Unable to parse correct answer",
-            "justification": justification_match.group(1).strip() if justification_match else "Unable to parse justification",
-            "score": int(score_match.group(1)) if score_match else 0
-        }
+        result = evaluation_from_fields(parse_sections(response_text, EVALUATION_KEYS))
+        result["graded_by"] = MODEL
+        return result
@@ -0,0 +1,404 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from jobs import FAILED, PENDING, RUNNING
+
+# How long a connection waits for another process's write lock before raising
+SQLITE_TIMEOUT_SECONDS = float(os.getenv('SQLITE_TIMEOUT_SECONDS', '30'))
+
+class LRUDict:
+    """Thread-safe dict that keeps at most max_entries, dropping the least recently used"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for key and mark it as recently used"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        """Remove key and return its value"""
+        with self._lock:
+            return self._data.pop(key, default)
+
+class DocumentStore:
+    """Interface for storing document texts, summaries and derived artifacts"""
+
+    def __contains__(self, document_id: str) -> bool:
+        """Return True if the document is stored"""
+        raise NotImplementedError
+
+    def put_document(self, document_id: str, filename: str, text: str) -> None:
+        """Store a document's full text"""
+        raise NotImplementedError
+
+    def get_text(self, document_id: str) -> Optional[str]:
+        """Return a document's full text, loading it lazily"""
+        raise NotImplementedError
+
+    def get_metadata(self, document_id: str) -> Optional[Dict]:
+        """Return filename, word count and summary without the text"""
+        raise NotImplementedError
+
+    def set_summary(self, document_id: str, summary: str) -> None:
+        """Store the summary for a document"""
+        raise NotImplementedError
+
+    def get_summary(self, document_id: str) -> Optional[str]:
+        """Return the stored summary for a document"""
+        raise NotImplementedError
+
+    def put_artifact(self, document_id: str, name: str, value: str) -> None:
+        """Store a named derived artifact (serialized as a string)"""
+        raise NotImplementedError
+
+    def get_artifact(self, document_id: str, name: str) -> Optional[str]:
+        """Return a named derived artifact"""
+        raise NotImplementedError
+
+    def update_artifact(self, document_id: str, name: str,
+                        update: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        """Atomically replace an artifact with update(current value), across processes sharing the store
+
+        If update returns None the artifact is left as it is. Returns the new
+        value, or None if nothing was written.
+        """
+        raise NotImplementedError
+
+    def put_content_hash(self, content_hash: str, document_id: str) -> None:
+        """Record that uploaded bytes with content_hash produced document_id"""
+        raise NotImplementedError
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        """Return the document ID previously produced from these bytes"""
+        raise NotImplementedError
+
+    def put_collection(self, collection_id: str, name: str, document_ids: List[str]) -> None:
+        """Create or replace a named collection of documents"""
+        raise NotImplementedError
+
+    def get_collection(self, collection_id: str) -> Optional[Dict]:
+        """Return a collection's name and document IDs"""
+        raise NotImplementedError
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Return the shared status, error, owner and last update time of a background job"""
+        raise NotImplementedError
+
+    def claim_job(self, job_id: str, owner: str, lease_seconds: float, retry_failed: bool = False) -> bool:
+        """Atomically take a job as pending for owner, returning False if someone else holds it
+
+        A job can be claimed if it is unknown, if its pending/running claim is
+        older than lease_seconds (its worker died), or if it failed and
+        retry_failed is set.
+        """
+        raise NotImplementedError
+
+    def set_job_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """Record a job's status, refreshing its claim"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """Return stored and memory-resident document counts"""
+        raise NotImplementedError
+
+class InMemoryDocumentStore(DocumentStore):
+    """Unbounded in-process store, for tests and throwaway runs"""
+
+    def __init__(self):
+        self.documents: Dict[str, Dict] = {}
+        self.artifacts: Dict[tuple, str] = {}
+        self.content_hashes: Dict[str, str] = {}
+        self.collections: Dict[str, Dict] = {}
+        self.jobs: Dict[str, Dict] = {}
+        self._jobs_lock = threading.Lock()
+        self._artifacts_lock = threading.Lock()
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self.documents
+
+    def put_document(self, document_id: str, filename: str, text: str) -> None:
+        self.documents[document_id] = {
+            "filename": filename,
+            "text": text,
+            "word_count": len(text.split()),
+            "summary": None
+        }
+
+    def get_text(self, document_id: str) -> Optional[str]:
+        document = self.documents.get(document_id)
+        return document["text"] if document else None
+
+    def get_metadata(self, document_id: str) -> Optional[Dict]:
+        document = self.documents.get(document_id)
+        if document is None:
+            return None
+        return {k: v for k, v in document.items() if k != "text"}
+
+    def set_summary(self, document_id: str, summary: str) -> None:
+        if document_id in self.documents:
+            self.documents[document_id]["summary"] = summary
+
+    def get_summary(self, document_id: str) -> Optional[str]:
+        document = self.documents.get(document_id)
+        return document["summary"] if document else None
+
+    def put_artifact(self, document_id: str, name: str, value: str) -> None:
+        self.artifacts[(document_id, name)] = value
+
+    def get_artifact(self, document_id: str, name: str) -> Optional[str]:
+        return self.artifacts.get((document_id, name))
+
+    def update_artifact(self, document_id: str, name: str,
+                        update: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        with self._artifacts_lock:
+            value = update(self.artifacts.get((document_id, name)))
+            if value is not None:
+                self.artifacts[(document_id, name)] = value
+            return value
+
+    def put_content_hash(self, content_hash: str, document_id: str) -> None:
+        self.content_hashes[content_hash] = document_id
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        document_id = self.content_hashes.get(content_hash)
+        return document_id if document_id in self.documents else None
+
+    def put_collection(self, collection_id: str, name: str, document_ids: List[str]) -> None:
+        self.collections[collection_id] = {"name": name, "document_ids": list(document_ids)}
+
+    def get_collection(self, collection_id: str) -> Optional[Dict]:
+        collection = self.collections.get(collection_id)
+        return {"name": collection["name"], "document_ids": list(collection["document_ids"])} if collection else None
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    def claim_job(self, job_id: str, owner: str, lease_seconds: float, retry_failed: bool = False) -> bool:
+        now = time.time()
+        with self._jobs_lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                stale = job["status"] in (PENDING, RUNNING) and job["updated"] < now - lease_seconds
+                if not (stale or (retry_failed and job["status"] == FAILED)):
+                    return False
+            self.jobs[job_id] = {"status": PENDING, "error": None, "owner": owner, "updated": now}
+            return True
+
+    def set_job_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._jobs_lock:
+            job = self.jobs.setdefault(job_id, {"owner": None})
+            job.update(status=status, error=error, updated=time.time())
+
+    def stats(self) -> Dict[str, int]:
+        return {"documents": len(self.documents), "resident_documents": len(self.documents)}
+
+class SQLiteDocumentStore(DocumentStore):
+    """SQLite-backed store with a bounded LRU of hot document texts kept in memory
+
+    The database is shared by every server worker process (WAL lets readers
+    proceed while one process writes); only the LRU is per process.
+    """
+
+    def __init__(self, db_path: str, max_resident: int = 32):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=SQLITE_TIMEOUT_SECONDS, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id TEXT PRIMARY KEY, filename TEXT, text TEXT NOT NULL, word_count INTEGER NOT NULL, "
+            "summary TEXT, created REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "document_id TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (document_id, name))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS content_hashes ("
+            "hash TEXT PRIMARY KEY, document_id TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS collections ("
+            "id TEXT PRIMARY KEY, name TEXT NOT NULL, document_ids TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT, owner TEXT, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._resident = LRUDict(max_resident)
+
+    def _query(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        """Execute and commit a statement, returning the number of rows changed"""
+        with self._lock:
+            changed = self._db.execute(sql, params).rowcount
+            self._db.commit()
+            return changed
+
+    def __contains__(self, document_id: str) -> bool:
+        if document_id in self._resident:
+            return True
+        return self._query("SELECT 1 FROM documents WHERE id = ?", (document_id,)) is not None
+
+    def put_document(self, document_id: str, filename: str, text: str) -> None:
+        self._write(
+            "INSERT INTO documents (id, filename, text, word_count, created) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET filename = excluded.filename",
+            (document_id, filename, text, len(text.split()), time.time())
+        )
+        self._resident[document_id] = text
+
+    def get_text(self, document_id: str) -> Optional[str]:
+        text = self._resident.get(document_id)
+        if text is not None:
+            return text
+        row = self._query("SELECT text FROM documents WHERE id = ?", (document_id,))
+        if row is None:
+            return None
+        self._resident[document_id] = row[0]
+        return row[0]
+
+    def get_metadata(self, document_id: str) -> Optional[Dict]:
+        row = self._query("SELECT filename, word_count, summary FROM documents WHERE id = ?", (document_id,))
+        if row is None:
+            return None
+        return {"filename": row[0], "word_count": row[1], "summary": row[2]}
+
+    def set_summary(self, document_id: str, summary: str) -> None:
+        self._write("UPDATE documents SET summary = ? WHERE id = ?", (summary, document_id))
+
+    def get_summary(self, document_id: str) -> Optional[str]:
+        row = self._query("SELECT summary FROM documents WHERE id = ?", (document_id,))
+        return row[0] if row else None
+
+    def put_artifact(self, document_id: str, name: str, value: str) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO artifacts (document_id, name, value) VALUES (?, ?, ?)",
+            (document_id, name, value)
+        )
+
+    def get_artifact(self, document_id: str, name: str) -> Optional[str]:
+        row = self._query("SELECT value FROM artifacts WHERE document_id = ? AND name = ?", (document_id, name))
+        return row[0] if row else None
+
+    def update_artifact(self, document_id: str, name: str,
+                        update: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        # BEGIN IMMEDIATE takes the write lock before the read, so another worker's
+        # read-modify-write of the same artifact waits instead of being overwritten
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT value FROM artifacts WHERE document_id = ? AND name = ?", (document_id, name)
+                ).fetchone()
+                value = update(row[0] if row else None)
+                if value is not None:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO artifacts (document_id, name, value) VALUES (?, ?, ?)",
+                        (document_id, name, value)
+                    )
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._db.commit()
+            return value
+
+    def put_content_hash(self, content_hash: str, document_id: str) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO content_hashes (hash, document_id) VALUES (?, ?)",
+            (content_hash, document_id)
+        )
+
+    def find_by_content_hash(self, content_hash: str) -> Optional[str]:
+        row = self._query(
+            "SELECT h.document_id FROM content_hashes h JOIN documents d ON d.id = h.document_id WHERE h.hash = ?",
+            (content_hash,)
+        )
+        return row[0] if row else None
+
+    def put_collection(self, collection_id: str, name: str, document_ids: List[str]) -> None:
+        self._write(
+            "INSERT INTO collections (id, name, document_ids, created) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, document_ids = excluded.document_ids",
+            (collection_id, name, json.dumps(list(document_ids)), time.time())
+        )
+
+    def get_collection(self, collection_id: str) -> Optional[Dict]:
+        row = self._query("SELECT name, document_ids FROM collections WHERE id = ?", (collection_id,))
+        return {"name": row[0], "document_ids": json.loads(row[1])} if row else None
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        row = self._query("SELECT status, error, owner, updated FROM jobs WHERE id = ?", (job_id,))
+        if row is None:
+            return None
+        return {"status": row[0], "error": row[1], "owner": row[2], "updated": row[3]}
+
+    def claim_job(self, job_id: str, owner: str, lease_seconds: float, retry_failed: bool = False) -> bool:
+        # A single upsert, so two workers racing for the same job cannot both win
+        now = time.time()
+        return self._write(
+            "INSERT INTO jobs (id, status, error, owner, updated) VALUES (?, ?, NULL, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status = excluded.status, error = NULL, "
+            "owner = excluded.owner, updated = excluded.updated "
+            "WHERE (jobs.status IN (?, ?) AND jobs.updated < ?) OR (? AND jobs.status = ?)",
+            (job_id, PENDING, owner, now, PENDING, RUNNING, now - lease_seconds, retry_failed, FAILED)
+        ) > 0
+
+    def set_job_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        self._write(
+            "INSERT INTO jobs (id, status, error, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET status = excluded.status, error = excluded.error, "
+            "updated = excluded.updated",
+            (job_id, status, error, time.time())
+        )
+
+    def stats(self) -> Dict[str, int]:
+        total = self._query("SELECT COUNT(*) FROM documents")[0]
+        return {"documents": total, "resident_documents": len(self._resident)}
+
+def create_document_store() -> DocumentStore:
+    """Build the document store selected by DOCUMENT_STORE ('sqlite' or 'memory')"""
+    backend = os.getenv('DOCUMENT_STORE', 'sqlite').lower()
+    if backend == 'memory':
+        return InMemoryDocumentStore()
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown DOCUMENT_STORE: {backend}")
+
+    db_path = os.getenv('DOCUMENT_STORE_PATH') or os.path.join(os.getenv('UPLOAD_DIR', 'uploads'), 'documents.sqlite3')
+    max_resident = int(os.getenv('DOCUMENT_STORE_MAX_RESIDENT', '32'))
+    return SQLiteDocumentStore(db_path, max_resident=max_resident)
@@ -0,0 +1,251 @@
+import math
+import os
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from document_store import LRUDict
+from retrieval import ChunkIndex, tokenize
+
+# 'hashing' (local, offline) or 'gemini' (remote embedding model)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing').lower()
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'models/embedding-001')
+# Vector size of the hashing embedder
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '256'))
+# Chunk vectors as .npy files; defaults to UPLOAD_DIR/embeddings (kept in memory with DOCUMENT_STORE=memory)
+EMBEDDING_DIR = os.getenv('EMBEDDING_DIR', '')
+# Weight of cosine similarity against normalized BM25 in hybrid retrieval (1.0 = embeddings only)
+HYBRID_ALPHA = float(os.getenv('HYBRID_ALPHA', '0.5'))
+# Texts per request to a remote embedding model
+EMBEDDING_BATCH_SIZE = 100
+# Chunks embedded per vectorized block by the hashing embedder
+HASHING_BLOCK_SIZE = 512
+# Total weight of a word's character trigrams relative to the word itself; above 1 so that
+# other forms of a word ("terminated" for "terminate") land close despite hash collisions
+TRIGRAM_WEIGHT = 2.0
+
+class Embedder:
+    """Interface for text embedders: rows are unit-length float32 vectors"""
+
+    name = "unknown"
+    # Local embedders are cheap enough to run at upload time; remote ones run on first use
+    local = False
+
+    def embed_documents(self, texts: List[str], idf: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Return one vector per text, shape (len(texts), dimensions)"""
+        raise NotImplementedError
+
+    def embed_query(self, text: str, idf: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Return the vector of a search query"""
+        return self.embed_documents([text], idf)[0]
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+@lru_cache(maxsize=200000)
+def _token_features(token: str, dimensions: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed positions and signed weights of a token and its character trigrams
+
+    Trigrams let inflections and compounds ("terminate", "termination")
+    land near each other. crc32 keeps vectors stable across processes,
+    unlike Python's salted hash().
+    """
+    padded = f"<{token}>"
+    features = [(token, 1.0)]
+    trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    features += [("#" + gram, TRIGRAM_WEIGHT / math.sqrt(len(trigrams))) for gram in trigrams]
+    positions = np.empty(len(features), dtype=np.int64)
+    values = np.empty(len(features), dtype=np.float32)
+    for i, (feature, weight) in enumerate(features):
+        digest = zlib.crc32(feature.encode())
+        positions[i] = digest % dimensions
+        values[i] = weight if digest & 0x80000000 else -weight
+    return positions, values
+
+class HashingEmbedder(Embedder):
+    """Offline TF-IDF projection: hashed term and trigram features, weighted by sublinear TF x IDF
+
+    The IDF comes from the document's own BM25 index, so common words of
+    that document weigh little; words it does not contain count as rare.
+    Captures shared vocabulary and word forms, not synonyms; configure a
+    remote model for true paraphrase matching.
+    """
+
+    local = True
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def embed_documents(self, texts: List[str], idf: Optional[Dict[str, float]] = None) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        unseen = max(idf.values(), default=1.0) if idf else 1.0
+        for block_start in range(0, len(texts), HASHING_BLOCK_SIZE):
+            positions, values = [], []
+            for row, text in enumerate(texts[block_start:block_start + HASHING_BLOCK_SIZE]):
+                offset = row * self.dimensions
+                for token, count in Counter(tokenize(text)).items():
+                    token_positions, token_values = _token_features(token, self.dimensions)
+                    weight = (1 + math.log(count)) * (idf.get(token, unseen) if idf else 1.0)
+                    positions.append(token_positions + offset)
+                    values.append(token_values * weight)
+            if positions:
+                # One bincount scatters every feature of the block into its row
+                rows = min(HASHING_BLOCK_SIZE, len(texts) - block_start)
+                block = np.bincount(np.concatenate(positions), np.concatenate(values), rows * self.dimensions)
+                vectors[block_start:block_start + rows] = block.reshape(rows, self.dimensions)
+        return _normalize_rows(vectors)
+
+class GeminiEmbedder(Embedder):
+    """Remote embeddings from the Gemini embedding model"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, api_key: Optional[str] = None):
+        # Imported here so the hashing embedder runs without the SDK installed
+        import google.generativeai as genai
+        genai.configure(api_key=api_key or os.getenv('GEMINI_API_KEY'))
+        self._genai = genai
+        self.model_name = model_name
+        self.name = "gemini-" + model_name.rsplit("/", 1)[-1]
+        # Questions repeat (retries, batches, conversations); skip the round trip for those
+        self._queries = LRUDict(256)
+
+    def _embed(self, texts: List[str], task_type: str) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+            rows.extend(self._genai.embed_content(model=self.model_name, content=batch, task_type=task_type)["embedding"])
+        return _normalize_rows(np.asarray(rows, dtype=np.float32))
+
+    def embed_documents(self, texts: List[str], idf: Optional[Dict[str, float]] = None) -> np.ndarray:
+        return self._embed(texts, "retrieval_document")
+
+    def embed_query(self, text: str, idf: Optional[Dict[str, float]] = None) -> np.ndarray:
+        vector = self._queries.get(text)
+        if vector is None:
+            vector = self._embed([text], "retrieval_query")[0]
+            self._queries[text] = vector
+        return vector
+
+def create_embedder() -> Embedder:
+    """Build the embedder selected by EMBEDDING_BACKEND ('hashing' or 'gemini')"""
+    if EMBEDDING_BACKEND == 'hashing':
+        return HashingEmbedder(EMBEDDING_DIMENSIONS)
+    if EMBEDDING_BACKEND == 'gemini':
+        return GeminiEmbedder(EMBEDDING_MODEL_NAME)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+
+def _top_k(scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    """Return (row, score) of the top_k scores, best first, without sorting everything"""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return []
+    rows = np.argpartition(-scores, top_k - 1)[:top_k]
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+    return [(int(row), float(scores[row])) for row in rows]
+
+class EmbeddingIndex:
+    """Cosine search over one document's chunk vectors
+
+    Vectors are unit rows of a float32 matrix (memory-mapped from a .npy
+    file when stored on disk), so scoring every chunk against a query is a
+    single matrix-vector product.
+    """
+
+    def __init__(self, vectors: np.ndarray, embedder: Embedder, chunk_index: ChunkIndex):
+        self.vectors = vectors
+        self.embedder = embedder
+        self.chunk_index = chunk_index
+        # BM25 length normalization per chunk and postings as arrays, for vectorized hybrid scoring
+        lengths = np.asarray(chunk_index.lengths, dtype=np.float32)
+        avg_length = chunk_index.avg_length or 1.0
+        self._norms = chunk_index.k1 * (1 - chunk_index.b + chunk_index.b * lengths / avg_length)
+        self._postings = LRUDict(4096)
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        postings = self._postings.get(term)
+        if postings is None:
+            pairs = np.asarray(self.chunk_index.postings[term], dtype=np.int64).reshape(-1, 2)
+            postings = (pairs[:, 0], pairs[:, 1].astype(np.float32))
+            self._postings[term] = postings
+        return postings
+
+    def lexical_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk (the ChunkIndex formula, one array operation per term)"""
+        scores = np.zeros(len(self._norms), dtype=np.float32)
+        k1 = self.chunk_index.k1
+        for term in set(tokenize(query)):
+            if term not in self.chunk_index.postings:
+                continue
+            chunk_ids, freqs = self._term_postings(term)
+            scores[chunk_ids] += self.chunk_index.idf[term] * freqs * (k1 + 1) / (freqs + self._norms[chunk_ids])
+        return scores
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of the query to every chunk"""
+        return self.vectors @ self.embedder.embed_query(query, self.chunk_index.idf)
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """Return the top_k chunks by cosine similarity"""
+        return [(self.chunk_index.chunks[row], score) for row, score in _top_k(self.scores(query), top_k)]
+
+    def hybrid_search(self, query: str, top_k: int = 5, alpha: float = HYBRID_ALPHA) -> List[Tuple[Dict, float]]:
+        """Rank chunks by alpha * cosine + (1 - alpha) * BM25 scaled to the best lexical match"""
+        semantic = np.maximum(self.scores(query), 0)
+        lexical = self.lexical_scores(query)
+        best = lexical.max() if len(lexical) else 0
+        if best > 0:
+            lexical /= best
+        combined = alpha * semantic + (1 - alpha) * lexical
+        return [(self.chunk_index.chunks[row], score) for row, score in _top_k(combined, top_k) if score > 0]
+
+class EmbeddingStore:
+    """Chunk vectors of stored documents, one .npy file per document and embedder
+
+    Files are named <document_id>.<embedder name>.npy, so switching
+    embedders never mixes vector spaces; they are written under a temporary
+    name and renamed into place, and loaded as read-only memory maps.
+    Without a directory the matrices are kept in memory.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._memory: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, document_id: str, embedder_name: str) -> str:
+        return os.path.join(self.directory, f"{document_id}.{embedder_name}.npy")
+
+    def save(self, document_id: str, embedder_name: str, vectors: np.ndarray) -> np.ndarray:
+        """Store a document's vectors and return them as they will be loaded"""
+        if self.directory is None:
+            with self._lock:
+                self._memory[(document_id, embedder_name)] = vectors
+            return vectors
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            np.save(f, vectors.astype(np.float32, copy=False))
+        os.replace(f.name, self._path(document_id, embedder_name))
+        return self.load(document_id, embedder_name)
+
+    def load(self, document_id: str, embedder_name: str) -> Optional[np.ndarray]:
+        """Return a document's vectors (memory-mapped from disk), or None if not stored"""
+        if self.directory is None:
+            return self._memory.get((document_id, embedder_name))
+        try:
+            return np.load(self._path(document_id, embedder_name), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+
+def create_embedding_store() -> EmbeddingStore:
+    """Build the embedding store matching DOCUMENT_STORE: on disk next to the database, or in memory"""
+    if os.getenv('DOCUMENT_STORE', 'sqlite').lower() == 'memory':
+        return EmbeddingStore(None)
+    return EmbeddingStore(EMBEDDING_DIR or os.path.join(os.getenv('UPLOAD_DIR', 'uploads'), 'embeddings'))
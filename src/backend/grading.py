@@ -0,0 +1,77 @@
+import os
+from collections import Counter
+from typing import Dict, List, Optional
+
+from retrieval import tokenize
+
+# Local scores at or above PASS are accepted, at or below FAIL rejected; in between goes to the model
+GRADING_PASS_THRESHOLD = float(os.getenv('GRADING_PASS_THRESHOLD', '0.75'))
+GRADING_FAIL_THRESHOLD = float(os.getenv('GRADING_FAIL_THRESHOLD', '0.15'))
+# Answers with fewer terms than this are graded as a fail without asking the model
+GRADING_MIN_TERMS = int(os.getenv('GRADING_MIN_TERMS', '1'))
+
+LOCAL = "local"
+MODEL = "model"
+
+SUFFIXES = ("ing", "ed", "es", "s", "ly")
+
+def _stem(term: str) -> str:
+    """Strip one common English suffix so inflections of a word match"""
+    for suffix in SUFFIXES:
+        if len(term) > len(suffix) + 3 and term.endswith(suffix):
+            return term[:-len(suffix)]
+    return term
+
+def grading_terms(text: str) -> List[str]:
+    """Tokenize and stem text for answer comparison"""
+    return [_stem(term) for term in tokenize(text)]
+
+def lexical_overlap(answer: Counter, expected: Counter) -> float:
+    """F1 of the term multisets of an answer and the expected answer"""
+    common = sum((answer & expected).values())
+    if not common:
+        return 0.0
+    precision = common / sum(answer.values())
+    recall = common / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+def key_term_weights(correct_answer: str, idf: Dict[str, float]) -> Dict[str, float]:
+    """Weight each stemmed term of the expected answer by its rarity in the document"""
+    weights: Dict[str, float] = {}
+    for term in tokenize(correct_answer):
+        stem = _stem(term)
+        weights[stem] = max(weights.get(stem, 0.0), idf.get(term, 1.0))
+    return weights
+
+def key_term_coverage(answer: Counter, weights: Dict[str, float]) -> float:
+    """Share of the expected answer's key-term weight found in the answer"""
+    total = sum(weights.values())
+    if not total:
+        return 0.0
+    return sum(weight for term, weight in weights.items() if term in answer) / total
+
+def grade_answer(user_answer: str, correct_answer: str, idf: Optional[Dict[str, float]] = None) -> Dict[str, any]:
+    """Grade an answer locally against the expected answer
+
+    Returns the combined score in [0, 1], its components, and a verdict:
+    "pass" or "fail" when the score is outside the uncertainty band, or
+    "uncertain" when the model should decide.
+    """
+    answer = Counter(grading_terms(user_answer))
+    expected = Counter(grading_terms(correct_answer))
+
+    if sum(answer.values()) < GRADING_MIN_TERMS:
+        return {"verdict": "fail", "score": 0.0, "overlap": 0.0, "coverage": 0.0}
+    if not expected:
+        return {"verdict": "uncertain", "score": 0.0, "overlap": 0.0, "coverage": 0.0}
+
+    overlap = lexical_overlap(answer, expected)
+    coverage = key_term_coverage(answer, key_term_weights(correct_answer, idf or {}))
+    score = (overlap + coverage) / 2
+    if score >= GRADING_PASS_THRESHOLD:
+        verdict = "pass"
+    elif score <= GRADING_FAIL_THRESHOLD:
+        verdict = "fail"
+    else:
+        verdict = "uncertain"
+    return {"verdict": verdict, "score": score, "overlap": overlap, "coverage": coverage}
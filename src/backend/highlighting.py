@@ -0,0 +1,266 @@
+import os
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from retrieval import tokenize
+
+# Characters of context kept around each highlight in a snippet window
+HIGHLIGHT_CONTEXT_CHARS = int(os.getenv('HIGHLIGHT_CONTEXT_CHARS', '160'))
+HIGHLIGHT_MAX_WINDOWS = int(os.getenv('HIGHLIGHT_MAX_WINDOWS', '5'))
+# Overlapping windows stop merging at this span or this many highlights, so a dense term
+# yields several bounded snippets rather than one window over the whole document
+HIGHLIGHT_MAX_WINDOW_CHARS = int(os.getenv('HIGHLIGHT_MAX_WINDOW_CHARS', '800'))
+HIGHLIGHT_MAX_WINDOW_HIGHLIGHTS = int(os.getenv('HIGHLIGHT_MAX_WINDOW_HIGHLIGHTS', '20'))
+# Share of a quote's word trigrams that must be found in place for a fuzzy match
+HIGHLIGHT_MIN_MATCH = float(os.getenv('HIGHLIGHT_MIN_MATCH', '0.3'))
+# Quoted fragments shorter than this many words are too ambiguous to locate
+HIGHLIGHT_MIN_QUOTE_WORDS = 4
+# Occurrences of one trigram considered when voting; very common phrases add nothing
+MAX_SHINGLE_OCCURRENCES = 64
+
+WHITESPACE_RUN_PATTERN = re.compile(r"\s{2,}")
+WHITESPACE_PATTERN = re.compile(r"\s")
+# Chunk/passage labels and quote marks the model wraps around its references
+REFERENCE_LABEL_PATTERN = re.compile(r"\[(?:chunk|part)\s*\d+\]|\[d\d+:c\d+\]", re.IGNORECASE)
+REFERENCE_SPLIT_PATTERN = re.compile(r"[\"“”]|\.\.\.|…|\[\.\.\.\]|\n")
+
+def normalize(text: str) -> str:
+    """Lowercase text and collapse whitespace runs to one space, as NormalizedText does"""
+    return WHITESPACE_PATTERN.sub(" ", WHITESPACE_RUN_PATTERN.sub(" ", text)).lower()
+
+class NormalizedText:
+    """A document lowercased with whitespace collapsed, mapped back to original offsets
+
+    Matching runs on the normalized copy; only runs of two or more
+    whitespace characters change offsets, so the map back to the original
+    is a short list of breakpoints rather than one entry per character.
+    Page starts (character offsets) let any position be reported as a page.
+    The text may be a slice of a document starting at offset base (e.g. a
+    page range); offsets in and out are then those of the whole document.
+    """
+
+    def __init__(self, text: str, page_starts: Optional[List[int]] = None, base: int = 0):
+        self.text = text
+        self.page_starts = page_starts or [0]
+        self.base = base
+        # Breakpoints: normalized offset norm_breaks[i] corresponds to original offset orig_breaks[i]
+        self.norm_breaks = [0]
+        self.orig_breaks = [base]
+        parts = []
+        last = 0
+        removed = 0
+        for match in WHITESPACE_RUN_PATTERN.finditer(text):
+            parts.append(text[last:match.start()])
+            parts.append(" ")
+            removed += match.end() - match.start() - 1
+            last = match.end()
+            self.norm_breaks.append(match.end() - removed)
+            self.orig_breaks.append(base + match.end())
+        parts.append(text[last:])
+        collapsed = WHITESPACE_PATTERN.sub(" ", "".join(parts))
+        lowered = collapsed.lower()
+        if len(lowered) != len(collapsed):
+            # A few characters lowercase to several; keep those as they are so offsets stay aligned
+            lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in collapsed)
+        self.normalized = lowered
+
+    def to_original(self, position: int) -> int:
+        """Map a normalized offset to the original text"""
+        i = bisect_right(self.norm_breaks, position) - 1
+        return self.orig_breaks[i] + position - self.norm_breaks[i]
+
+    def to_normalized(self, position: int) -> int:
+        """Map an original offset to the normalized text (inside a whitespace run, to its end)"""
+        i = max(bisect_right(self.orig_breaks, position) - 1, 0)
+        return max(self.norm_breaks[i] + position - self.orig_breaks[i], 0)
+
+    def page_of(self, position: int) -> int:
+        """Return the 1-based page containing an original offset"""
+        return bisect_right(self.page_starts, position)
+
+    def span(self, start: int, end: int) -> Dict[str, int]:
+        """Describe a normalized [start, end) range in original character and page offsets"""
+        original_start = self.to_original(start)
+        original_end = self.to_original(end)
+        return {
+            "start": original_start,
+            "end": original_end,
+            "page_start": self.page_of(original_start),
+            "page_end": self.page_of(max(original_end - 1, original_start)),
+        }
+
+@lru_cache(maxsize=256)
+def _term_pattern(terms: Tuple[str, ...]) -> "re.Pattern":
+    # Longest alternatives first, so at any position the longest term wins
+    alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternatives})\b")
+
+class TermMatcher:
+    """Finds every occurrence of many terms or phrases in a single pass
+
+    The terms are compiled into one alternation (cached per term set), so
+    the text is scanned once by the regex engine whatever the number of
+    terms. Matches are leftmost-longest and do not overlap.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = tuple(sorted({normalize(term).strip() for term in terms} - {""}))
+        self.pattern = _term_pattern(self.terms) if self.terms else None
+
+    def find(self, normalized: str, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int, str]]:
+        """Return (start, end, term) for each match in normalized[start:end]"""
+        if self.pattern is None:
+            return []
+        end = len(normalized) if end is None else end
+        return [(m.start(), m.end(), m.group()) for m in self.pattern.finditer(normalized, start, end)]
+
+def reference_quotes(reference: str) -> List[str]:
+    """Split a model's free-text source reference into normalized fragments worth locating"""
+    text = REFERENCE_LABEL_PATTERN.sub("\n", reference)
+    quotes = []
+    for fragment in REFERENCE_SPLIT_PATTERN.split(text):
+        fragment = normalize(fragment).strip(" .,;:'")
+        if len(fragment.split()) >= HIGHLIGHT_MIN_QUOTE_WORDS:
+            quotes.append(fragment)
+    return quotes
+
+def locate_quote(normalized: str, quote: str, start: int = 0, end: Optional[int] = None) -> Optional[Tuple[int, int, float]]:
+    """Find where a (possibly paraphrased) quote sits in normalized[start:end]
+
+    Exact occurrences are returned directly. Otherwise every word trigram of
+    the quote votes for the alignment at which it occurs; the densest group
+    of agreeing votes gives the span, and the share of trigrams in that group
+    its score. Returns (start, end, score) or None below HIGHLIGHT_MIN_MATCH.
+    """
+    end = len(normalized) if end is None else end
+    exact = normalized.find(quote, start, end)
+    if exact >= 0:
+        return exact, exact + len(quote), 1.0
+
+    words = quote.split(" ")
+    offsets = []
+    position = 0
+    for word in words:
+        offsets.append(position)
+        position += len(word) + 1
+    shingles = [(" ".join(words[i:i + 3]), offsets[i]) for i in range(len(words) - 2)]
+    if not shingles:
+        return None
+
+    votes = []  # (alignment, match start, match end)
+    for shingle, offset in shingles:
+        found = normalized.find(shingle, start, end)
+        count = 0
+        while found >= 0 and count < MAX_SHINGLE_OCCURRENCES:
+            votes.append((found - offset, found, found + len(shingle)))
+            count += 1
+            found = normalized.find(shingle, found + 1, end)
+    if not votes:
+        return None
+
+    # Insertions and deletions shift the alignment a little, so group votes within a tolerance
+    votes.sort()
+    tolerance = max(32, len(quote) // 5)
+    best = (0, 0, 0)
+    low = 0
+    for high in range(len(votes)):
+        while votes[high][0] - votes[low][0] > tolerance:
+            low += 1
+        if high - low + 1 > best[0]:
+            best = (high - low + 1, low, high)
+    count, low, high = best
+    score = min(1.0, count / len(shingles))
+    if score < HIGHLIGHT_MIN_MATCH:
+        return None
+    group = votes[low:high + 1]
+    return min(v[1] for v in group), max(v[2] for v in group), score
+
+def _merge_windows(highlights: List[Dict], text_start: int, text_end: int, context: int,
+                   max_chars: int = HIGHLIGHT_MAX_WINDOW_CHARS,
+                   max_highlights: int = HIGHLIGHT_MAX_WINDOW_HIGHLIGHTS) -> List[Dict]:
+    """Group highlights into snippet windows, merging overlapping windows up to max_chars and max_highlights
+
+    A window over a single long highlight (a quoted reference) may exceed
+    max_chars, but nothing is merged into it then.
+    """
+    windows: List[Dict] = []
+    for highlight in sorted(highlights, key=lambda h: h["start"]):
+        start = max(text_start, highlight["start"] - context)
+        end = min(text_end, highlight["end"] + context)
+        last = windows[-1] if windows else None
+        if (last is not None and start <= last["end"] and len(last["highlights"]) < max_highlights
+                and max(last["end"], end) - last["start"] <= max_chars):
+            last["end"] = max(last["end"], end)
+            last["highlights"].append(highlight)
+        else:
+            if last is not None and start < last["end"]:
+                # Share the context between the neighbouring highlights so snippets do not repeat text
+                last_end = max(h["end"] for h in last["highlights"])
+                cut = max(last_end, min(highlight["start"], (last_end + highlight["start"]) // 2))
+                last["end"] = min(last["end"], cut)
+                start = min(max(start, cut), highlight["start"])
+            windows.append({"start": start, "end": end, "highlights": [highlight]})
+    return windows
+
+def _window_density(window: Dict) -> float:
+    """Highlights per character of a window"""
+    return len(window["highlights"]) / max(1, window["end"] - window["start"])
+
+def highlight(document: NormalizedText, terms: Iterable[str] = (), reference: str = "",
+              regions: Optional[List[Tuple[int, int]]] = None, context: int = HIGHLIGHT_CONTEXT_CHARS,
+              max_windows: int = HIGHLIGHT_MAX_WINDOWS) -> Dict[str, List[Dict]]:
+    """Locate a source reference and terms in a document and build snippet windows around them
+
+    regions (original offsets, e.g. the chunks an answer was built from) are
+    searched first; a reference not found there is looked for in the whole
+    document. Returns "references" (located quotes with their match score)
+    and "windows": merged snippets with their text, character and page
+    offsets, and the highlights inside them. Windows are bounded in span
+    and highlight count; reference windows are kept first, then the
+    densest, up to max_windows, returned in document order.
+    """
+    normalized = document.normalized
+    spans = [
+        (document.to_normalized(s), min(document.to_normalized(e), len(normalized))) for s, e in sorted(regions or [])
+    ]
+    if not spans:
+        spans = [(0, len(normalized))]
+
+    references = []
+    for quote in reference_quotes(reference):
+        found = None
+        for start, end in spans:
+            found = locate_quote(normalized, quote, start, end)
+            if found is not None:
+                break
+        if found is None and regions:
+            found = locate_quote(normalized, quote)
+        if found is not None:
+            references.append({**document.span(found[0], found[1]), "kind": "reference", "score": found[2]})
+
+    matcher = TermMatcher(terms)
+    hits = []
+    for start, end in spans:
+        for match_start, match_end, term in matcher.find(normalized, start, end):
+            hit = {**document.span(match_start, match_end), "kind": "term", "term": term}
+            # Terms inside a located reference are already covered by it
+            if not any(r["start"] <= hit["start"] and hit["end"] <= r["end"] for r in references):
+                hits.append(hit)
+
+    windows = _merge_windows(references + hits, document.base, document.base + len(document.text), context)
+    windows.sort(key=lambda w: (
+        not any(h["kind"] == "reference" for h in w["highlights"]), -_window_density(w), w["start"]
+    ))
+    windows = sorted(windows[:max_windows], key=lambda w: w["start"])
+    for window in windows:
+        window["text"] = document.text[window["start"] - document.base:window["end"] - document.base]
+        window["page_start"] = document.page_of(window["start"])
+        window["page_end"] = document.page_of(max(window["end"] - 1, window["start"]))
+        window["highlights"].sort(key=lambda h: h["start"])
+    return {"references": references, "windows": windows}
+
+def query_terms(question: str) -> List[str]:
+    """Return the distinct index terms of a question, for highlighting"""
+    return list(dict.fromkeys(term for term in tokenize(question) if len(term) > 2))
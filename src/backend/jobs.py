@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+class Job:
+    """A unit of background work and its outcome"""
+
+    def __init__(self, job_id: str, func: Callable[..., Awaitable[Any]], args: tuple):
+        self.id = job_id
+        self.func = func
+        self.args = args
+        self.status = PENDING
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the job state as a JSON-serializable dict"""
+        return {"job_id": self.id, "status": self.status, "result": self.result, "error": self.error}
+
+class JobQueue:
+    """In-process queue of async jobs drained by a fixed number of worker tasks"""
+
+    def __init__(self, workers: int = 2, max_finished: int = 1000):
+        self.workers = workers
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self) -> None:
+        """Start the worker tasks on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str, func: Callable[..., Awaitable[Any]], *args) -> Job:
+        """Queue func(*args) under job_id unless that job is already queued or running"""
+        job = self.jobs.get(job_id)
+        if job is not None and job.status in (PENDING, RUNNING):
+            return job
+        if self._queue is None:
+            raise RuntimeError("JobQueue has not been started")
+
+        job = Job(job_id, func, args)
+        self.jobs[job_id] = job
+        self._queue.put_nowait(job)
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return the job with job_id, if known"""
+        return self.jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Wait up to timeout seconds for a job to finish and return it"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def depth(self) -> int:
+        """Return the number of queued jobs that have not started"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            try:
+                job.result = await job.func(*job.args)
+                job.status = COMPLETED
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished = time.time()
+                job.done.set()
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond max_finished"""
+        finished = [job for job in self.jobs.values() if job.finished is not None]
+        if len(finished) <= self.max_finished:
+            return
+        finished.sort(key=lambda job: job.finished)
+        for job in finished[:len(finished) - self.max_finished]:
+            del self.jobs[job.id]
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+class RateLimitError(Exception):
+    """A call rejected for exceeding the provider's quota (HTTP 429)"""
+
+    code = 429
+
+class LLMBackend:
+    """Interface for text generation backends: sync, async and streaming"""
+
+    model_name = "unknown"
+
+    def generate(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        """Return the full response text for a prompt"""
+        raise NotImplementedError
+
+    async def generate_async(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        """Return the full response text without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate, prompt, generation_config)
+
+    def stream(self, prompt: str, generation_config: Optional[Dict] = None) -> Iterator[str]:
+        """Yield the response text in chunks as it is generated"""
+        yield self.generate(prompt, generation_config)
+
+    async def stream_async(self, prompt: str, generation_config: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Yield the response text in chunks without blocking the event loop"""
+        yield await self.generate_async(prompt, generation_config)
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK"""
+
+    def __init__(self, model_name: str = "gemini-1.5-flash", api_key: Optional[str] = None):
+        # Imported here so the stub backend runs without the SDK installed
+        import google.generativeai as genai
+        genai.configure(api_key=api_key or os.getenv('GEMINI_API_KEY'))
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        response = self.model.generate_content(prompt, generation_config=generation_config or None)
+        return response.text
+
+    async def generate_async(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        response = await self.model.generate_content_async(prompt, generation_config=generation_config or None)
+        return response.text
+
+    def stream(self, prompt: str, generation_config: Optional[Dict] = None) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, generation_config=generation_config or None, stream=True):
+            yield chunk.text
+
+    async def stream_async(self, prompt: str, generation_config: Optional[Dict] = None) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            prompt, generation_config=generation_config or None, stream=True
+        )
+        async for chunk in response:
+            yield chunk.text
+
+class StubBackend(LLMBackend):
+    """Deterministic local stand-in for load tests and offline runs
+
+    Responses are canned but follow the structured formats the prompts ask
+    for. Latency is a time-to-first-token drawn from a configurable
+    distribution (seeded, so runs are repeatable), plus output tokens at a
+    fixed throughput. With rate_limit_rpm set, calls beyond that many in
+    any 60 seconds fail with RateLimitError, as a provider quota would.
+    """
+
+    WORD_PATTERN = re.compile(r"\S+\s*")
+
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 100, distribution: str = "lognormal",
+                 tokens_per_second: float = 200, seed: int = 0, responses: Optional[Dict[str, str]] = None,
+                 rate_limit_rpm: int = 0):
+        if distribution not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown stub latency distribution: {distribution}")
+        self.model_name = "stub"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.tokens_per_second = tokens_per_second
+        self.random = random.Random(seed)
+        # Optional overrides: the first marker found in a prompt selects its response
+        self.responses = responses or {}
+        self.rate_limit_rpm = rate_limit_rpm
+        self._calls = deque()
+        self._calls_lock = threading.Lock()
+
+    def _check_quota(self) -> None:
+        """Raise RateLimitError if this call would exceed rate_limit_rpm in the last minute"""
+        if self.rate_limit_rpm <= 0:
+            return
+        now = time.monotonic()
+        with self._calls_lock:
+            while self._calls and self._calls[0] <= now - 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.rate_limit_rpm:
+                raise RateLimitError("429 Resource has been exhausted (stub quota)")
+            self._calls.append(now)
+
+    def _first_token_delay(self) -> float:
+        """Draw the time to first token, in seconds"""
+        if self.distribution == "constant" or self.latency_ms <= 0 or self.jitter_ms <= 0:
+            delay = self.latency_ms
+        elif self.distribution == "uniform":
+            delay = self.random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+        else:
+            # Lognormal with mean latency_ms and standard deviation jitter_ms
+            sigma = math.sqrt(math.log(1 + (self.jitter_ms / self.latency_ms) ** 2))
+            mu = math.log(self.latency_ms) - sigma ** 2 / 2
+            delay = self.random.lognormvariate(mu, sigma)
+        return max(delay, 0.0) / 1000
+
+    def _token_delay(self) -> float:
+        """Return the time to generate one output token, in seconds"""
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _total_delay(self, text: str) -> float:
+        """Return the simulated time to generate all of text, in seconds"""
+        return self._first_token_delay() + len(self.WORD_PATTERN.findall(text)) * self._token_delay()
+
+    def respond(self, prompt: str) -> str:
+        """Return the canned response matching the format requested by the prompt"""
+        for marker, response in self.responses.items():
+            if marker in prompt:
+                return response
+        if "QUESTION_1:" in prompt:
+            return "\n\n".join(
+                f"QUESTION_{i}: What does the document conclude about point {i}?\n"
+                f"ANSWER_{i}: The document concludes that point {i} holds under the stated conditions.\n"
+                f"EXPLANATION_{i}: This follows from the section discussing point {i}."
+                for i in range(1, 4)
+            )
+        if "IS_CORRECT:" in prompt:
+            return (
+                "IS_CORRECT: True\n"
+                "FEEDBACK: The answer captures the main idea of the expected answer.\n"
+                "CORRECT_ANSWER: The document concludes that the point holds under the stated conditions.\n"
+                "JUSTIFICATION: This follows from the relevant section of the document.\n"
+                "SCORE: 80"
+            )
+        if "ANSWER:" in prompt:
+            return (
+                "ANSWER: Based on the provided excerpts, the document addresses the question directly.\n"
+                "JUSTIFICATION: The cited passage states the relevant facts explicitly.\n"
+                "SOURCE_REFERENCE: [Chunk 0] The relevant passage of the document."
+            )
+        return (
+            "This document describes its purpose, the main points it covers and the key findings it reports. "
+            "It outlines the context, summarizes the evidence presented and closes with its conclusions."
+        )
+
+    def generate(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        self._check_quota()
+        text = self.respond(prompt)
+        time.sleep(self._total_delay(text))
+        return text
+
+    async def generate_async(self, prompt: str, generation_config: Optional[Dict] = None) -> str:
+        self._check_quota()
+        text = self.respond(prompt)
+        await asyncio.sleep(self._total_delay(text))
+        return text
+
+    def stream(self, prompt: str, generation_config: Optional[Dict] = None) -> Iterator[str]:
+        self._check_quota()
+        time.sleep(self._first_token_delay())
+        for token in self.WORD_PATTERN.findall(self.respond(prompt)):
+            time.sleep(self._token_delay())
+            yield token
+
+    async def stream_async(self, prompt: str, generation_config: Optional[Dict] = None) -> AsyncIterator[str]:
+        self._check_quota()
+        await asyncio.sleep(self._first_token_delay())
+        for token in self.WORD_PATTERN.findall(self.respond(prompt)):
+            await asyncio.sleep(self._token_delay())
+            yield token
+
+def create_llm_backend() -> LLMBackend:
+    """Build the backend selected by LLM_BACKEND ('gemini' or 'stub')"""
+    backend = os.getenv('LLM_BACKEND', 'gemini').lower()
+    if backend == 'gemini':
+        return GeminiBackend(os.getenv('LLM_MODEL_NAME', 'gemini-1.5-flash'))
+    if backend == 'stub':
+        responses = None
+        if os.getenv('STUB_RESPONSES_FILE'):
+            with open(os.getenv('STUB_RESPONSES_FILE')) as f:
+                responses = json.load(f)
+        return StubBackend(
+            latency_ms=float(os.getenv('STUB_LATENCY_MS', '300')),
+            jitter_ms=float(os.getenv('STUB_LATENCY_JITTER_MS', '100')),
+            distribution=os.getenv('STUB_LATENCY_DISTRIBUTION', 'lognormal'),
+            tokens_per_second=float(os.getenv('STUB_TOKENS_PER_SECOND', '200')),
+            seed=int(os.getenv('STUB_SEED', '0')),
+            responses=responses,
+            rate_limit_rpm=int(os.getenv('STUB_RATE_LIMIT_RPM', '0'))
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
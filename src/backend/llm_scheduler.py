@@ -0,0 +1,404 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from metrics import LLM_COALESCED, LLM_QUEUE_DEPTH, LLM_QUEUE_SECONDS, LLM_RETRIES, LLM_SHED
+
+# Provider quotas; 0 disables a limit
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '1000'))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '1000000'))
+# Quota that may be spent at once, in seconds of refill; against a sliding one-minute
+# provider window, keep the per-minute limits times (60 + burst) / 60 under the quota
+LLM_RATE_BURST_SECONDS = float(os.getenv('LLM_RATE_BURST_SECONDS', '10'))
+# Response tokens counted against the token quota on top of the prompt's
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv('LLM_OUTPUT_TOKENS_ESTIMATE', '500'))
+# Interactive calls waiting for a slot before new ones are shed with 503 (batch and background work waits)
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '64'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+# Backoff before retry n is uniform in [0, min(cap, base * 2^n)] ("full jitter")
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', '1.0'))
+LLM_RETRY_MAX_SECONDS = float(os.getenv('LLM_RETRY_MAX_SECONDS', '30'))
+
+# Priority classes, served in this order
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+# Priority of the LLM calls made by the current request or job
+LLM_PRIORITY: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+# HTTP statuses and google.api_core exception names worth retrying
+RETRYABLE_STATUS = frozenset((429, 500, 502, 503, 504))
+RATE_LIMIT_ERRORS = frozenset(("ResourceExhausted", "TooManyRequests", "RateLimitError"))
+RETRYABLE_ERRORS = RATE_LIMIT_ERRORS | frozenset(
+    ("ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "BadGateway", "GatewayTimeout")
+)
+
+T = TypeVar("T")
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run the enclosed LLM calls (and tasks started inside) at a priority class"""
+    token = LLM_PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        LLM_PRIORITY.reset(token)
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an error is the provider rejecting a call over quota (HTTP 429)"""
+    return getattr(error, "code", None) == 429 or type(error).__name__ in RATE_LIMIT_ERRORS
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an error is transient: rate limiting, overload, timeouts or dropped connections"""
+    code = getattr(error, "code", None)
+    return (
+        (isinstance(code, int) and code in RETRYABLE_STATUS)
+        or type(error).__name__ in RETRYABLE_ERRORS
+        or isinstance(error, (TimeoutError, ConnectionError))
+    )
+
+class Overloaded(Exception):
+    """Raised instead of queueing a call when too many are already waiting"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Allowance refilled continuously at per_minute / 60 a second, holding burst_seconds of refill
+
+    A per_minute of 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute * burst_seconds / 60)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def available(self, now: float) -> Optional[float]:
+        """Allowance left now, or None if unlimited"""
+        if self.per_minute <= 0:
+            return None
+        self._refill(now)
+        return self.level
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 if it can be now)"""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the bucket would never fit; let it through on a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60 / self.per_minute)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.per_minute > 0:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def drain(self, now: float) -> None:
+        """Empty the bucket, e.g. after the provider reported the quota exhausted"""
+        if self.per_minute > 0:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+class _Ticket:
+    """A call waiting for a slot; its future resolves when the slot is granted"""
+
+    __slots__ = ("priority", "tokens", "enqueued", "future", "granted")
+
+    def __init__(self, priority: int, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.future: Future = Future()
+        self.granted = False
+
+class LLMScheduler:
+    """Admission control for every LLM call of a process
+
+    Calls wait in a priority queue (interactive before batch before
+    background, first come first served within a class) and are granted a
+    slot by a dispatcher thread once fewer than max_concurrency calls are in
+    flight and both token buckets (requests and tokens per minute) allow
+    them. Transient failures are retried with jittered exponential backoff,
+    re-entering the queue; a 429 also empties the request bucket so the
+    calls behind it slow down. Identical calls already in flight (same key)
+    are coalesced onto one backend call. When max_queue interactive calls
+    are waiting, a new one is rejected with Overloaded instead of queueing;
+    batch and background work is never shed, it only waits.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_queue: int = LLM_MAX_QUEUE,
+                 max_retries: int = LLM_MAX_RETRIES, retry_base_seconds: float = LLM_RETRY_BASE_SECONDS,
+                 retry_max_seconds: float = LLM_RETRY_MAX_SECONDS, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._queue = []
+        self._sequence = itertools.count()
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self._in_flight = 0
+        # Moving average of call duration, for Retry-After estimates
+        self._call_seconds = 1.0
+        self._cond = threading.Condition()
+        self._flights: Dict[str, Future] = {}
+        self._flights_lock = threading.Lock()
+        self._dispatcher = None
+        for priority, name in PRIORITY_NAMES.items():
+            LLM_QUEUE_DEPTH.set(0, priority=name)
+
+    def depth(self, priority: int = BACKGROUND) -> int:
+        """Calls waiting for a slot at priority or above"""
+        with self._cond:
+            return self._depth(priority)
+
+    def stats(self) -> Dict[str, object]:
+        """Return queue depth per priority class, calls in flight and the quota left in each bucket"""
+        with self._cond:
+            now = time.monotonic()
+            return {
+                "queued": {PRIORITY_NAMES[priority]: count for priority, count in self._queued.items()},
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "requests_available": self.requests.available(now),
+                "tokens_available": self.tokens.available(now),
+                "average_call_seconds": self._call_seconds,
+            }
+
+    def _depth(self, priority: int) -> int:
+        return sum(count for queued, count in self._queued.items() if queued <= priority)
+
+    def retry_after(self, priority: int = INTERACTIVE) -> int:
+        """Estimate in whole seconds how long the calls ahead of a new one at priority take to drain"""
+        with self._cond:
+            ahead = self._depth(priority) + 1
+            per_second = self.max_concurrency / max(self._call_seconds, 0.001)
+            if self.requests.per_minute > 0:
+                per_second = min(per_second, self.requests.per_minute / 60)
+        return max(1, math.ceil(ahead / per_second))
+
+    def admit(self, priority: int = None) -> None:
+        """Raise Overloaded if a call at priority (default: the current one) would be shed"""
+        priority = LLM_PRIORITY.get() if priority is None else priority
+        if priority != INTERACTIVE or self.max_queue <= 0:
+            return
+        with self._cond:
+            full = self._depth(priority) >= self.max_queue
+        if full:
+            LLM_SHED.inc(priority=PRIORITY_NAMES[priority])
+            raise Overloaded(self.retry_after(priority))
+
+    def _enqueue(self, priority: int, tokens: int) -> _Ticket:
+        self.admit(priority)
+        ticket = _Ticket(priority, tokens)
+        with self._cond:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="llm-scheduler", daemon=True)
+                self._dispatcher.start()
+            heapq.heappush(self._queue, (priority, next(self._sequence), ticket))
+            self._queued[priority] += 1
+            LLM_QUEUE_DEPTH.set(self._queued[priority], priority=PRIORITY_NAMES[priority])
+            self._cond.notify()
+        return ticket
+
+    def _dispatch(self) -> None:
+        """Grant slots to queued calls in priority order as concurrency and quotas allow"""
+        with self._cond:
+            while True:
+                if not self._queue or self._in_flight >= self.max_concurrency:
+                    self._cond.wait()
+                    continue
+                priority, _, ticket = self._queue[0]
+                now = time.monotonic()
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(ticket.tokens, now))
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._queue)
+                self._queued[priority] -= 1
+                LLM_QUEUE_DEPTH.set(self._queued[priority], priority=PRIORITY_NAMES[priority])
+                # False if the waiter gave up (a cancelled request); its slot goes to the next call
+                if not ticket.future.set_running_or_notify_cancel():
+                    continue
+                self.requests.take(1, now)
+                self.tokens.take(ticket.tokens, now)
+                self._in_flight += 1
+                ticket.granted = True
+                LLM_QUEUE_SECONDS.observe(now - ticket.enqueued, priority=PRIORITY_NAMES[priority])
+                ticket.future.set_result(None)
+
+    def _release(self, seconds: float, rate_limited: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._call_seconds += 0.2 * (seconds - self._call_seconds)
+            if rate_limited:
+                self.requests.drain(time.monotonic())
+            self._cond.notify()
+
+    def _acquire(self, priority: int, tokens: int) -> None:
+        self._enqueue(priority, tokens).future.result()
+
+    async def _acquire_async(self, priority: int, tokens: int) -> None:
+        ticket = self._enqueue(priority, tokens)
+        try:
+            await asyncio.wrap_future(ticket.future)
+        except asyncio.CancelledError:
+            # Granted just as the caller was cancelled: hand the slot back
+            with self._cond:
+                granted = ticket.granted
+            if granted:
+                self._release(0.0)
+            raise
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt < self.max_retries and isinstance(error, Exception) and is_retryable(error):
+            LLM_RETRIES.inc()
+            return True
+        return False
+
+    def _join(self, key: Optional[str]) -> Tuple[bool, Optional[Future]]:
+        """Return (True, flight) to lead a call under key, or (False, flight) to follow the one in flight"""
+        if key is None:
+            return True, None
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                LLM_COALESCED.inc()
+                return False, flight
+            flight = self._flights[key] = Future()
+            return True, flight
+
+    def _land(self, key: Optional[str], flight: Optional[Future], result=None, error: BaseException = None) -> None:
+        """Resolve a led call's flight for its followers and forget it"""
+        if flight is None:
+            return
+        with self._flights_lock:
+            del self._flights[key]
+        if isinstance(error, BaseException) and not isinstance(error, Exception):
+            # The leader was cancelled; its followers still need an outcome they can handle
+            error = RuntimeError("Coalesced LLM call was cancelled")
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def run(self, call: Callable[[], T], tokens: int, key: str = None, priority: int = None) -> T:
+        """Run a blocking LLM call once granted a slot, retrying transient failures
+
+        Calls with the same key while one is in flight share its outcome.
+        """
+        priority = LLM_PRIORITY.get() if priority is None else priority
+        leader, flight = self._join(key)
+        if not leader:
+            return flight.result()
+        try:
+            result = self._run(call, tokens, priority)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return result
+
+    def _run(self, call: Callable[[], T], tokens: int, priority: int) -> T:
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            start = time.monotonic()
+            try:
+                result = call()
+            except BaseException as e:
+                self._release(time.monotonic() - start, isinstance(e, Exception) and is_rate_limited(e))
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self._release(time.monotonic() - start)
+            return result
+
+    async def run_async(self, call: Callable[[], Awaitable[T]], tokens: int, key: str = None, priority: int = None) -> T:
+        """Await an LLM call once granted a slot, retrying transient failures
+
+        Calls with the same key while one is in flight share its outcome.
+        """
+        priority = LLM_PRIORITY.get() if priority is None else priority
+        leader, flight = self._join(key)
+        if not leader:
+            # Shielded so a follower giving up does not cancel the shared flight
+            return await asyncio.shield(asyncio.wrap_future(flight))
+        try:
+            result = await self._run_async(call, tokens, priority)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        self._land(key, flight, result)
+        return result
+
+    async def _run_async(self, call: Callable[[], Awaitable[T]], tokens: int, priority: int) -> T:
+        attempt = 0
+        while True:
+            await self._acquire_async(priority, tokens)
+            start = time.monotonic()
+            try:
+                result = await call()
+            except BaseException as e:
+                self._release(time.monotonic() - start, isinstance(e, Exception) and is_rate_limited(e))
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self._release(time.monotonic() - start)
+            return result
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[str]], tokens: int,
+                     priority: int = None) -> AsyncIterator[str]:
+        """Yield a streamed LLM response, holding one slot for the whole stream
+
+        A stream is retried only if it fails before its first chunk; streams
+        are not coalesced.
+        """
+        priority = LLM_PRIORITY.get() if priority is None else priority
+        attempt = 0
+        while True:
+            await self._acquire_async(priority, tokens)
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in open_stream():
+                    started = True
+                    yield chunk
+            except BaseException as e:
+                self._release(time.monotonic() - start, isinstance(e, Exception) and is_rate_limited(e))
+                if started or not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self._release(time.monotonic() - start)
+            return
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class DocumentUpload(BaseModel):
@@ -8,21 +8,165 @@ class DocumentUpload(BaseModel):
 class QuestionRequest(BaseModel):
     question: str
     document_id: str
+    top_k: Optional[int] = Field(None, ge=1)  # number of chunks to retrieve
+    token_budget: Optional[int] = Field(None, ge=1)  # max estimated tokens of document context
+    conversation_id: Optional[str] = None  # answer as a follow-up within this conversation
+    page_start: Optional[int] = None  # answer from pages page_start..page_end only (from 1, inclusive)
+    page_end: Optional[int] = None
+
+class SummaryRequest(BaseModel):
+    max_words: int = Field(150, ge=1)
+    focus: Optional[str] = None  # e.g. "financial risks"
+    page_start: Optional[int] = None  # summarize pages page_start..page_end only
+    page_end: Optional[int] = None
+
+class SourceChunk(BaseModel):
+    id: int
+    start: int
+    end: int
+
+class Highlight(BaseModel):
+    start: int  # character offsets into the document text
+    end: int
+    page_start: int
+    page_end: int
+    kind: str  # "reference" (a located quote from source_reference) or "term"
+    term: Optional[str] = None
+    score: Optional[float] = None  # share of a reference matched, 1.0 when exact
+
+class SnippetWindow(BaseModel):
+    start: int
+    end: int
+    page_start: int
+    page_end: int
+    text: str
+    highlights: List[Highlight]
+
+class Highlights(BaseModel):
+    references: List[Highlight] = []
+    windows: List[SnippetWindow] = []
+
+class HighlightRequest(BaseModel):
+    terms: List[str] = []
+    reference: str = ""  # free text quoting the document, e.g. an answer's source_reference
+    regions: List[SourceChunk] = []  # search these spans first, e.g. an answer's source_chunks
+    page_start: Optional[int] = None  # read and search pages page_start..page_end only
+    page_end: Optional[int] = None
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: Optional[int] = Field(None, ge=1)
+    mode: Optional[str] = None  # 'bm25', 'semantic' or 'hybrid' (default: RETRIEVAL_MODE)
+
+class ChunkMatch(BaseModel):
+    id: int
+    start: int
+    end: int
+    score: float
+    text: str
+
+class SearchResponse(BaseModel):
+    document_id: str
+    mode: str
+    results: List[ChunkMatch]
+
+class PageText(BaseModel):
+    number: int
+    start: int  # character offsets of the page in the document text
+    end: int
+    text: str
+
+class PagesResponse(BaseModel):
+    document_id: str
+    page_count: int
+    pages: List[PageText]
 
 class ChallengeQuestion(BaseModel):
+    question_id: int
     question: str
     correct_answer: str
     explanation: str
 
 class ChallengeResponse(BaseModel):
     user_answer: str
-    question_id: int
+    question_id: int  # position in the challenge set, from 0
     document_id: str
+    challenge_id: str  # returned by /generate-challenge/
 
 class AnswerResponse(BaseModel):
     answer: str
     justification: str
     source_reference: str
+    source_chunks: List[SourceChunk] = []
+    highlights: Optional[Highlights] = None
+    conversation_id: Optional[str] = None
+
+class ConversationTurn(BaseModel):
+    index: int
+    question: str
+    answer: str
+
+class ConversationResponse(BaseModel):
+    conversation_id: str
+    document_id: str
+    summary: str  # rolling summary of turns older than the recent ones
+    summarized_turns: int
+    turns: List[ConversationTurn]  # recent turns, verbatim
+
+class CollectionRequest(BaseModel):
+    name: str
+    document_ids: List[str] = []
+
+class CollectionDocumentsRequest(BaseModel):
+    document_ids: List[str]
+
+class CollectionResponse(BaseModel):
+    collection_id: str
+    name: str
+    document_ids: List[str]
+
+class CollectionQuestionRequest(BaseModel):
+    question: str
+    top_k: Optional[int] = Field(None, ge=1)  # passages retrieved across the whole collection
+    token_budget: Optional[int] = Field(None, ge=1)  # max estimated tokens of passages in the prompt
+
+class CollectionSource(BaseModel):
+    label: str  # citation label used in the answer, e.g. [D1:C3]
+    document_id: str
+    filename: str
+    chunk_id: int
+    start: int
+    end: int
+    score: float
+
+class CollectionAnswerResponse(BaseModel):
+    collection_id: str
+    answer: str
+    justification: str
+    source_reference: str
+    sources: List[CollectionSource]
+    shards_matched: int  # documents containing a query term
+    shards_searched: int  # documents actually scored
+
+class BatchQuestionRequest(BaseModel):
+    document_id: str
+    questions: List[str]
+    top_k: Optional[int] = Field(None, ge=1)
+    token_budget: Optional[int] = Field(None, ge=1)
+    max_concurrency: Optional[int] = Field(None, ge=1, le=32)  # questions answered at once for this batch
+
+class BatchAnswerItem(BaseModel):
+    index: int
+    question: str
+    success: bool
+    result: Optional[AnswerResponse] = None
+    error: Optional[str] = None
+
+class BatchAnswerResponse(BaseModel):
+    document_id: str
+    succeeded: int
+    failed: int
+    results: List[BatchAnswerItem]
 
 class ChallengeEvaluation(BaseModel):
     is_correct: bool
@@ -30,3 +174,4 @@ class ChallengeEvaluation(BaseModel):
     correct_answer: str
     justification: str
     score: int  # 0-100
+    graded_by: str = "model"  # "local" when pre-grading was conclusive
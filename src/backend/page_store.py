@@ -0,0 +1,175 @@
+import mmap
+import os
+import tempfile
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from document_store import LRUDict
+
+# Directory of page buffers; defaults to UPLOAD_DIR/pages (kept in memory with DOCUMENT_STORE=memory)
+PAGE_STORE_DIR = os.getenv('PAGE_STORE_DIR', '')
+# Page buffers kept open (memory-mapped) per process
+PAGE_STORE_OPEN_DOCUMENTS = int(os.getenv('PAGE_STORE_OPEN_DOCUMENTS', '64'))
+
+def split_pages(text: str) -> List[str]:
+    """Split text into pages at form feeds, each page keeping its form feed"""
+    pages = text.split("\f")
+    return [page + "\f" for page in pages[:-1]] + [pages[-1]]
+
+class PagedText:
+    """A document as one contiguous UTF-8 buffer plus a page table of offsets into it
+
+    The table holds, for every page boundary, both the byte offset into the
+    buffer and the character offset into the document text, so a page or a
+    range of pages is decoded straight from its slice of the buffer (usually
+    a memory map) without touching the rest. Pages are numbered from 1; page
+    ranges are inclusive.
+    """
+
+    def __init__(self, buffer, byte_offsets: array, char_offsets: array):
+        self.buffer = buffer
+        self.byte_offsets = byte_offsets
+        self.char_offsets = char_offsets
+
+    @property
+    def page_count(self) -> int:
+        return len(self.char_offsets) - 1
+
+    @property
+    def page_starts(self) -> List[int]:
+        """Character offset at which each page starts"""
+        return self.char_offsets[:-1].tolist()
+
+    def check_range(self, first: int, last: int) -> None:
+        """Raise ValueError unless pages first..last exist"""
+        if not 1 <= first <= last <= self.page_count:
+            raise ValueError(f"Page range {first}-{last} out of range (document has {self.page_count} pages)")
+
+    def char_span(self, first: int, last: int) -> Tuple[int, int]:
+        """Return the [start, end) character offsets of pages first..last"""
+        self.check_range(first, last)
+        return self.char_offsets[first - 1], self.char_offsets[last]
+
+    def text(self, first: int, last: int) -> str:
+        """Return the text of pages first..last, decoding only their bytes"""
+        self.check_range(first, last)
+        return self.buffer[self.byte_offsets[first - 1]:self.byte_offsets[last]].decode('utf-8')
+
+    def page(self, number: int) -> str:
+        """Return the text of one page"""
+        return self.text(number, number)
+
+    def page_of(self, position: int) -> int:
+        """Return the page containing a character offset"""
+        return max(1, min(bisect_right(self.char_offsets, position), self.page_count))
+
+class _PageWriter:
+    """Accumulates pages into a buffer file (or memory) and its page table"""
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.byte_offsets = array('q', [0])
+        self.char_offsets = array('q', [0])
+        if directory is None:
+            self._parts: List[bytes] = []
+            self._file = None
+        else:
+            self._file = tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False)
+
+    def add(self, page: str) -> None:
+        data = page.encode('utf-8')
+        if self._file is None:
+            self._parts.append(data)
+        else:
+            self._file.write(data)
+        self.byte_offsets.append(self.byte_offsets[-1] + len(data))
+        self.char_offsets.append(self.char_offsets[-1] + len(page))
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self._file.name)
+
+class PageStore:
+    """Page buffers and page tables of stored documents
+
+    On disk each document is <id>.txt (the UTF-8 text) and <id>.pages (byte
+    and character offsets of every page boundary, as int64). Files are
+    written under temporary names and renamed into place, the page table
+    last, so other workers never open a half-written document. Without a
+    directory the buffers are kept in memory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_open: int = PAGE_STORE_OPEN_DOCUMENTS):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open = LRUDict(max_open)
+        self._memory: Dict[str, PagedText] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, document_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, document_id)
+        return base + '.txt', base + '.pages'
+
+    def writer(self) -> _PageWriter:
+        """Start writing a document whose ID is only known once all pages are seen"""
+        return _PageWriter(self.directory)
+
+    def commit(self, writer: _PageWriter, document_id: str) -> None:
+        """Publish a finished writer's pages under document_id"""
+        if writer._file is None:
+            paged = PagedText(b"".join(writer._parts), writer.byte_offsets, writer.char_offsets)
+            with self._lock:
+                self._memory[document_id] = paged
+            return
+        text_path, table_path = self._paths(document_id)
+        writer._file.close()
+        os.replace(writer._file.name, text_path)
+        table = writer.byte_offsets + writer.char_offsets
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            table.tofile(f)
+        os.replace(f.name, table_path)
+        self._open.pop(document_id)
+
+    def write(self, document_id: str, pages: Iterable[str]) -> None:
+        """Store a document from its page texts"""
+        writer = self.writer()
+        try:
+            for page in pages:
+                writer.add(page)
+        except BaseException:
+            writer.discard()
+            raise
+        self.commit(writer, document_id)
+
+    def open(self, document_id: str) -> Optional[PagedText]:
+        """Return a document's pages, memory-mapping its buffer on first use, or None if not stored"""
+        if self.directory is None:
+            return self._memory.get(document_id)
+        paged = self._open.get(document_id)
+        if paged is not None:
+            return paged
+        text_path, table_path = self._paths(document_id)
+        try:
+            with open(table_path, 'rb') as f:
+                table = array('q')
+                table.frombytes(f.read())
+            with open(text_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # The map stays valid after the file is closed; empty files cannot be mapped
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except FileNotFoundError:
+            return None
+        half = len(table) // 2
+        paged = PagedText(buffer, table[:half], table[half:])
+        self._open[document_id] = paged
+        return paged
+
+def create_page_store() -> PageStore:
+    """Build the page store matching DOCUMENT_STORE: on disk next to the database, or in memory"""
+    if os.getenv('DOCUMENT_STORE', 'sqlite').lower() == 'memory':
+        return PageStore(None)
+    return PageStore(PAGE_STORE_DIR or os.path.join(os.getenv('UPLOAD_DIR', 'uploads'), 'pages'))
@@ -0,0 +1,59 @@
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+import PyPDF2
+
+# Extraction processes per server process; by default the cores are split between the BACKEND_WORKERS workers
+BACKEND_WORKERS = max(1, int(os.getenv('BACKEND_WORKERS', '1')))
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(max(1, (os.cpu_count() or 1) // BACKEND_WORKERS))))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '16'))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the shared extraction process pool, or None when parallelism is disabled"""
+    global _process_pool
+    if PDF_EXTRACT_WORKERS <= 1:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+        return _process_pool
+
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) in a worker process"""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def iter_pdf_pages(source: Union[str, BinaryIO], executor: Optional[Executor] = None,
+                   pages_per_task: int = PDF_PAGES_PER_TASK) -> Iterator[str]:
+    """Yield the text of each page in order
+
+    When source is a file path and an executor is given, page ranges are
+    extracted in parallel. Pages are still yielded in order, as soon as
+    their range is done.
+    """
+    try:
+        reader = PyPDF2.PdfReader(source)
+        page_count = len(reader.pages)
+    except Exception as e:
+        raise ValueError(f"Error processing PDF: {str(e)}")
+
+    if executor is None or not isinstance(source, str) or page_count <= pages_per_task:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    futures = [
+        executor.submit(_extract_page_range, source, start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,207 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+from retrieval import estimate_tokens
+
+# Per-operation prompt budgets in (estimated) tokens, document text plus instructions
+DEFAULT_BUDGETS = {
+    "summary": int(os.getenv('PROMPT_BUDGET_SUMMARY', '4000')),
+    "answer": int(os.getenv('PROMPT_BUDGET_ANSWER', '4000')),
+    "challenge": int(os.getenv('PROMPT_BUDGET_CHALLENGE', '8000')),
+    "evaluation": int(os.getenv('PROMPT_BUDGET_EVALUATION', '8000')),
+    "collection": int(os.getenv('PROMPT_BUDGET_COLLECTION', '6000')),
+}
+# A short line at the top or bottom of this many pages is treated as a page header/footer
+BOILERPLATE_MIN_REPEATS = int(os.getenv('PROMPT_BOILERPLATE_MIN_REPEATS', '3'))
+# ...and of at least this fraction of all pages
+BOILERPLATE_MIN_PAGE_FRACTION = float(os.getenv('PROMPT_BOILERPLATE_MIN_PAGE_FRACTION', '0.5'))
+BOILERPLATE_MAX_LINE_CHARS = 100
+# Non-blank lines at each end of a page where headers and footers are looked for
+BOILERPLATE_EDGE_LINES = 2
+
+INLINE_SPACE_PATTERN = re.compile(r"[ \t\f\v\r]+")
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+DIGITS_PATTERN = re.compile(r"\d+")
+# Page numbers: "page 3", "page 3 of 12", "3 of 12", "3 / 12", "- 3 -", "report | 3"
+PAGE_NUMBER_PATTERN = re.compile(
+    r"\b(?:page|pg\.?|p\.)\s*\d+(?:\s*(?:of|/)\s*\d+)?\b|\b\d+\s*(?:of|/)\s*\d+\b"
+    r"|^\W*\d+\W*$|^\d+(?=\s*[|·•–—-])|(?<=[|·•–—-])\s*\d+$"
+)
+LETTER_PATTERN = re.compile(r"[^\W\d_]")
+GAP_MARKER = "[...]"
+
+def normalize_whitespace(text: str) -> str:
+    """Strip indentation and trailing spaces, collapse runs of spaces and of blank lines
+
+    Unlike utils.helpers.clean_text, newlines and punctuation are kept, so
+    paragraphs and structured response formats survive.
+    """
+    lines = (INLINE_SPACE_PATTERN.sub(" ", line).strip() for line in text.split("\n"))
+    return BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip()
+
+def _line_key(line: str) -> str:
+    """Key under which repeated lines are compared: case and the digits of page numbers are ignored
+
+    Other numbers are kept, so numbered headings such as "Section 2" do not
+    collapse into one key.
+    """
+    key = INLINE_SPACE_PATTERN.sub(" ", line).strip().lower()
+    return PAGE_NUMBER_PATTERN.sub(lambda match: DIGITS_PATTERN.sub("#", match.group()), key)
+
+def split_at(text: str, page_starts: Optional[List[int]] = None) -> List[str]:
+    """Split text into pages at the given character offsets, or at form feeds without them"""
+    if page_starts is None:
+        return text.split("\f")
+    bounds = [start for start in page_starts if 0 < start < len(text)]
+    return [text[start:end] for start, end in zip([0] + bounds, bounds + [len(text)])]
+
+def find_boilerplate(pages: List[str], min_repeats: int = BOILERPLATE_MIN_REPEATS,
+                     min_page_fraction: float = BOILERPLATE_MIN_PAGE_FRACTION) -> FrozenSet[str]:
+    """Return the keys of short lines found at the top or bottom of many pages (headers, footers)
+
+    A line counts once per page, and only among the first and last
+    BOILERPLATE_EDGE_LINES non-blank lines of it; it must recur on at least
+    min_repeats pages and min_page_fraction of all pages.
+    """
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.split("\n") if line.strip()]
+        edges = lines[:BOILERPLATE_EDGE_LINES] + lines[-BOILERPLATE_EDGE_LINES:]
+        counts.update({_line_key(line) for line in edges if len(line) <= BOILERPLATE_MAX_LINE_CHARS})
+    threshold = max(min_repeats, math.ceil(min_page_fraction * len(pages)))
+    return frozenset(key for key, count in counts.items() if count >= threshold and LETTER_PATTERN.search(key))
+
+def remove_boilerplate(text: str, boilerplate: FrozenSet[str]) -> str:
+    """Drop every occurrence of a boilerplate line after its first"""
+    if not boilerplate:
+        return text
+    seen = set()
+    kept = []
+    for line in text.split("\n"):
+        if len(line) <= BOILERPLATE_MAX_LINE_CHARS:
+            key = _line_key(line)
+            if key in boilerplate:
+                if key in seen:
+                    continue
+                seen.add(key)
+        kept.append(line)
+    return "\n".join(kept)
+
+def fit_to_budget(text: str, max_tokens: int) -> str:
+    """Shorten text to about max_tokens, keeping whole paragraphs spread over the document
+
+    Rather than cutting the tail off, paragraphs are kept in proportion
+    across the text so the beginning, middle and end all stay represented.
+    Omitted stretches are marked with [...].
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    paragraphs = text.split("\n\n")
+    costs = [estimate_tokens(p) + 1 for p in paragraphs]
+    ratio = max_tokens / sum(costs)
+    gap_cost = estimate_tokens(GAP_MARKER) + 1
+
+    kept: List[str] = []
+    used = 0
+    # Credit the opening paragraph up front so the document always starts at its beginning
+    allowance = float(costs[0])
+    skipped = False
+    for paragraph, cost in zip(paragraphs, costs):
+        allowance += cost * ratio
+        extra = gap_cost if skipped else 0
+        if cost <= allowance and used + cost + extra <= max_tokens:
+            if skipped:
+                kept.append(GAP_MARKER)
+                used += gap_cost
+                skipped = False
+            kept.append(paragraph)
+            used += cost
+            allowance -= cost
+        else:
+            skipped = True
+
+    if not kept:
+        # A single paragraph larger than the whole budget: cut it at a word boundary
+        cut = text[:max_tokens * 4]
+        boundary = cut.rfind(" ")
+        return (cut[:boundary] if boundary > 0 else cut) + " " + GAP_MARKER
+    if skipped:
+        kept.append(GAP_MARKER)
+    return "\n\n".join(kept)
+
+class PromptPacker:
+    """Assembles prompts within per-operation token budgets and counts the tokens it saves
+
+    Document text is normalized and stripped of repeated headers/footers;
+    if the prompt is still over budget the document part is fitted to the
+    space left after the instructions.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, min_repeats: int = BOILERPLATE_MIN_REPEATS,
+                 min_page_fraction: float = BOILERPLATE_MIN_PAGE_FRACTION):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.min_repeats = min_repeats
+        self.min_page_fraction = min_page_fraction
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def boilerplate(self, text: str, page_starts: Optional[List[int]] = None) -> FrozenSet[str]:
+        """Return the boilerplate line keys of a whole document (or page range)
+
+        page_starts are the character offsets of its pages in text; without
+        them pages are split at form feeds.
+        """
+        return find_boilerplate(split_at(text, page_starts), self.min_repeats, self.min_page_fraction)
+
+    def clean(self, text: str, boilerplate: Optional[FrozenSet[str]] = None) -> str:
+        """Remove boilerplate lines and normalize whitespace"""
+        if boilerplate is None:
+            boilerplate = self.boilerplate(text)
+        return normalize_whitespace(remove_boilerplate(text, boilerplate))
+
+    def available(self, operation: str, build: Callable[[str], str]) -> int:
+        """Return the tokens left for document text once the instructions are counted"""
+        return self.budgets[operation] - estimate_tokens(normalize_whitespace(build("")))
+
+    def pack(self, operation: str, build: Callable[[str], str], body: str,
+             boilerplate: FrozenSet[str] = frozenset()) -> str:
+        """Return build(body) with body cleaned and fitted to the operation's budget
+
+        boilerplate should come from the whole document (see boilerplate()),
+        not from body, where labels such as [Chunk N] would look repeated.
+        """
+        raw_tokens = estimate_tokens(normalize_whitespace(build(body)))
+        cleaned = self.clean(body, boilerplate)
+        cleaned_tokens = estimate_tokens(normalize_whitespace(build(cleaned)))
+        fitted = fit_to_budget(cleaned, self.available(operation, build))
+        prompt = normalize_whitespace(build(fitted))
+        final_tokens = estimate_tokens(prompt)
+        self._record(operation, raw_tokens, cleaned_tokens, final_tokens)
+        return prompt
+
+    def _record(self, operation: str, raw_tokens: int, cleaned_tokens: int, final_tokens: int) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(operation, {
+                "prompts": 0, "raw_tokens": 0, "sent_tokens": 0, "tokens_saved": 0, "tokens_dropped": 0, "fitted": 0
+            })
+            counters["prompts"] += 1
+            counters["raw_tokens"] += raw_tokens
+            counters["sent_tokens"] += final_tokens
+            counters["tokens_saved"] += max(raw_tokens - cleaned_tokens, 0)
+            counters["tokens_dropped"] += max(cleaned_tokens - final_tokens, 0)
+            counters["fitted"] += 1 if final_tokens < cleaned_tokens else 0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return per-operation prompt counts and tokens saved by cleaning / dropped to fit the budget"""
+        with self._lock:
+            stats = {operation: dict(counters) for operation, counters in self._counters.items()}
+        for operation, counters in stats.items():
+            counters["budget"] = self.budgets[operation]
+        return stats
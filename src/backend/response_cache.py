@@ -0,0 +1,141 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from document_store import SQLITE_TIMEOUT_SECONDS
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# Other worker processes write to the same disk tier, so its row count is re-read this often
+DISK_RECOUNT_INTERVAL = 256
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return WHITESPACE_PATTERN.sub(" ", prompt).strip()
+
+class ResponseCache:
+    """Two-tier LLM response cache: in-memory LRU in front of an optional SQLite store"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400,
+                 db_path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expirations": 0
+        }
+
+        self._db = None
+        self._disk_entries = 0
+        self._disk_inserts = 0
+        if db_path:
+            # Shared by every server worker process, so wait for other writers rather than fail
+            self._db = sqlite3.connect(db_path, timeout=SQLITE_TIMEOUT_SECONDS, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.commit()
+            self._disk_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(document_id: Optional[str], prompt: str, model_name: str, params: Optional[Dict] = None) -> str:
+        """Build a cache key from document, normalized prompt, model and generation params"""
+        prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+        params_json = json.dumps(params or {}, sort_keys=True)
+        raw = f"{document_id or ''}\x00{prompt_hash}\x00{model_name}\x00{params_json}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._counters["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created <= self.ttl_seconds:
+                        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, created, value)
+                        self._counters["hits"] += 1
+                        self._counters["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._disk_entries -= 1
+                    self._counters["expirations"] += 1
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+
+            if self._db is not None:
+                exists = self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                if exists is None:
+                    self._disk_entries += 1
+                    self._disk_inserts += 1
+                    if self._disk_inserts % DISK_RECOUNT_INTERVAL == 0:
+                        self._disk_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                overflow = self._disk_entries - self.max_disk_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                        (overflow,)
+                    )
+                    self._disk_entries -= overflow
+                    self._counters["disk_evictions"] += overflow
+                self._db.commit()
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        """Insert into the memory tier, evicting least recently used entries (lock held)"""
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit, miss and eviction counters"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._disk_entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,137 @@
+import re
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+ANSWER_KEYS = ("ANSWER", "JUSTIFICATION", "SOURCE_REFERENCE")
+EVALUATION_KEYS = ("IS_CORRECT", "FEEDBACK", "CORRECT_ANSWER", "JUSTIFICATION", "SCORE")
+CHALLENGE_QUESTION_COUNT = 3
+CHALLENGE_KEYS = tuple(
+    f"{key}_{i}" for i in range(1, CHALLENGE_QUESTION_COUNT + 1) for key in ("QUESTION", "ANSWER", "EXPLANATION")
+)
+
+BOOLEAN_PATTERN = re.compile(r"(true|false)", re.IGNORECASE)
+INTEGER_PATTERN = re.compile(r"\d+")
+LABEL_PATTERN = re.compile(r"[A-Z0-9_]+$")
+
+class SectionStreamParser:
+    """Incrementally parse `KEY: value` sections from streamed model output
+
+    feed() accepts text in arbitrary chunks and returns events:
+    ("delta", key, text) as a section's text arrives, and
+    ("field", key, value) once the section is closed by the next key
+    or by close().
+    """
+
+    def __init__(self, keys: Sequence[str]):
+        self.keys = list(keys)
+        self._key_set = frozenset(keys)
+        self._holdback = max(len(k) for k in self.keys) + 1
+        self._buffer = ""
+        self._current: Optional[str] = None
+        self._started = False
+        self.values: Dict[str, str] = {}
+        self._parts: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, str]]:
+        """Consume a chunk of output and return the events it completes"""
+        events: List[Tuple[str, str, str]] = []
+        buffer = self._buffer + chunk
+        position = 0
+
+        for start, key, end in self._find_keys(buffer):
+            self._emit(buffer[position:start], events)
+            self._close_current(events)
+            self._current = key
+            self._started = False
+            position = end
+        self._buffer = buffer[position:]
+
+        # Keep a tail that could be the beginning of a key split across chunks
+        safe = len(self._buffer) - self._holdback
+        if safe > 0:
+            self._emit(self._buffer[:safe], events)
+            self._buffer = self._buffer[safe:]
+        return events
+
+    def close(self) -> List[Tuple[str, str, str]]:
+        """Flush buffered text and close the last section"""
+        events: List[Tuple[str, str, str]] = []
+        self._emit(self._buffer, events)
+        self._buffer = ""
+        self._close_current(events)
+        self._current = None
+        return events
+
+    def _find_keys(self, buffer: str) -> Iterator[Tuple[int, str, int]]:
+        """Yield (start, key, end) for each `KEY:` label in buffer
+
+        Colons are rare in prose, so they are located with str.find and only
+        the few characters before each one are matched; a key counts only as
+        a whole label, not as the tail of a longer one (CORRECT_ANSWER vs ANSWER).
+        """
+        colon = buffer.find(":")
+        while colon != -1:
+            window = max(colon - self._holdback, 0)
+            label = LABEL_PATTERN.search(buffer, window, colon)
+            if label is not None and label.group(0) in self._key_set and (label.start() > window or window == 0):
+                yield label.start(), label.group(0), colon + 1
+            colon = buffer.find(":", colon + 1)
+
+    def _emit(self, text: str, events: List[Tuple[str, str, str]]) -> None:
+        if self._current is None or not text:
+            return
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        self._parts.append(text)
+        events.append(("delta", self._current, text))
+
+    def _close_current(self, events: List[Tuple[str, str, str]]) -> None:
+        if self._current is None:
+            return
+        value = "".join(self._parts).strip()
+        self._parts = []
+        # The first occurrence of a key wins, as with re.search
+        if self._current not in self.values:
+            self.values[self._current] = value
+            events.append(("field", self._current, value))
+
+def parse_sections(text: str, keys: Sequence[str]) -> Dict[str, str]:
+    """Parse a complete response in one pass and return its fields"""
+    parser = SectionStreamParser(keys)
+    parser.feed(text)
+    parser.close()
+    return parser.values
+
+def answer_from_fields(values: Dict[str, str]) -> Dict[str, str]:
+    """Build an answer result from parsed ANSWER_KEYS fields"""
+    return {
+        "answer": values.get("ANSWER", "Unable to parse answer"),
+        "justification": values.get("JUSTIFICATION", "Unable to parse justification"),
+        "source_reference": values.get("SOURCE_REFERENCE", "Unable to parse source reference")
+    }
+
+def challenge_questions_from_fields(values: Dict[str, str]) -> List[Dict[str, str]]:
+    """Build the challenge question list from parsed CHALLENGE_KEYS fields"""
+    questions = [
+        {
+            "question": values[f"QUESTION_{i}"],
+            "correct_answer": values.get(f"ANSWER_{i}", ""),
+            "explanation": values.get(f"EXPLANATION_{i}", "")
+        }
+        for i in range(1, CHALLENGE_QUESTION_COUNT + 1) if f"QUESTION_{i}" in values
+    ]
+    return questions if questions else [{"question": "Error parsing questions", "correct_answer": "", "explanation": ""}]
+
+def evaluation_from_fields(values: Dict[str, str]) -> Dict[str, any]:
+    """Build an evaluation result from parsed EVALUATION_KEYS fields"""
+    is_correct = BOOLEAN_PATTERN.match(values.get("IS_CORRECT", ""))
+    score = INTEGER_PATTERN.match(values.get("SCORE", ""))
+    return {
+        "is_correct": is_correct.group(1).lower() == "true" if is_correct else False,
+        "feedback": values.get("FEEDBACK", "Unable to parse feedback"),
+        "correct_answer": values.get("CORRECT_ANSWER", "Unable to parse correct answer"),
+        "justification": values.get("JUSTIFICATION", "Unable to parse justification"),
+        "score": int(score.group(0)) if score else 0
+    }
@@ -0,0 +1,203 @@
+import json
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i if in into is it its of on or
+that the their there these this those to was were what when where which who why will
+with you your does do did can could should would about
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into index terms"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the LLM token count of text (roughly 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+def _chunk_end(buffer: str, base: int, start: int, length: int, chunk_size: int) -> int:
+    """Return the absolute end of the chunk starting at start, backed off to whitespace"""
+    end = min(start + chunk_size, length)
+    if end < length:
+        # Back off to the nearest whitespace so words are not split across chunks
+        low = start - base + chunk_size // 2
+        high = end - base
+        boundary = max(buffer.rfind(" ", low, high), buffer.rfind("\n", low, high))
+        if boundary + base > start:
+            end = boundary + base
+    return end
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = 1000, overlap: int = 100) -> Iterator[Dict]:
+    """Chunk a stream of text pieces into overlapping chunks with character offsets
+
+    Chunks are emitted as soon as enough text has arrived, so indexing can
+    start before the whole document has been extracted.
+    """
+    buffer = ""
+    base = 0  # absolute offset of buffer[0]
+    start = 0
+    chunk_id = 0
+
+    def cut(length: int) -> Tuple[Dict, int]:
+        end = _chunk_end(buffer, base, start, length, chunk_size)
+        chunk = {"id": chunk_id, "start": start, "end": end, "text": buffer[start - base:end - base]}
+        return chunk, end
+
+    for piece in pieces:
+        buffer += piece
+        # Only cut while a full chunk is available and more text follows it
+        while start + chunk_size < base + len(buffer):
+            chunk, end = cut(base + len(buffer))
+            yield chunk
+            chunk_id += 1
+            start = max(end - overlap, start + 1)
+        buffer = buffer[start - base:]
+        base = start
+
+    length = base + len(buffer)
+    while start < length:
+        chunk, end = cut(length)
+        yield chunk
+        chunk_id += 1
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+
+def chunk_document(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[Dict]:
+    """Split text into overlapping chunks that end on whitespace, keeping character offsets"""
+    return list(iter_chunks([text], chunk_size, overlap))
+
+class ChunkIndex:
+    """BM25 inverted index over the chunks of a single document"""
+
+    def __init__(self, text: str = "", chunk_size: int = 1000, overlap: int = 100, k1: float = 1.5, b: float = 0.75):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.k1 = k1
+        self.b = b
+        self.chunks: List[Dict] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        self.avg_length = 0.0
+        self.idf: Dict[str, float] = {}
+        if text:
+            self.add_chunks(iter_chunks([text], chunk_size, overlap))
+
+    @classmethod
+    def from_pieces(cls, pieces: Iterable[str], chunk_size: int = 1000, overlap: int = 100) -> "ChunkIndex":
+        """Build an index incrementally from a stream of text pieces (e.g. pages)"""
+        index = cls(chunk_size=chunk_size, overlap=overlap)
+        index.add_chunks(iter_chunks(pieces, chunk_size, overlap))
+        return index
+
+    def add_chunks(self, chunks: Iterable[Dict]) -> None:
+        """Index chunks and refresh the collection statistics"""
+        for chunk in chunks:
+            terms = Counter(tokenize(chunk["text"]))
+            self.chunks.append(chunk)
+            self.lengths.append(sum(terms.values()))
+            for term, freq in terms.items():
+                self.postings.setdefault(term, []).append((chunk["id"], freq))
+
+        self._refresh_statistics()
+
+    def _refresh_statistics(self) -> None:
+        """Recompute the average chunk length and term IDFs from the postings"""
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        total = len(self.chunks)
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def to_json(self) -> str:
+        """Serialize the index without the chunk texts, which are sliced from the document on load"""
+        return json.dumps({
+            "chunk_size": self.chunk_size,
+            "overlap": self.overlap,
+            "k1": self.k1,
+            "b": self.b,
+            "spans": [(chunk["start"], chunk["end"]) for chunk in self.chunks],
+            "lengths": self.lengths,
+            "postings": self.postings,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, data: str, text: str) -> "ChunkIndex":
+        """Load an index serialized by to_json for the document text it was built from
+
+        About ten times faster than re-tokenizing the text.
+        """
+        state = json.loads(data)
+        index = cls(chunk_size=state["chunk_size"], overlap=state["overlap"], k1=state["k1"], b=state["b"])
+        index.chunks = [
+            {"id": chunk_id, "start": start, "end": end, "text": text[start:end]}
+            for chunk_id, (start, end) in enumerate(state["spans"])
+        ]
+        index.lengths = state["lengths"]
+        index.postings = state["postings"]
+        index._refresh_statistics()
+        return index
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """Return the top_k chunks ranked by BM25 score for the query"""
+        return self.rank(set(tokenize(query)), top_k)
+
+    def rank(self, terms: Iterable[str], top_k: int = 5, idf: Optional[Dict[str, float]] = None,
+             avg_length: Optional[float] = None) -> List[Tuple[Dict, float]]:
+        """Rank chunks for already tokenized query terms
+
+        idf and avg_length default to this index's own statistics; a corpus
+        passes its collection-wide ones so scores compare across documents.
+        """
+        scores = self.score_all(terms, idf, avg_length)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [(self.chunks[chunk_id], score) for chunk_id, score in ranked]
+
+    def score_all(self, terms: Iterable[str], idf: Optional[Dict[str, float]] = None,
+                  avg_length: Optional[float] = None) -> Dict[int, float]:
+        """Return the BM25 score of every chunk containing a query term, by chunk ID"""
+        scores: Dict[int, float] = {}
+        idf_table = self.idf if idf is None else idf
+        avg_length = (self.avg_length if avg_length is None else avg_length) or 1.0
+
+        for term in terms:
+            term_idf = idf_table.get(term)
+            if term_idf is None or term not in self.postings:
+                continue
+            for chunk_id, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + term_idf * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def select(self, query: str, top_k: int = 5, token_budget: int = 3000,
+               ranked: Optional[List[Dict]] = None) -> List[Dict]:
+        """Pick the best chunks for a query that fit in token_budget, in document order
+
+        ranked overrides the BM25 ranking, e.g. with an embedding or hybrid one.
+        """
+        if ranked is None:
+            ranked = [chunk for chunk, _ in self.search(query, top_k)]
+        if not ranked:
+            # Nothing matched lexically, fall back to the opening of the document
+            ranked = self.chunks[:top_k]
+
+        selected = []
+        used = 0
+        for chunk in ranked:
+            cost = estimate_tokens(chunk["text"])
+            if selected and used + cost > token_budget:
+                continue
+            selected.append(chunk)
+            used += cost
+
+        return sorted(selected, key=lambda chunk: chunk["start"])
+
+def format_chunks(chunks: List[Dict]) -> str:
+    """Render chunks as labelled passages for a prompt"""
+    return "\n\n".join(f"[Chunk {chunk['id']}]\n{chunk['text'].strip()}" for chunk in chunks)
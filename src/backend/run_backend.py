@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 """
 Run the FastAPI backend server
+
+With --workers N (or BACKEND_WORKERS) uvicorn starts N server processes that
+share the SQLite document store, so any worker can serve any document.
 """
+import argparse
 import sys
 import os
 
@@ -10,12 +14,24 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 if __name__ == "__main__":
     import uvicorn
-    
+
+    parser = argparse.ArgumentParser(description="Run the FastAPI backend server")
+    parser.add_argument("--host", default=os.getenv('BACKEND_HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('BACKEND_PORT', '8000')))
+    parser.add_argument("--workers", type=int, default=int(os.getenv('BACKEND_WORKERS', '1')),
+                        help="server processes (default: BACKEND_WORKERS or 1)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if os.getenv('DOCUMENT_STORE', 'sqlite').lower() == 'memory':
+            sys.exit("DOCUMENT_STORE=memory is per process; use the sqlite store with more than one worker")
+
+    # Workers read the count to split the cores between their own PDF extraction pools
+    os.environ['BACKEND_WORKERS'] = str(args.workers)
+
     print("Starting GenAI Document Assistant Backend...")
-    print("Backend will be available at: http://localhost:8000")
-    print("API docs available at: http://localhost:8000/docs")
-    
-    # Import the app here to avoid import issues
-    from api import app
-    
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+    print(f"Backend will be available at: http://localhost:{args.port} ({args.workers} worker(s))")
+    print(f"API docs available at: http://localhost:{args.port}/docs")
+
+    # Workers import the app themselves, so it is passed by name
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers, log_level="info")